@@ -0,0 +1,202 @@
+"""Content addressed blob storage for image data.
+
+Blobs are keyed by the hex SHA-256 of their content, so identical uploads are
+stored once and a key never changes meaning. Rows keep the key and size in
+<column>_hash and <column>_size next to the legacy bytea column.
+
+The image generation consumer still inserts images with their bytes in the
+row. Reads serve those from the row as they are, they are moved out in bulk
+with:
+
+    python -m app.blobs move-out
+
+Blobs are shared between rows, deleting a row leaves its blobs behind. They
+are removed once nothing references them anymore with:
+
+    python -m app.blobs gc
+"""
+import argparse
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# table: (primary key, blob columns)
+BLOB_COLUMNS = {
+    "images": ("image_id", ("image", "thumbnail")),
+    "image_templates": ("image_template_id", ("base_image",)),
+}
+
+CHUNK_SIZE = 64 * 1024
+
+
+class BlobStore(ABC):
+    """Interface of the blob stores"""
+
+    @abstractmethod
+    def put(self, data: bytes) -> str:
+        """Store data, returning its key. Storing existing content again is a no op"""
+
+    @abstractmethod
+    def get(self, digest: str) -> bytes:
+        pass
+
+    def iter_range(self, digest: str, start: int, end: int, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """Bytes start to end inclusive, in chunks"""
+        data = self.get(digest)
+        for offset in range(start, end + 1, chunk_size):
+            yield data[offset:min(offset + chunk_size, end + 1)]
+
+    @abstractmethod
+    def exists(self, digest: str) -> bool:
+        pass
+
+    @abstractmethod
+    def keys(self) -> Iterator[str]:
+        pass
+
+    @abstractmethod
+    def delete(self, digest: str):
+        pass
+
+
+class LocalBlobStore(BlobStore):
+    """Blobs as files on local disk, sharded by the first two bytes of the key: ab/cd/abcd..."""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def path(self, digest: str) -> Path:
+        if len(digest) != 64 or not all(c in "0123456789abcdef" for c in digest):
+            raise ValueError(f"Invalid blob key {digest!r}")
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    def put(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if path.exists():
+            return digest
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Written aside and renamed into place, readers never see a partial blob
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        return self.path(digest).read_bytes()
+
+    def iter_range(self, digest: str, start: int, end: int, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        # Read from the file a chunk at a time, the blob is never whole in memory
+        with open(self.path(digest), "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    return
+                remaining -= len(chunk)
+                yield chunk
+
+    def exists(self, digest: str) -> bool:
+        return self.path(digest).exists()
+
+    def keys(self) -> Iterator[str]:
+        for path in self.root.glob("??/??/*"):
+            if not path.name.startswith(".tmp-"):
+                yield path.name
+
+    def delete(self, digest: str):
+        self.path(digest).unlink(missing_ok=True)
+
+
+def move_out(connection, store: BlobStore, table: str, ids: Optional[List[int]] = None,
+             batch_size: int = 100) -> int:
+    """Move the bytes still held in a table's blob columns to the store, returning the number of rows moved.
+
+    Runs in the caller's transaction, rows being moved by someone else are skipped.
+    """
+    key, columns = BLOB_COLUMNS[table]
+    pending = " OR ".join(f"{column} IS NOT NULL" for column in columns)
+    select_sql = f"SELECT {key}, {', '.join(columns)} FROM {table} WHERE ({pending})"
+    if ids is not None:
+        select_sql += f" AND {key} = ANY(:ids)"
+    select_sql += f" ORDER BY {key} LIMIT :batch_size FOR UPDATE SKIP LOCKED"
+
+    moved = 0
+    while True:
+        rows = connection.execute(text(select_sql), {"ids": ids, "batch_size": batch_size}).all()
+        for row in rows:
+            values = {}
+            for column in columns:
+                data = row._mapping[column]
+                if data is None:
+                    continue
+                values[f"{column}_hash"] = store.put(bytes(data))
+                values[f"{column}_size"] = len(data)
+            assignments = ", ".join([f"{name} = :{name}" for name in values] + [f"{column} = NULL" for column in columns])
+            connection.execute(text(f"UPDATE {table} SET {assignments} WHERE {key} = :key"),
+                               {**values, "key": row[0]})
+        moved += len(rows)
+        if len(rows) < batch_size:
+            return moved
+
+
+def referenced_keys(connection) -> set:
+    keys = set()
+    for table, (_, columns) in BLOB_COLUMNS.items():
+        for column in columns:
+            keys.update(connection.execute(text(
+                f"SELECT DISTINCT {column}_hash FROM {table} WHERE {column}_hash IS NOT NULL"
+            )).scalars())
+    return keys
+
+
+def collect_garbage(connection, store: LocalBlobStore, min_age: float = 3600) -> int:
+    """Delete blobs no row references, sparing recent ones whose row may not be committed yet"""
+    referenced = referenced_keys(connection)
+    deleted = 0
+    for digest in store.keys():
+        if digest in referenced:
+            continue
+        if time.time() - store.path(digest).stat().st_mtime < min_age:
+            continue
+        store.delete(digest)
+        deleted += 1
+    return deleted
+
+
+if __name__ == "__main__":
+    from app.dependencies import engine, blob_store
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Maintain the image blob store")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("move-out", help="Move image bytes still held in rows to the blob store")
+    gc_parser = subparsers.add_parser("gc", help="Delete blobs no row references anymore")
+    gc_parser.add_argument("--min-age", type=float, default=3600, help="Seconds, younger blobs are kept")
+    args = parser.parse_args()
+
+    if args.command == "move-out":
+        for table in BLOB_COLUMNS:
+            with engine.begin() as connection:
+                logger.info("%s: moved %d rows", table, move_out(connection, blob_store, table))
+    else:
+        with engine.connect() as connection:
+            logger.info("Deleted %d blobs", collect_garbage(connection, blob_store, args.min_age))
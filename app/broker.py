@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from app.metrics import publish_duration
+
+logger = logging.getLogger(__name__)
+
+EXCHANGE = "B2B"
+QUEUES = ("new_queries", "image_generation")
+
+
+# pika is imported where it is used, it takes a tenth of a second and most
+# processes importing the app (scripts, migrations) never publish anything
+
+
+class PublisherChannel:
+    """A persistent connection with a single confirmed channel on it.
+
+    A transactional channel is confirmed per batch instead of per message, see publish_batch().
+    """
+
+    def __init__(self, url: str, transactional: bool = False):
+        self.url = url
+        self.transactional = transactional
+        self.connection = None
+        self.channel = None
+
+    @property
+    def is_open(self):
+        return self.channel is not None and self.channel.is_open
+
+    def open(self, declare: bool = False):
+        import pika
+
+        self.close()
+        self.connection = pika.BlockingConnection(pika.URLParameters(self.url))
+        self.channel = self.connection.channel()
+        if self.transactional:
+            self.channel.tx_select()
+        else:
+            # Broker acks every publish, so a lost message raises instead of vanishing
+            self.channel.confirm_delivery()
+        if declare:
+            self.channel.exchange_declare(exchange=EXCHANGE, durable=True)
+            for queue in QUEUES:
+                self.channel.queue_declare(queue=queue)
+                self.channel.queue_bind(exchange=EXCHANGE, queue=queue)
+
+    def close(self):
+        from pika.exceptions import AMQPConnectionError, AMQPChannelError
+
+        if self.connection is not None and self.connection.is_open:
+            try:
+                self.connection.close()
+            except (AMQPConnectionError, AMQPChannelError):
+                pass
+        self.connection = None
+        self.channel = None
+
+    def publish(self, routing_key: str, body: str):
+        from pika.exceptions import AMQPConnectionError, ChannelClosed, ChannelWrongStateError
+
+        if not self.is_open:
+            # (Re)connecting may mean the broker restarted, non durable queues need declaring again
+            self.open(declare=True)
+        try:
+            self.channel.basic_publish(exchange=EXCHANGE, routing_key=routing_key, body=body)
+        except (AMQPConnectionError, ChannelClosed, ChannelWrongStateError):
+            # Connection dropped while idle (heartbeat timeout, broker restart), retry once on a fresh one
+            logger.warning("RabbitMQ channel lost, reconnecting")
+            self.open(declare=True)
+            self.channel.basic_publish(exchange=EXCHANGE, routing_key=routing_key, body=body)
+
+    def publish_batch(self, routing_key: str, bodies: List[str]):
+        """Publish all of bodies in one transaction, one round trip to the broker for the lot.
+
+        The commit returns once the broker has taken every message, or none of
+        them if the connection drops first, so the whole batch can be retried.
+        """
+        from pika.exceptions import AMQPConnectionError, ChannelClosed, ChannelWrongStateError
+
+        if not self.transactional:
+            raise RuntimeError("Batches need a transactional channel")
+        if not self.is_open:
+            self.open(declare=True)
+        try:
+            for body in bodies:
+                self.channel.basic_publish(exchange=EXCHANGE, routing_key=routing_key, body=body)
+            self.channel.tx_commit()
+        except (AMQPConnectionError, ChannelClosed, ChannelWrongStateError):
+            logger.warning("RabbitMQ channel lost, reconnecting")
+            self.open(declare=True)
+            for body in bodies:
+                self.channel.basic_publish(exchange=EXCHANGE, routing_key=routing_key, body=body)
+            self.channel.tx_commit()
+
+
+class Publisher:
+    """Pool of persistent RabbitMQ channels, opened on app startup and closed on shutdown.
+
+    pika's BlockingConnection is not thread safe, so every channel is checked out
+    by one publish at a time and the blocking calls run in a worker thread,
+    keeping the event loop free while the broker confirms.
+    """
+
+    def __init__(self, url: str, pool_size: int = 4):
+        self.url = url
+        self.pool_size = pool_size
+        self._channels: Optional[asyncio.Queue] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    async def start(self):
+        from pika.exceptions import AMQPConnectionError
+
+        loop = asyncio.get_running_loop()
+        self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="rmq-publisher")
+        self._channels = asyncio.Queue()
+        for index in range(self.pool_size):
+            channel = PublisherChannel(self.url)
+            try:
+                # Topology only needs declaring once, by the first connection
+                await loop.run_in_executor(self._executor, channel.open, index == 0)
+            except (AMQPConnectionError, OSError):
+                # Don't block the API from starting, the channel connects on first publish
+                logger.exception("Could not connect to RabbitMQ on startup")
+            self._channels.put_nowait(channel)
+
+    async def stop(self):
+        if self._channels is None:
+            return
+        loop = asyncio.get_running_loop()
+        while not self._channels.empty():
+            channel = self._channels.get_nowait()
+            await loop.run_in_executor(self._executor, channel.close)
+        self._executor.shutdown(wait=True)
+        self._channels = None
+        self._executor = None
+
+    async def publish(self, routing_key: str, body: str):
+        if self._channels is None:
+            raise RuntimeError("Publisher has not been started")
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        channel = await self._channels.get()
+        try:
+            await loop.run_in_executor(self._executor, channel.publish, routing_key, body)
+        finally:
+            self._channels.put_nowait(channel)
+        # Includes waiting for a free channel, that's latency the request sees too
+        publish_duration.observe(time.perf_counter() - start, routing_key)
@@ -0,0 +1,133 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+
+class LRUCache:
+    """Least recently used cache bounded by the total size of its values rather than their number.
+
+    Thread safe, lookups come from the event loop and the threadpool alike.
+    """
+
+    def __init__(self, max_bytes: int, sizeof: Callable = len):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[object]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value):
+        size = self.sizeof(value)
+        # Never worth evicting everything else for
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def pop(self, key: Hashable):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "entries": len(self._entries), "bytes": self.size, "max_bytes": self.max_bytes}
+
+
+class TTLCache:
+    """Cache whose entries expire ttl seconds after being put, holding at most max_entries, oldest dropped first.
+
+    A ttl of 0 disables it. Thread safe.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.invalidations = 0
+        # Insertion order is expiry order, as every entry lives for the same ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[object]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value):
+        if self.ttl <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, now + self.ttl)
+            while self._entries:
+                oldest_key, (_, expires) = next(iter(self._entries.items()))
+                if expires > now and len(self._entries) <= self.max_entries:
+                    break
+                del self._entries[oldest_key]
+
+    def discard(self, predicate: Callable) -> int:
+        """Drop every entry whose key matches, returning how many were"""
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "expirations": self.expirations,
+                    "invalidations": self.invalidations, "entries": len(self._entries),
+                    "max_entries": self.max_entries, "ttl": self.ttl}
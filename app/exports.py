@@ -0,0 +1,162 @@
+import csv
+import io
+import json
+import zlib
+from enum import Enum
+from typing import AsyncIterator, Iterable, List, Sequence
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Boolean, DateTime, Float, Integer
+
+from app.dependencies import async_engine
+
+# Rows fetched per round trip from the server side cursor, and written per chunk
+EXPORT_BATCH_SIZE = 1000
+
+
+async def stream_batches(statement, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[List[Sequence]]:
+    """Yield the statement's rows in lists of batch_size, read through a server side cursor.
+
+    Uses its own connection rather than the request's session, as the response
+    body is produced after the route handler has returned.
+    """
+    async with async_engine.connect() as connection:
+        result = await connection.stream(statement.execution_options(yield_per=batch_size))
+        async for batch in result.partitions(batch_size):
+            yield batch
+
+
+async def csv_chunks(header: Iterable[str], batches: AsyncIterator[List[Sequence]]) -> AsyncIterator[bytes]:
+    """Encode each batch of rows as one chunk of CSV"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    async for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only, for an empty export
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Gzip a stream of chunks on the fly"""
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+class ExportFormat(str, Enum):
+    parquet = "parquet"
+    arrow = "arrow"
+    ndjson = "ndjson"
+
+
+MEDIA_TYPES = {
+    ExportFormat.parquet: "application/vnd.apache.parquet",
+    ExportFormat.arrow: "application/vnd.apache.arrow.stream",
+    ExportFormat.ndjson: "application/x-ndjson",
+}
+
+
+def arrow_schema(statement):
+    """Arrow schema matching the statement's selected columns"""
+    import pyarrow as pa
+
+    fields = []
+    for column in statement.selected_columns:
+        if isinstance(column.type, Boolean):
+            arrow_type = pa.bool_()
+        elif isinstance(column.type, Integer):
+            arrow_type = pa.int64()
+        elif isinstance(column.type, Float):
+            arrow_type = pa.float64()
+        elif isinstance(column.type, DateTime):
+            arrow_type = pa.timestamp("us")
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.key, arrow_type))
+    return pa.schema(fields)
+
+
+class ChunkSink:
+    """Write only file object for pyarrow writers, handing out what was written since the last take()"""
+
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        # Parquet records offsets for its footer, so this counts everything ever written
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+async def arrow_chunks(statement, batches: AsyncIterator[List[Sequence]],
+                       export_format: ExportFormat) -> AsyncIterator[bytes]:
+    """Encode each batch of rows as a record batch, one Parquet row group or Arrow IPC message each"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = arrow_schema(statement)
+    sink = ChunkSink()
+    if export_format == ExportFormat.parquet:
+        writer = pq.ParquetWriter(sink, schema)
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+
+    async for batch in batches:
+        columns = zip(*batch)
+        record_batch = pa.RecordBatch.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+            schema=schema
+        )
+        writer.write_batch(record_batch)
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+
+async def ndjson_chunks(statement, batches: AsyncIterator[List[Sequence]]) -> AsyncIterator[bytes]:
+    """Encode each batch of rows as newline delimited JSON objects"""
+    keys = [column.key for column in statement.selected_columns]
+    async for batch in batches:
+        yield "".join(json.dumps(dict(zip(keys, row)), default=str) + "\n" for row in batch).encode()
+
+
+def columnar_response(statement, export_format: ExportFormat, filename: str) -> StreamingResponse:
+    """Stream the statement's rows straight from the cursor in the requested typed format"""
+    batches = stream_batches(statement)
+    if export_format == ExportFormat.ndjson:
+        chunks = ndjson_chunks(statement, batches)
+    else:
+        chunks = arrow_chunks(statement, batches, export_format)
+
+    headers = {
+        'Content-Disposition': f'attachment; filename="{filename}.{export_format.value}"'
+    }
+    return StreamingResponse(chunks,
+                             media_type=MEDIA_TYPES[export_format],
+                             headers=headers)
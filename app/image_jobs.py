@@ -0,0 +1,120 @@
+"""Messages published to the image_generation queue.
+
+Version 2 messages are claim checks, the base image stays in the blob store
+and only its key travels through the broker:
+
+    {
+        "version": 2,
+        "template": {<image_templates columns, base_image excepted>},
+        "base_image": {"hash": "<sha256 hex>", "size": 1234, "format": "png"},
+        "parameters": {<SingleImageGenerate>},  # absent for template previews
+        "job_id": "<uuid>"                      # bulk generation only
+    }
+
+Consumers read the base image from the blob store (app/blobs.py layout) by
+its hash. The content under a key never changes, so they can keep a local
+copy by hash for as long as they like.
+
+Messages with a job_id belong to a bulk generation job, once the image is
+inserted (or given up on) the consumer records it on the job:
+
+    UPDATE jobs SET rendered = rendered + 1 WHERE job_id = :job_id
+    UPDATE jobs SET failed = failed + 1 WHERE job_id = :job_id
+
+Messages without "version" are version 1, the base image base64 encoded in
+template.base_image. While version 1 consumers are still running, set
+IMAGE_JOB_INLINE_BASE_IMAGE=1 and version 2 messages carry it there too.
+"""
+import base64
+import json
+import uuid
+from typing import Optional
+
+from sqlmodel import Session, select, update
+
+from app.broker import PublisherChannel
+from app.dependencies import (
+    engine,
+    blob_store,
+    publisher,
+    IMAGE_JOB_INLINE_BASE_IMAGE,
+    IMAGE_JOB_BATCH_SIZE,
+)
+from app.models import (
+    Company,
+    Employee,
+    ImageTemplate,
+    Job,
+)
+
+MESSAGE_VERSION = 2
+
+
+def image_job_message(image_template: ImageTemplate, parameters: Optional[dict] = None,
+                      base_image: Optional[bytes] = None, job_id: Optional[uuid.UUID] = None) -> str:
+    """Body of an image generation message, base_image is only needed when inlining it for version 1 consumers"""
+    template = image_template.dict(exclude={"base_image"})
+    if IMAGE_JOB_INLINE_BASE_IMAGE:
+        template["base_image"] = base64.b64encode(base_image).decode('ascii')
+    message_body = {
+        "version": MESSAGE_VERSION,
+        "template": template,
+        "base_image": {
+            "hash": image_template.base_image_hash,
+            "size": image_template.base_image_size,
+            "format": image_template.base_image_format,
+        },
+    }
+    if parameters is not None:
+        message_body["parameters"] = parameters
+    if job_id is not None:
+        message_body["job_id"] = job_id
+    return json.dumps(message_body, default=str)
+
+
+def select_employee_parameters(query_id: int):
+    """Render parameters of every employee of the query with a name to put on the image"""
+    return select(Employee.employee_id,
+                  Employee.first_name.label("fname"),
+                  Employee.last_name.label("lname"),
+                  Employee.full_name,
+                  Company.name.label("company"),
+                  Employee.position) \
+        .join(Company, Company.company_id == Employee.company_id) \
+        .where(Company.query_id == query_id, Employee.full_name != "") \
+        .order_by(Company.company_id, Employee.employee_id)
+
+
+def publish_query_images(job_id: uuid.UUID, image_template_id: int, query_id: int) -> dict:
+    """Publish one image generation message per employee of the query, run as a background job.
+
+    Messages go out in transactions of IMAGE_JOB_BATCH_SIZE, the job's submitted
+    counter moving after each.
+    """
+    with Session(engine, expire_on_commit=False) as session:
+        image_template = session.get(ImageTemplate, image_template_id)
+        employees = session.exec(select_employee_parameters(query_id)).all()
+        session.exec(update(Job).where(Job.job_id == job_id).values(total=len(employees)))
+        session.commit()
+
+    base_image = None
+    if IMAGE_JOB_INLINE_BASE_IMAGE:
+        base_image = blob_store.get(image_template.base_image_hash)
+
+    channel = PublisherChannel(publisher.url, transactional=True)
+    try:
+        for start in range(0, len(employees), IMAGE_JOB_BATCH_SIZE):
+            batch = employees[start:start + IMAGE_JOB_BATCH_SIZE]
+            channel.publish_batch("image_generation", [
+                image_job_message(image_template,
+                                  {"image_template_id": image_template_id, **employee._asdict()},
+                                  base_image, job_id)
+                for employee in batch
+            ])
+            with Session(engine) as session:
+                session.exec(update(Job).where(Job.job_id == job_id)
+                             .values(submitted=Job.submitted + len(batch)))
+                session.commit()
+    finally:
+        channel.close()
+    return {"employees": len(employees)}
@@ -0,0 +1,287 @@
+"""Bulk loading of scraped companies, with their employees and maps data, into a query.
+
+The body is parsed as it is received and COPYed into temporary staging tables
+every INGEST_BATCH_SIZE records, then moved into companies, employees and
+companies_maps_data with one INSERT ... SELECT each. Company ids are drawn
+from the sequence for all the staged companies at once and joined onto their
+employees and maps data by ref, so the rollup triggers fire once per table.
+Everything happens in the request's transaction, a failure leaves nothing behind.
+
+NDJSON (application/x-ndjson), one company per line with its employees and
+maps data nested, fields named as in CompanyBase, EmployeeBase and
+CompaniesMapsDataBase:
+
+    {"name": "Acme", "website": "https://acme.example.com", ...,
+     "employees": [{"full_name": "Jane Doe", ...}], "maps_data": {"search_position": 1, ...}}
+
+CSV (text/csv), with a header, one row per employee. Rows sharing a ref are the
+same company, its columns and maps data are taken from the first of them.
+Company columns are named as in CompanyBase, employee and maps data columns
+are prefixed with employee_ and maps_. A row with no employee columns set
+stands for a company without employees:
+
+    ref,name,website,...,employee_full_name,employee_first_name,...,maps_search_position,...
+
+The CSV a query is launched from (app/routes/queries_new.py) is parsed the
+same way, with only company columns and no ref.
+"""
+import codecs
+import csv
+import io
+from enum import Enum
+from typing import AsyncIterator, Iterable, List, Optional, Tuple
+
+import orjson
+from sqlalchemy import text
+
+from app.dependencies import INGEST_BATCH_SIZE
+from app.models import CompanyBase, EmployeeBase, CompaniesMapsDataBase
+
+
+class IngestFormat(str, Enum):
+    ndjson = "application/x-ndjson"
+    csv = "text/csv"
+
+
+class IngestError(ValueError):
+    pass
+
+
+# (ref, company, employees, maps data or None), a company or CSV row as parsed from the body
+Record = Tuple[str, Optional[dict], List[dict], Optional[dict]]
+
+
+def coerce(value, type_):
+    """value as type_, CSV strings and JSON numbers alike. Int fields only take integral values"""
+    if type_ is int:
+        if isinstance(value, str):
+            try:
+                return int(value)
+            except ValueError:
+                value = float(value)
+        if isinstance(value, float) and not value.is_integer():
+            raise ValueError(f"{value!r} is not an integer")
+        return int(value)
+    return type_(value)
+
+
+class StagingTable:
+    """Temporary table holding a ref and the fields of a model, COPYed into batch by batch"""
+
+    def __init__(self, name: str, table: str, model):
+        self.name = name
+        self.table = table
+        self.fields = list(model.__fields__.values())
+        self.columns = ["ref"] + [field.name for field in self.fields]
+        self.rows = []
+
+    def create_statement(self):
+        # Same column types as the table it is moved into
+        columns = ", ".join(f'"{field.name}"' for field in self.fields)
+        return text(f"CREATE TEMPORARY TABLE {self.name} ON COMMIT DROP AS "
+                    f"SELECT NULL::text AS ref, {columns} FROM {self.table} WITH NO DATA")
+
+    def add(self, ref: str, values: dict, number: int):
+        if not isinstance(values, dict):
+            raise IngestError(f"Record {number}: expected an object, got {values!r}")
+        row = [ref]
+        for field in self.fields:
+            value = values.get(field.name)
+            if value is None:
+                value = field.default
+            elif not isinstance(value, field.type_):
+                # Everything is a string in CSV, JSON numbers may be either int or float
+                try:
+                    value = coerce(value, field.type_)
+                except (TypeError, ValueError):
+                    raise IngestError(f"Record {number}: {field.name} expects {field.type_.__name__}, "
+                                      f"got {value!r}")
+            row.append(value)
+        self.rows.append(tuple(row))
+
+    async def flush(self, driver_connection):
+        if self.rows:
+            await driver_connection.copy_records_to_table(self.name, records=self.rows, columns=self.columns)
+            self.rows = []
+
+
+async def ndjson_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Record]:
+    number = 0
+    pending = b""
+
+    def parse(line) -> Record:
+        try:
+            company = orjson.loads(line)
+        except orjson.JSONDecodeError as error:
+            raise IngestError(f"Record {number}: {error}")
+        if not isinstance(company, dict):
+            raise IngestError(f"Record {number}: expected an object")
+        employees = company.pop("employees", None) or []
+        maps_data = company.pop("maps_data", None)
+        return str(company.pop("ref", number)), company, employees, maps_data
+
+    async for chunk in chunks:
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            if line.strip():
+                number += 1
+                yield parse(line)
+    if pending.strip():
+        number += 1
+        yield parse(pending)
+
+
+async def csv_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[List[str]]:
+    """Rows of the CSV, parsed chunk by chunk up to the last line break outside of a quoted value"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        data = pending + decoder.decode(chunk)
+        complete = 0
+        position = 0
+        quotes = 0
+        for line in data.splitlines(keepends=True):
+            position += len(line)
+            quotes += line.count('"')
+            if quotes % 2 == 0 and line.endswith(("\n", "\r")):
+                complete = position
+        pending = data[complete:]
+        for row in csv.reader(io.StringIO(data[:complete])):
+            yield row
+    for row in csv.reader(io.StringIO(pending + decoder.decode(b"", final=True))):
+        yield row
+
+
+def csv_columns(header: Iterable[str]):
+    """Positions of the company, employee and maps data fields, and of the ref, in the header"""
+    company, employee, maps_data = {}, {}, {}
+    ref = None
+    for position, column in enumerate(header):
+        column = column.strip()
+        if column == "ref":
+            ref = position
+        elif column.startswith("employee_") and column[len("employee_"):] in EmployeeBase.__fields__:
+            employee[column[len("employee_"):]] = position
+        elif column.startswith("maps_") and column[len("maps_"):] in CompaniesMapsDataBase.__fields__:
+            maps_data[column[len("maps_"):]] = position
+        elif column in CompanyBase.__fields__:
+            company[column] = position
+        else:
+            raise IngestError(f"Unknown column {column!r}")
+    if ref is None:
+        raise IngestError("Missing ref column")
+    return ref, company, employee, maps_data
+
+
+async def csv_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Record]:
+    rows = csv_rows(chunks)
+    try:
+        header = await rows.__anext__()
+    except StopAsyncIteration:
+        raise IngestError("Missing header")
+    ref, company_columns, employee_columns, maps_columns = csv_columns(header)
+    width = len(header)
+
+    def values(row, columns):
+        # An empty value is a missing one
+        return {name: row[position] for name, position in columns.items() if row[position] != ""}
+
+    number = 0
+    async for row in rows:
+        number += 1
+        if not any(row):
+            continue
+        if len(row) != width:
+            raise IngestError(f"Record {number}: expected {width} columns, got {len(row)}")
+        employee = values(row, employee_columns)
+        yield row[ref], values(row, company_columns), [employee] if employee else [], \
+            values(row, maps_columns) or None
+
+
+async def csv_companies(chunks: AsyncIterator[bytes]) -> AsyncIterator[dict]:
+    """Companies of a CSV with a header naming CompanyBase fields, a name required, to launch a query from"""
+    rows = csv_rows(chunks)
+    try:
+        header = await rows.__anext__()
+    except StopAsyncIteration:
+        raise IngestError("Missing header")
+    columns = [column.strip() for column in header]
+    for column in columns:
+        if column not in CompanyBase.__fields__:
+            raise IngestError(f"Unknown column {column!r}")
+    if "name" not in columns:
+        raise IngestError("Missing name column")
+
+    number = 0
+    async for row in rows:
+        number += 1
+        if not any(row):
+            continue
+        if len(row) != len(columns):
+            raise IngestError(f"Record {number}: expected {len(columns)} columns, got {len(row)}")
+        company = {column: value for column, value in zip(columns, row) if value != ""}
+        if "name" not in company:
+            raise IngestError(f"Record {number}: missing name")
+        yield company
+
+
+def parse_records(chunks: AsyncIterator[bytes], ingest_format: IngestFormat) -> AsyncIterator[Record]:
+    if ingest_format == IngestFormat.ndjson:
+        return ndjson_records(chunks)
+    return csv_records(chunks)
+
+
+async def ingest(session, query_id: int, records: AsyncIterator[Record]) -> dict:
+    """Stage the records and move them into the query, returning how many rows of each were inserted"""
+    companies = StagingTable("ingest_companies", "companies", CompanyBase)
+    employees = StagingTable("ingest_employees", "employees", EmployeeBase)
+    maps_data = StagingTable("ingest_maps_data", "companies_maps_data", CompaniesMapsDataBase)
+    tables = (companies, employees, maps_data)
+
+    for table in tables:
+        await session.execute(table.create_statement())
+    connection = await session.connection()
+    # COPY isn't exposed by SQLAlchemy, asyncpg's runs on the same connection and transaction
+    driver_connection = (await connection.get_raw_connection()).driver_connection
+
+    seen = set()
+    staged = 0
+    number = 0
+    async for ref, company, company_employees, company_maps_data in records:
+        number += 1
+        if ref not in seen:
+            seen.add(ref)
+            companies.add(ref, company, number)
+            if company_maps_data:
+                maps_data.add(ref, company_maps_data, number)
+        for employee in company_employees:
+            employees.add(ref, employee, number)
+        staged += 1
+        if staged == INGEST_BATCH_SIZE:
+            for table in tables:
+                await table.flush(driver_connection)
+            staged = 0
+    for table in tables:
+        await table.flush(driver_connection)
+
+    # Company ids for every staged company in one go, their employees and maps data join on the ref
+    await session.execute(text(
+        "CREATE TEMPORARY TABLE ingest_company_ids ON COMMIT DROP AS "
+        "SELECT ref, nextval(pg_get_serial_sequence('companies', 'company_id'))::integer AS company_id "
+        "FROM ingest_companies"
+    ))
+    inserted = {}
+    for table in tables:
+        columns = ", ".join(f'"{field.name}"' for field in table.fields)
+        if table is companies:
+            statement = (f"INSERT INTO companies (company_id, query_id, {columns}) "
+                         f"SELECT i.company_id, :query_id, {columns} "
+                         f"FROM ingest_companies JOIN ingest_company_ids i USING (ref)")
+        else:
+            statement = (f"INSERT INTO {table.table} (company_id, {columns}) "
+                         f"SELECT i.company_id, {columns} "
+                         f"FROM {table.name} JOIN ingest_company_ids i USING (ref)")
+        result = await session.execute(text(statement), {"query_id": query_id})
+        inserted[table.table] = result.rowcount
+    return inserted
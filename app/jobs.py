@@ -0,0 +1,116 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional, Set
+import uuid
+
+from sqlalchemy import and_, func
+from sqlmodel import Session, update
+
+from app.dependencies import engine, JOB_LEASE_SECONDS, JOB_WORKERS
+from app.models import Job
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+FINISHED = "finished"
+FAILED = "failed"
+
+
+class JobRunner:
+    """Worker pool running submitted jobs off the request, recording their progress on the jobs table.
+
+    Jobs are plain blocking functions, run in worker threads with the sync engine.
+    The job row is created by the route before submitting, so its id can be
+    returned straight away and polled on /jobs/{job_id}.
+
+    Several API processes share the jobs table, each holds a lease on the jobs
+    submitted to it and renews it until they finish. A job whose lease ran out
+    was left by a process that is gone, and is failed by whichever runner sees
+    it first. A job never leased runs out a lease after its creation.
+    """
+
+    def __init__(self, max_workers: int = 2, lease_seconds: float = 60):
+        self.max_workers = max_workers
+        self.lease = timedelta(seconds=lease_seconds)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._held: Set[uuid.UUID] = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    def start(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job-worker")
+        self._stopped.clear()
+        self._heartbeat = threading.Thread(target=self._keep_leases, name="job-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def stop(self):
+        if self._executor is None:
+            return
+        # The leases are renewed until the last job is done
+        self._executor.shutdown(wait=True)
+        self._executor = None
+        self._stopped.set()
+        self._heartbeat.join()
+        self._heartbeat = None
+
+    def submit(self, job_id: uuid.UUID, fn, *args):
+        if self._executor is None:
+            raise RuntimeError("Job runner has not been started")
+        with self._lock:
+            self._held.add(job_id)
+        return self._executor.submit(self._run, job_id, fn, *args)
+
+    def _run(self, job_id: uuid.UUID, fn, *args):
+        try:
+            self._update(Job.job_id == job_id, status=RUNNING, started_at=datetime.utcnow())
+            try:
+                result = fn(*args)
+            except Exception as e:
+                logger.exception("Job %s failed", job_id)
+                self._update(Job.job_id == job_id, status=FAILED, finished_at=datetime.utcnow(), error=str(e))
+            else:
+                self._update(Job.job_id == job_id, status=FINISHED, finished_at=datetime.utcnow(), result=result)
+        finally:
+            with self._lock:
+                self._held.discard(job_id)
+
+    def _keep_leases(self):
+        # Right away on start, which fails what a previous process left, then every third of the lease
+        while True:
+            try:
+                self._renew_leases()
+            except Exception:
+                logger.exception("Renewing the job leases failed")
+            if self._stopped.wait(self.lease.total_seconds() / 3):
+                return
+
+    def _renew_leases(self):
+        now = datetime.utcnow()
+        with self._lock:
+            held = list(self._held)
+        if held:
+            self._update(Job.job_id.in_(held), lease_expires_at=now + self.lease)
+
+        expires_at = func.coalesce(Job.lease_expires_at, Job.created_at + self.lease)
+        self._update(and_(Job.status.in_([PENDING, RUNNING]), expires_at < now),
+                     status=FAILED, finished_at=now, error="Interrupted, the process running it stopped")
+
+    @staticmethod
+    def _update(condition, **values):
+        # Nothing is loaded in the session to keep in sync
+        statement = update(Job).where(condition).values(**values).execution_options(synchronize_session=False)
+        with Session(engine) as session:
+            session.exec(statement)
+            session.commit()
+
+
+# Started and stopped with the app in main.py
+job_runner = JobRunner(max_workers=JOB_WORKERS, lease_seconds=JOB_LEASE_SECONDS)
+
+
+def get_job_runner():
+    return job_runner
@@ -1,11 +1,22 @@
 from fastapi import Depends, FastAPI
 
-from app.users.db import database
+from app import metrics, schema
+from app.dependencies import (
+    engine,
+    async_engine,
+    publisher,
+    thumbnail_cache,
+    user_cache,
+    SCHEMA_CHECK,
+    SQL_STATEMENT_BUDGET,
+)
+from app.jobs import job_runner
 from app.users.models import UserDB
 from app.users.users import current_active_user, fastapi_users, jwt_authentication, cookie_authentication
 from app.routes import (projects, queries, companies,
                         employees, image_templates, images,
-                        queries_export, queries_new, stats)
+                        queries_export, queries_new, stats, jobs, ingest)
+from app.routes import metrics as metrics_route
 
 app = FastAPI(
     title="B2B API",
@@ -13,6 +24,10 @@ app = FastAPI(
     version="1"
 )
 
+metrics.instrument({"sync": engine, "async": async_engine.sync_engine},
+                   {"thumbnail": thumbnail_cache, "user": user_cache})
+app.add_middleware(metrics.MetricsMiddleware, fastapi_app=app, statement_budget=SQL_STATEMENT_BUDGET)
+
 # JWT token login router
 app.include_router(
     fastapi_users.get_auth_router(jwt_authentication), prefix="/auth/jwt", tags=["auth"]
@@ -46,15 +61,24 @@ app.include_router(queries.router)
 app.include_router(stats.router)
 app.include_router(queries_export.router)
 app.include_router(queries_new.router)
+app.include_router(ingest.router)
 app.include_router(companies.router)
 app.include_router(employees.router)
+app.include_router(jobs.router)
+app.include_router(metrics_route.router)
 
 
 @app.on_event("startup")
 async def startup():
-    await database.connect()
+    # The schema comes from the migrations (alembic upgrade head), run before the API starts
+    if SCHEMA_CHECK:
+        schema.check(engine)
+    await publisher.start()
+    job_runner.start()
 
 
 @app.on_event("shutdown")
 async def shutdown():
-    await database.disconnect()
+    job_runner.stop()
+    await publisher.stop()
+    await async_engine.dispose()
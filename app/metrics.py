@@ -0,0 +1,271 @@
+"""Request, database and broker metrics, served on /metrics in the Prometheus text format.
+
+    http_requests_total                  requests by method, route and status
+    http_request_duration_seconds        latency histogram by method and route
+    http_requests_in_flight              requests being handled by method and route
+    http_response_size_bytes             response body size histogram by method and route
+    db_statements_per_request            SQL statements histogram by method and route
+    db_seconds_per_request               time spent in SQL statements histogram by method and route
+    db_statements_total, db_seconds_total  all statements, per pool, requests or not
+    broker_publish_duration_seconds      publish latency histogram by routing key
+    db_pool_*, cache_*                   the pools' and caches' own counters, read when scraped
+
+Routes are labelled with their path template, /images/{image_id}, so that the
+number of series stays bounded. Statements are attributed to the request whose
+context they run in, including those run in the threadpool.
+
+/metrics is only served with METRICS_TOKEN set, to scrapers sending it as a
+bearer token, it would otherwise expose them on the API's public port.
+
+With SQL_STATEMENT_BUDGET set, requests issuing more statements than that log
+a warning with their route and statement count.
+"""
+import bisect
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from starlette.routing import Match
+
+from app.pool import pool_stats
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (100, 1000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = list(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+                                for key, value in values]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # Per bucket counts (not cumulative, summed up when rendered), then sum
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self):
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        lines = self.header()
+        names = self.labels + ("le",)
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(names, key + (_format_value(bound),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+REQUEST_LABELS = ("method", "route")
+
+requests_total = Counter("http_requests_total", "Requests handled", REQUEST_LABELS + ("status",))
+request_duration = Histogram("http_request_duration_seconds", "Time to handle a request, body included",
+                             REQUEST_LABELS)
+requests_in_flight = Gauge("http_requests_in_flight", "Requests being handled", REQUEST_LABELS)
+response_size = Histogram("http_response_size_bytes", "Response body size", REQUEST_LABELS, SIZE_BUCKETS)
+request_statements = Histogram("db_statements_per_request", "SQL statements issued by a request",
+                               REQUEST_LABELS, STATEMENT_BUCKETS)
+request_db_time = Histogram("db_seconds_per_request", "Time a request spent in SQL statements", REQUEST_LABELS)
+statements_total = Counter("db_statements_total", "SQL statements executed", ("pool",))
+db_time_total = Counter("db_seconds_total", "Time spent executing SQL statements", ("pool",))
+publish_duration = Histogram("broker_publish_duration_seconds", "Time to publish and have a message confirmed",
+                             ("routing_key",))
+
+METRICS = [requests_total, request_duration, requests_in_flight, response_size, request_statements,
+           request_db_time, statements_total, db_time_total, publish_duration]
+
+# Caches whose counters are reported, by name, see instrument()
+caches = {}
+
+
+def _collect_gauges():
+    """The pools' and caches' own counters, as they are when scraped"""
+    pool_gauges = {
+        "in_use": "Connections checked out", "idle": "Connections idle in the pool",
+        "overflow": "Connections open beyond the pool size", "waiting": "Checkouts waiting for a connection",
+    }
+    pool_counters = {
+        "checkouts": "Connections checked out since startup", "failures": "Checkouts that failed",
+        "checkout_seconds": "Time spent checking out connections",
+    }
+    lines = []
+    stats = pool_stats()
+    for key, documentation in pool_gauges.items():
+        lines += [f"# HELP db_pool_{key} {documentation}", f"# TYPE db_pool_{key} gauge"]
+        lines += [f"db_pool_{key}{_format_labels(('pool',), (s['pool'],))} {s[key]}" for s in stats]
+    for key, documentation in pool_counters.items():
+        lines += [f"# HELP db_pool_{key}_total {documentation}", f"# TYPE db_pool_{key}_total counter"]
+        lines += [f"db_pool_{key}_total{_format_labels(('pool',), (s['pool'],))} {_format_value(s[key])}"
+                  for s in stats]
+
+    cache_stats = {name: cache.stats() for name, cache in caches.items()}
+    for key in ("hits", "misses"):
+        lines += [f"# HELP cache_{key}_total Cache lookups that were {key}", f"# TYPE cache_{key}_total counter"]
+        lines += [f"cache_{key}_total{_format_labels(('cache',), (name,))} {s[key]}"
+                  for name, s in cache_stats.items()]
+    lines += ["# HELP cache_entries Entries held by the cache", "# TYPE cache_entries gauge"]
+    lines += [f"cache_entries{_format_labels(('cache',), (name,))} {s['entries']}"
+              for name, s in cache_stats.items()]
+    return lines
+
+
+def render() -> str:
+    lines = []
+    for metric in METRICS:
+        lines += metric.render()
+    lines += _collect_gauges()
+    return "\n".join(lines) + "\n"
+
+
+class RequestStats:
+    __slots__ = ("statements", "db_time")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_time = 0.0
+
+
+# Statements of the request being handled in this context
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(pool):
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        statements_total.inc(pool)
+        db_time_total.inc(pool, amount=elapsed)
+        stats = current_request.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.db_time += elapsed
+    return after_cursor_execute
+
+
+def instrument(engines: dict, named_caches: dict):
+    """Count the statements of the engines (sync engines, by pool name) and report the caches' counters"""
+    for pool, sync_engine in engines.items():
+        if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute(pool))
+    caches.update(named_caches)
+
+
+def route_template(app, scope) -> str:
+    """Path template of the route the request will be handled by, so labels don't carry ids"""
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", scope["path"])
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every request, counting its response bytes and SQL statements"""
+
+    def __init__(self, app, fastapi_app, statement_budget: int = 0):
+        self.app = app
+        # The FastAPI app, whose routes the paths are matched against
+        self.fastapi_app = fastapi_app
+        self.statement_budget = statement_budget
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        labels = (scope["method"], route_template(self.fastapi_app, scope))
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        requests_in_flight.inc(*labels)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_request.reset(token)
+            requests_in_flight.dec(*labels)
+            requests_total.inc(*labels, str(status))
+            request_duration.observe(elapsed, *labels)
+            response_size.observe(size, *labels)
+            request_statements.observe(stats.statements, *labels)
+            request_db_time.observe(stats.db_time, *labels)
+            if self.statement_budget and stats.statements > self.statement_budget:
+                logger.warning("%s %s issued %d SQL statements (budget %d) taking %.1fms of %.1fms",
+                               *labels, stats.statements, self.statement_budget,
+                               stats.db_time * 1000, elapsed * 1000)
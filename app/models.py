@@ -1,9 +1,8 @@
 from datetime import datetime
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel
-from sqlmodel import Field, Relationship, SQLModel, Column, JSON, LargeBinary
+from sqlmodel import Field, Relationship, SQLModel, Column, JSON, LargeBinary, Index, text
 import uuid
-from app.dependencies import engine
 
 
 # Projects
@@ -18,6 +17,9 @@ class ProjectCreate(ProjectBase):
 
 
 class Project(ProjectBase, table=True):
+    __table_args__ = (
+        Index("ix_projects_user_id_active", "user_id", "project_id", postgresql_where=text("is_active")),
+    )
     project_id: Optional[int] = Field(
         default=None,
         primary_key=True
@@ -57,8 +59,18 @@ class QueryBase(SQLModel):
     maps_results: Optional[int]
     search_results: Optional[int]
 
+    # Progress of queries launched from a CSV, companies published for
+    # enrichment so far and, once the upload is over, all of them
+    rows_submitted: Optional[int] = Field(default=None, index=False)
+    rows_total: Optional[int] = Field(default=None, index=False)
+
 
 class Query(QueryBase, table=True):
+    __table_args__ = (
+        Index("ix_queries_user_id_active", "user_id", "query_id", postgresql_where=text("is_active")),
+        Index("ix_queries_project_id_active", "project_id", "query_id", postgresql_where=text("is_active")),
+        Index("ix_queries_in_progress", "user_id", postgresql_where=text("is_active AND finished_at IS NULL")),
+    )
     query_id: Optional[int] = Field(
         default=None,
         primary_key=True
@@ -82,6 +94,11 @@ class QueryRead(QueryBase):
     finished_at: Optional[datetime]
 
 
+class CsvQueryRead(QueryRead):
+    # The malformed row the upload stopped at, the companies before it were launched
+    error: Optional[str]
+
+
 class QueryStats(SQLModel):
     total_companies: int
     total_employees: int
@@ -92,6 +109,51 @@ class QueryStats(SQLModel):
     emails_found_by_size_data: List[int]
 
 
+class QueryIngested(SQLModel):
+    companies: int
+    employees: int
+    maps_data: int
+    finished_at: Optional[datetime]
+
+
+# Rollup counters, kept up to date by the triggers in app/rollups.py. The counts
+# aren't indexed so the triggers' updates stay HOT, with no index to rewrite.
+class QueryCounters(SQLModel, table=True):
+    __tablename__ = "query_counters"
+    query_id: int = Field(primary_key=True, foreign_key="queries.query_id")
+    user_id: Optional[uuid.UUID] = Field(default=None, index=True)
+    project_id: Optional[int] = Field(default=None)
+    total_companies: int = Field(default=0, index=False)
+    total_employees: int = Field(default=0, index=False)
+    total_emails: int = Field(default=0, index=False)
+
+
+class QuerySizeCounters(SQLModel, table=True):
+    __tablename__ = "query_size_counters"
+    query_id: int = Field(primary_key=True, foreign_key="queries.query_id")
+    employees: int = Field(primary_key=True)
+    companies: int = Field(default=0, index=False)
+    companies_with_emails: int = Field(default=0, index=False)
+
+
+class ProjectCounters(SQLModel, table=True):
+    __tablename__ = "project_counters"
+    project_id: int = Field(primary_key=True, foreign_key="projects.project_id")
+    user_id: Optional[uuid.UUID] = Field(default=None)
+    total_companies: int = Field(default=0, index=False)
+    total_employees: int = Field(default=0, index=False)
+    total_emails: int = Field(default=0, index=False)
+
+
+class CompanyCounters(SQLModel, table=True):
+    # No foreign key to companies, the row outlives the company until its delete trigger runs
+    __tablename__ = "company_counters"
+    company_id: int = Field(primary_key=True)
+    query_id: int
+    employees: int = Field(default=0, index=False)
+    emails: int = Field(default=0, index=False)
+
+
 # Companies
 class CompanyBase(SQLModel):
     __tablename__ = "companies"
@@ -115,11 +177,14 @@ class CompanyBase(SQLModel):
 
 
 class Company(CompanyBase, table=True):
+    __table_args__ = (
+        Index("ix_companies_query_id_company_id", "query_id", "company_id"),
+    )
     company_id: Optional[int] = Field(
         default=None,
         primary_key=True
     )
-    query_id: int = Field(default=None, foreign_key="queries.query_id")
+    query_id: int = Field(default=None, foreign_key="queries.query_id", index=False)
     query: Query = Relationship(back_populates="companies")
 
     employees: List["Employee"] = Relationship(back_populates="company")
@@ -162,11 +227,17 @@ class EmployeeBase(SQLModel):
 
 
 class Employee(EmployeeBase, table=True):
+    __table_args__ = (
+        Index("ix_employees_company_id_employee_id", "company_id", "employee_id"),
+        # The best contact of a company, see app.routes.companies.best_contact
+        Index("ix_employees_best_contact", "company_id", text("rank_score DESC"), "employee_id",
+              postgresql_where=text("email <> '' AND rank_score > 0")),
+    )
     employee_id: Optional[int] = Field(
         default=None,
         primary_key=True
     )
-    company_id: int = Field(default=None, foreign_key="companies.company_id")
+    company_id: int = Field(default=None, foreign_key="companies.company_id", index=False)
     company: Company = Relationship(back_populates="employees")
 
 
@@ -188,11 +259,14 @@ class CompaniesMapsDataBase(SQLModel):
 
 
 class CompaniesMapsData(CompaniesMapsDataBase, table=True):
+    __table_args__ = (
+        Index("ix_companies_maps_data_company_id_maps_data_id", "company_id", "maps_data_id"),
+    )
     maps_data_id: Optional[int] = Field(
         default=None,
         primary_key=True
     )
-    company_id: int = Field(default=None, foreign_key="companies.company_id")
+    company_id: int = Field(default=None, foreign_key="companies.company_id", index=False)
     company: Company = Relationship(back_populates="maps_data")
 
 
@@ -223,6 +297,9 @@ class ImageTemplateCreate(ImageTemplateBase):
 
 
 class ImageTemplate(ImageTemplateBase, table=True):
+    __table_args__ = (
+        Index("ix_image_templates_user_id_image_template_id", "user_id", "image_template_id"),
+    )
     image_template_id: Optional[int] = Field(
         default=None,
         primary_key=True
@@ -230,7 +307,10 @@ class ImageTemplate(ImageTemplateBase, table=True):
     user_id: uuid.UUID
     created_at: Optional[datetime] = datetime.utcnow()
     updated_at: Optional[datetime] = datetime.utcnow()
+    # Legacy, the base image lives in the blob store under base_image_hash
     base_image: Optional[bytes] = Field(sa_column=Column(LargeBinary()))
+    base_image_hash: Optional[str] = Field(default=None, index=False)
+    base_image_size: Optional[int] = Field(default=None, index=False)
     base_image_format: Optional[str] = Field(default=None)
 
 
@@ -262,8 +342,9 @@ class ImageTemplateUpdate(SQLModel):
 # Images
 class ImageBase(SQLModel):
     __tablename__ = "images"
-    image: bytes = Field(sa_column=Column(LargeBinary()))
-    thumbnail: bytes = Field(sa_column=Column(LargeBinary()))
+    # The image generation consumer writes the bytes here, app/blobs.py moves them to the blob store
+    image: Optional[bytes] = Field(sa_column=Column(LargeBinary()))
+    thumbnail: Optional[bytes] = Field(sa_column=Column(LargeBinary()))
     image_format: str = Field(default=None)
     preview: bool
     parameters: Optional[Dict[Any, Any]] = Field(
@@ -275,6 +356,11 @@ class ImageBase(SQLModel):
 
 
 class Image(ImageBase, table=True):
+    __table_args__ = (
+        # Images generated from a template are counted, its preview is looked up
+        Index("ix_images_template_id_generated", "template_id", postgresql_where=text("NOT preview")),
+        Index("ix_images_template_id_preview", "template_id", "user_id", postgresql_where=text("preview")),
+    )
     image_id: Optional[int] = Field(
         default=None,
         primary_key=True
@@ -282,6 +368,12 @@ class Image(ImageBase, table=True):
     template_id: Optional[int] = Field(default=None)
     user_id: uuid.UUID
 
+    # Blob store keys and sizes of image and thumbnail
+    image_hash: Optional[str] = Field(default=None, index=False)
+    image_size: Optional[int] = Field(default=None, index=False)
+    thumbnail_hash: Optional[str] = Field(default=None, index=False)
+    thumbnail_size: Optional[int] = Field(default=None, index=False)
+
     created_at: Optional[datetime] = datetime.utcnow()
 
 
@@ -324,7 +416,7 @@ class SingleImageGenerate(ImageGenerate):
     )
 
 
-class QueryImageGenerate(BaseModel):
+class QueryImageGenerate(ImageGenerate):
     """A model for submitting a batch of images to be generated from a query"""
     query_id: int = Field(
         title="ID of the query to use for generating the image. One image will be generated for each "
@@ -338,5 +430,43 @@ class EmployeeImageGenerate(QueryImageGenerate):
     )
 
 
-# Creates all tables, uncomment when needed to create tables
-SQLModel.metadata.create_all(engine)
+# Background jobs
+class JobBase(SQLModel):
+    __tablename__ = "jobs"
+    kind: str
+    status: str = "pending"
+    query_id: Optional[int] = None
+
+    created_at: Optional[datetime] = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+    result: Optional[Dict[Any, Any]] = Field(
+        index=False,
+        sa_column=Column(JSON),
+        default=None,
+        nullable=True
+    )
+    error: Optional[str]
+
+    # Progress of jobs made of many items, e.g. one image per employee. The
+    # image generation consumer bumps rendered and failed as it goes.
+    total: Optional[int] = Field(default=None, index=False)
+    submitted: Optional[int] = Field(default=None, index=False)
+    rendered: Optional[int] = Field(default=None, index=False)
+    failed: Optional[int] = Field(default=None, index=False)
+
+
+class Job(JobBase, table=True):
+    job_id: uuid.UUID = Field(
+        default_factory=uuid.uuid4,
+        primary_key=True
+    )
+    user_id: uuid.UUID = Field(index=True)
+    # Renewed by the process running the job, see app/jobs.py
+    lease_expires_at: Optional[datetime] = Field(default=None, index=False)
+
+
+class JobRead(JobBase):
+    job_id: uuid.UUID
+
@@ -0,0 +1,59 @@
+import base64
+import binascii
+import json
+from typing import Callable, List, Optional, Union
+
+from fastapi import HTTPException, Response
+from sqlalchemy import tuple_
+
+# Response header carrying the cursor of the next page, absent on the last page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(after: Union[int, tuple]) -> str:
+    if isinstance(after, tuple):
+        after = list(after)
+    return base64.urlsafe_b64encode(json.dumps({"after": after}).encode()).decode()
+
+
+def decode_cursor(cursor: str, size: int = 1) -> Union[int, tuple]:
+    try:
+        after = json.loads(base64.urlsafe_b64decode(cursor.encode()))["after"]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if size == 1 and isinstance(after, int):
+        return after
+    if size > 1 and isinstance(after, list) and len(after) == size and all(isinstance(x, int) for x in after):
+        return tuple(after)
+    raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate(statement, key, cursor: Optional[str], offset: int, limit: int):
+    """Order the statement by its key and select one page of it.
+
+    The key is the primary key column, or a tuple of columns when the rows are
+    reached through a parent, e.g. (Company.company_id, Employee.employee_id).
+    With a cursor the page starts right after the last row of the previous one,
+    an index range scan that costs the same on every page. Without one, offset
+    is used as before. One extra row is fetched to know whether there is a next page.
+    """
+    columns = key if isinstance(key, tuple) else (key,)
+    statement = statement.order_by(*columns)
+    if cursor:
+        after = decode_cursor(cursor, size=len(columns))
+        if len(columns) == 1:
+            statement = statement.where(key > after)
+        else:
+            # The bound on the leading column alone is what the planner can use as an index condition
+            statement = statement.where(columns[0] >= after[0], tuple_(*columns) > tuple_(*after))
+    else:
+        statement = statement.offset(offset)
+    return statement.limit(limit + 1)
+
+
+def page_results(response: Response, results: List, limit: int, key: Callable) -> List:
+    """Trim the extra row fetched by paginate() and set the next page's cursor from the last row"""
+    if len(results) > limit:
+        results = results[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(key(results[-1]))
+    return results
@@ -0,0 +1,159 @@
+"""Connection pools to the API's Postgres, the only place engines are built.
+
+One sync pool (threadpool, jobs, scripts) and one async pool (route handlers)
+per process, both sized and checked by the settings below. Budget
+max_connections as workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW + DB_SYNC_POOL_SIZE
++ DB_SYNC_MAX_OVERFLOW).
+
+    DB_POOL_SIZE, DB_MAX_OVERFLOW            async pool, connections kept and extra under load
+    DB_SYNC_POOL_SIZE, DB_SYNC_MAX_OVERFLOW  the same for the sync pool
+    DB_POOL_TIMEOUT                          seconds to wait for a connection before failing
+    DB_POOL_RECYCLE                          seconds after which a connection is replaced
+    DB_POOL_PRE_PING                         check connections on checkout, 1 or 0
+    DB_PGBOUNCER                             1 when DB_HOST is a PgBouncer in transaction mode
+
+Behind a transaction mode PgBouncer, consecutive transactions of a client
+connection can land on different server connections. asyncpg's prepared
+statement cache is turned off and its statement names made unique, so that no
+statement outlives the transaction that prepared it or clashes with another
+client's. Migrations need a direct connection (CREATE INDEX CONCURRENTLY).
+"""
+import os
+import threading
+import time
+import uuid
+
+import asyncpg
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlmodel import create_engine
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 5))
+DB_SYNC_POOL_SIZE = int(os.getenv("DB_SYNC_POOL_SIZE", 2))
+DB_SYNC_MAX_OVERFLOW = int(os.getenv("DB_SYNC_MAX_OVERFLOW", 4))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "0") == "1"
+
+
+class PoolMetrics:
+    """Checkout counters of one pool. A checkout is waiting from the call until it has a connection."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.pool = None
+        self.waiting = 0
+        self.checkouts = 0
+        self.checkout_seconds = 0.0
+        self.checkout_seconds_max = 0.0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def started(self):
+        with self._lock:
+            self.waiting += 1
+
+    def finished(self, seconds: float, failed: bool = False):
+        with self._lock:
+            self.waiting -= 1
+            if failed:
+                # Timed out waiting, or the database could not be reached
+                self.failures += 1
+                return
+            self.checkouts += 1
+            self.checkout_seconds += seconds
+            self.checkout_seconds_max = max(self.checkout_seconds_max, seconds)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pool": self.name, "size": self.pool.size(), "in_use": self.pool.checkedout(),
+                    "idle": self.pool.checkedin(), "overflow": max(self.pool.overflow(), 0),
+                    "waiting": self.waiting, "checkouts": self.checkouts, "failures": self.failures,
+                    "checkout_seconds": self.checkout_seconds, "checkout_seconds_max": self.checkout_seconds_max}
+
+
+class InstrumentedPool:
+    """Times every checkout, including the wait for a free connection and the pre ping"""
+
+    metrics: PoolMetrics
+
+    def connect(self):
+        start = time.perf_counter()
+        self.metrics.started()
+        try:
+            connection = super().connect()
+        except Exception:
+            self.metrics.finished(time.perf_counter() - start, failed=True)
+            raise
+        self.metrics.finished(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        self.metrics.pool = pool
+        return pool
+
+
+class InstrumentedQueuePool(InstrumentedPool, QueuePool):
+    pass
+
+
+class InstrumentedAsyncPool(InstrumentedPool, AsyncAdaptedQueuePool):
+    pass
+
+
+class PgBouncerConnection(asyncpg.Connection):
+    """Names prepared statements uniquely across every client of the PgBouncer"""
+
+    def _get_unique_id(self, prefix):
+        return f"__asyncpg_{prefix}_{uuid.uuid4().hex}__"
+
+
+# Metrics of every pool built by this module, by name
+pools = {}
+
+
+def _instrument(engine, name: str):
+    metrics = PoolMetrics(name)
+    engine.pool.metrics = metrics
+    metrics.pool = engine.pool
+    pools[name] = metrics
+    return engine
+
+
+def create_pooled_engine(url: str, name: str = "sync"):
+    return _instrument(create_engine(
+        url,
+        poolclass=InstrumentedQueuePool,
+        pool_size=DB_SYNC_POOL_SIZE,
+        max_overflow=DB_SYNC_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    ), name)
+
+
+def create_pooled_async_engine(url: str, name: str = "async"):
+    connect_args = {}
+    if DB_PGBOUNCER:
+        connect_args = {"statement_cache_size": 0, "prepared_statement_cache_size": 0,
+                        "connection_class": PgBouncerConnection}
+    engine = create_async_engine(
+        url,
+        poolclass=InstrumentedAsyncPool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args=connect_args,
+    )
+    _instrument(engine.sync_engine, name)
+    return engine
+
+
+def pool_stats() -> list:
+    return [metrics.stats() for metrics in pools.values()]
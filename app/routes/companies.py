@@ -1,13 +1,17 @@
-from typing import List
+from typing import List, Optional
 from fastapi import (
     APIRouter,
     Depends,
     HTTPException,
-    Query as QueryFastapi
+    Query as QueryFastapi,
+    Response
 )
-from sqlmodel import Session
+from sqlmodel import select, true
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.exc import IntegrityError
-from app.dependencies import get_session
+from app.dependencies import get_async_session
+from app.pagination import paginate, page_results
+from app.responses import model_columns, list_response
 from app.users.users import current_active_user
 from app.users.models import UserDB
 from app.models import (
@@ -27,73 +31,93 @@ router = APIRouter(
 )
 
 
-def populate_emails(companies):
+def best_contact():
+    # Highest ranked employee with an email, per company. Lateral so it only
+    # runs for the companies actually being fetched, not the whole employees table
+    return select(Employee.full_name, Employee.position, Employee.email)\
+        .where(Employee.company_id == Company.company_id,
+               Employee.email != '',
+               Employee.rank_score > 0)\
+        .order_by(Employee.rank_score.desc(), Employee.employee_id)\
+        .limit(1)\
+        .lateral("best_contact")
+
+
+# The columns of CompanyRead, its email is the best contact's, see populate_emails()
+COMPANY_COLUMNS = model_columns(CompanyRead, Company)
+
+
+def select_companies_with_contact():
+    """Select the company columns along with the full name, position and email of their best contact"""
+    contact = best_contact()
+    return select(*COMPANY_COLUMNS, contact.c.full_name, contact.c.position, contact.c.email)\
+        .outerjoin(contact, true())
+
+
+def populate_emails(rows):
     companies_with_emails = []
-    last_employee_score = 0
-    for company in companies:
-        # Start by setting email var to none
-        email = None
-        for employee in company.employees:
-            if employee.email and employee.rank_score > last_employee_score:
-                # If email found, and is scored higher than last or default (0)
-                # Update the email variable
-                email = {"full_name": employee.full_name,
-                         "position": employee.position,
-                         "email": employee.email}
-                last_employee_score = employee.rank_score
-
-        # Convert the company to dict
-        company = company.dict()
+    for row in rows:
+        company = row._asdict()
+        full_name, position, email = company.pop("full_name"), company.pop("position"), company.pop("email")
+        company["email"] = None
         if email:
             # If email found, add a key and value of it
-            company["email"] = email
+            company["email"] = {"full_name": full_name,
+                                "position": position,
+                                "email": email}
 
         companies_with_emails.append(company)
-        # Reset the last score, for next loop
-        last_employee_score = 0
     return companies_with_emails
 
 
 @router.get("/all/{query_id}", response_model=List[CompanyRead])
 async def get_all_companies(*,
-                            session: Session = Depends(get_session),
+                            session: AsyncSession = Depends(get_async_session),
                             user: UserDB = Depends(current_active_user),
+                            response: Response,
                             query_id: int,
                             offset: int = 0,
                             limit: int = QueryFastapi(default=100, lte=100),
+                            cursor: Optional[str] = None
                             ):
-    query = session.get(Query, query_id)
+    query = await session.get(Query, query_id)
     if not query or query.user_id != user.id or not query.is_active:
         raise HTTPException(status_code=404, detail="Query not found")
 
-    query = session.query(Company).where(Company.query_id == query_id)
-    results = query.offset(offset).limit(limit).all()
+    query = select_companies_with_contact().where(Company.query_id == query_id)
+    results = (await session.exec(
+        paginate(query, Company.company_id, cursor, offset, limit)
+    )).all()
+    results = page_results(response, results, limit, key=lambda row: row.company_id)
 
     results_with_emails = populate_emails(results)
-    return results_with_emails
+    return list_response(results_with_emails, response)
 
 
 @router.get("/{company_id}", response_model=CompanyWithLocationDataRead)
 async def get_company(*,
-                      session: Session = Depends(get_session),
+                      session: AsyncSession = Depends(get_async_session),
                       user: UserDB = Depends(current_active_user),
                       include_loc_data: bool = True,
                       company_id: int
                       ):
-    company = session.query(Company).where(
-        Company.company_id == company_id).first()
+    company = (await session.exec(
+        select_companies_with_contact()
+        .join(Query, Query.query_id == Company.query_id)
+        .where(Company.company_id == company_id,
+               Query.user_id == user.id,
+               Query.is_active == True)
+    )).first()
 
-    if not company\
-            or company.query.user_id != user.id\
-            or not company.query.is_active:
+    if not company:
         raise HTTPException(status_code=404, detail="Company not found")
 
     company = populate_emails([company])[0]
 
     if include_loc_data:
-        maps_data = session.query(CompaniesMapsData)\
-            .where(CompaniesMapsData.company_id == company_id)\
-            .first()
+        maps_data = (await session.exec(
+            select(CompaniesMapsData).where(CompaniesMapsData.company_id == company_id)
+        )).first()
         company = {**company, **maps_data.dict()}
 
     return company
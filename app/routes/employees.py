@@ -1,13 +1,17 @@
-from typing import List
+from typing import List, Optional
 from fastapi import (
     APIRouter,
     Depends,
     HTTPException,
-    Query as QueryFastapi
+    Query as QueryFastapi,
+    Response
 )
-from sqlmodel import Session
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.exc import IntegrityError
-from app.dependencies import get_session
+from app.dependencies import get_async_session
+from app.pagination import paginate, page_results
+from app.responses import model_columns, list_response
 from app.users.users import current_active_user
 from app.users.models import UserDB
 from app.models import (
@@ -24,54 +28,74 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+EMPLOYEE_COLUMNS = model_columns(EmployeeRead, Employee)
+
 
 @router.get("/company/{company_id}", response_model=List[EmployeeRead])
 async def get_all_employees(*,
-                            session: Session = Depends(get_session),
+                            session: AsyncSession = Depends(get_async_session),
                             user: UserDB = Depends(current_active_user),
+                            response: Response,
                             company_id: int,
                             offset: int = 0,
-                            limit: int = QueryFastapi(default=100, lte=100)
+                            limit: int = QueryFastapi(default=100, lte=100),
+                            cursor: Optional[str] = None
                             ):
-    company = session.get(Company, company_id)
-    if not company \
-            or company.query.user_id != user.id \
-            or not company.query.is_active:
+    company = (await session.exec(
+        select(Company).join(Query)
+        .where(Company.company_id == company_id,
+               Query.user_id == user.id,
+               Query.is_active == True)
+    )).first()
+    if not company:
         raise HTTPException(status_code=404, detail="The company requested was not found or you are not authorized to view it.")
 
-    query = session.query(Employee).where(Employee.company_id == company_id)
-    results = query.offset(offset).limit(limit).all()
-    return results
+    query = select(*EMPLOYEE_COLUMNS).where(Employee.company_id == company_id)
+    results = (await session.exec(
+        paginate(query, Employee.employee_id, cursor, offset, limit)
+    )).all()
+    results = page_results(response, results, limit, key=lambda employee: employee.employee_id)
+    return list_response([employee._asdict() for employee in results], response)
 
 
 @router.get("/query/{query_id}", response_model=List[EmployeeRead])
 async def get_all_employees_from_query(*,
-                                       session: Session = Depends(get_session),
+                                       session: AsyncSession = Depends(get_async_session),
                                        user: UserDB = Depends(current_active_user),
+                                       response: Response,
                                        query_id: int,
                                        offset: int = 0,
-                                       limit: int = QueryFastapi(default=100, lte=100)
+                                       limit: int = QueryFastapi(default=100, lte=100),
+                                       cursor: Optional[str] = None
                                        ):
-    query = session.get(Query, query_id)
+    query = await session.get(Query, query_id)
     if not query \
             or query.user_id != user.id \
             or not query.is_active:
         raise HTTPException(status_code=404, detail="The query requested was not found or you are not authorized to view it.")
 
-    employee_query = session.query(Employee).join(Company).where(Company.query_id == query_id)
-    results = employee_query.offset(offset).limit(limit).all()
-    return results
+    employee_query = select(*EMPLOYEE_COLUMNS).join(Company).where(Company.query_id == query_id)
+    # Ordered company by company, so each page is read through the query's companies
+    results = (await session.exec(
+        paginate(employee_query, (Company.company_id, Employee.employee_id), cursor, offset, limit)
+    )).all()
+    results = page_results(response, results, limit,
+                           key=lambda employee: (employee.company_id, employee.employee_id))
+    return list_response([employee._asdict() for employee in results], response)
 
 
 @router.get("/{employee_id}", response_model=EmployeeRead)
 async def get_employee(*,
-                       session: Session = Depends(get_session),
+                       session: AsyncSession = Depends(get_async_session),
                        user: UserDB = Depends(current_active_user),
                        employee_id: int,
                        ):
-    employee = session.get(Employee).where(Employee.employee_id == employee_id)
-    if not employee \
-            or employee.company.query.user_id != user.id \
-            or not employee.company.query.is_active:
+    employee = (await session.exec(
+        select(Employee).join(Company).join(Query)
+        .where(Employee.employee_id == employee_id,
+               Query.user_id == user.id,
+               Query.is_active == True)
+    )).first()
+    if not employee:
         raise HTTPException(status_code=404, detail="Employee not found")
     return employee
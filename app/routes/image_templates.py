@@ -1,9 +1,8 @@
-import json
 from typing import (
     List,
+    Optional,
 )
 
-import pika.connection
 from fastapi import (
     APIRouter,
     Depends,
@@ -11,11 +10,16 @@ from fastapi import (
     Query,
     UploadFile,
     File,
-    Form
+    Form,
+    Response
 )
-from sqlmodel import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import select, func
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.exc import IntegrityError
-from app.dependencies import get_session
+from app.dependencies import get_async_session
+from app.pagination import paginate, page_results
+from app.responses import model_columns, list_response
 from app.users.users import current_active_user
 from app.users.models import UserDB
 from app.models import (
@@ -23,8 +27,16 @@ from app.models import (
     ImageTemplate,
     ImageTemplateRead,
 )
-from app.dependencies import rmq_init
-import base64
+from app.dependencies import get_publisher, get_blob_store, get_thumbnail_cache
+from app.blobs import BlobStore
+from app.cache import LRUCache
+from app.broker import Publisher
+from app.image_jobs import image_job_message
+from app.routes.images import (
+    select_image,
+    encoded_thumbnails,
+    image_media_type,
+)
 
 router = APIRouter(
     prefix="/image-templates",
@@ -33,12 +45,31 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+# Everything but the legacy base image bytes
+TEMPLATE_COLUMNS = [column for column in ImageTemplate.__table__.columns if column.name != "base_image"]
+# Those of them returned by the listing, images and thumbnail aside
+TEMPLATE_READ_FIELDS = [column.name for column in model_columns(ImageTemplateRead, ImageTemplate)]
+
+
+async def select_template_images(session, user_id, template_ids) -> dict:
+    """Preview image id and generated image count by template id, in one grouped query"""
+    rows = (await session.exec(
+        select(Image.template_id,
+               func.min(Image.image_id).filter(Image.preview == True,
+                                               Image.user_id == user_id).label("preview_id"),
+               func.count(Image.image_id).filter(Image.preview == False).label("images_generated"))
+        .where(Image.template_id.in_(template_ids))
+        .group_by(Image.template_id)
+    )).all()
+    return {row.template_id: row for row in rows}
+
 
 @router.post("/new", response_model=ImageTemplateRead)
 async def create_image_template(*,
-                                session: Session = Depends(get_session),
+                                session: AsyncSession = Depends(get_async_session),
                                 user: UserDB = Depends(current_active_user),
-                                rmq: pika.connection.Connection = Depends(rmq_init),
+                                publisher: Publisher = Depends(get_publisher),
+                                store: BlobStore = Depends(get_blob_store),
                                 image_template: str = Form(...),
                                 base_image: UploadFile = File(...)
                                 ):
@@ -52,97 +83,97 @@ async def create_image_template(*,
 
     image_template = ImageTemplate.parse_raw(image_template)
     image_template.user_id = user.id
-    image_template.base_image = await base_image.read()
+    base_image = await base_image.read()
+    image_template.base_image_hash = await run_in_threadpool(store.put, base_image)
+    image_template.base_image_size = len(base_image)
     image_template.base_image_format = img_format
     session.add(image_template)
     try:
-        session.commit()
+        await session.commit()
     except IntegrityError as error:
         raise HTTPException(
             status_code=422,
             detail=str(error.__cause__).replace("\n", " ").strip()
         ) from error
-    session.refresh(image_template)
+    await session.refresh(image_template)
 
     # Generate a preview image.
     # This will make a entry in the images table
     # Which means the first image for each template is always a preview.
-    image_template.base_image = base64.b64encode(image_template.base_image).decode('ascii')
-    message_body = {
-        "template": image_template.dict()
-    }
-    message_body = json.dumps(message_body, default=str)
-
-    rmqc = rmq.channel()
-    rmqc.exchange_declare(exchange='B2B', durable=True)
-    rmqc.queue_declare(queue='image_generation')
-    rmqc.queue_bind(exchange='B2B', queue='image_generation')
-
-    rmqc.basic_publish(exchange='B2B', routing_key='image_generation', body=message_body)
-    rmq.close()
+    message_body = image_job_message(image_template, base_image=base_image)
+
+    await publisher.publish("image_generation", message_body)
     return image_template
 
 
 @router.get("/", response_model=List[ImageTemplateRead])
 async def get_all_image_templates(*,
-                                  session: Session = Depends(get_session),
+                                  session: AsyncSession = Depends(get_async_session),
                                   user: UserDB = Depends(current_active_user),
+                                  store: BlobStore = Depends(get_blob_store),
+                                  cache: LRUCache = Depends(get_thumbnail_cache),
+                                  response: Response,
                                   offset: int = 0,
                                   limit: int = Query(default=100, lte=100),
+                                  cursor: Optional[str] = None,
                                   include_thumbnail: bool
                                   ):
-    query = session.query(ImageTemplate).where(ImageTemplate.user_id == user.id)
-    results = query.offset(offset).limit(limit).all()
+    query = select(*TEMPLATE_COLUMNS).where(ImageTemplate.user_id == user.id)
+    results = (await session.exec(
+        paginate(query, ImageTemplate.image_template_id, cursor, offset, limit)
+    )).all()
+    results = page_results(response, results, limit, key=lambda template: template.image_template_id)
+    if not results:
+        return []
+
+    template_images = await select_template_images(session, user.id,
+                                                   [template.image_template_id for template in results])
+    thumbnails = {}
+    if include_thumbnail:
+        preview_ids = [images.preview_id for images in template_images.values() if images.preview_id]
+        thumbnails = await encoded_thumbnails(session, store, cache, preview_ids)
+
     templates = []
     for template in results:
-        if include_thumbnail:
-            image = session.query(Image).where(Image.user_id == user.id,
-                                               Image.template_id == template.image_template_id,
-                                               Image.preview == True).first()
-            if image:
-                b64_thumbnail = base64.b64encode(image.thumbnail).decode('ascii')
-                if template.base_image_format.lower() == "jpg":
-                    data_format = "jpeg"
-                else:
-                    data_format = template.base_image_format.lower()
-
-                thumbnail = f"data:image/{data_format};base64,{b64_thumbnail}"
-                thumbnail_id = image.image_id
-
-        if not include_thumbnail or not image:
-            thumbnail = None
-            thumbnail_id = None
-
-        images_generated = session.query(Image).where(
-            Image.template_id == template.image_template_id,
-            Image.preview == False
-        ).count()
+        images = template_images.get(template.image_template_id)
+        thumbnail = None
+        thumbnail_id = None
+        if images and images.preview_id in thumbnails:
+            thumbnail = f"data:{image_media_type(template.base_image_format)};base64,{thumbnails[images.preview_id]}"
+            thumbnail_id = images.preview_id
 
-        templates.append(ImageTemplateRead(**template.dict(),
-                                           thumbnail=thumbnail, thumbnail_id=thumbnail_id,
-                                           images_generated=images_generated))
+        template_read = {name: template._mapping[name] for name in TEMPLATE_READ_FIELDS}
+        template_read["images_generated"] = images.images_generated if images else 0
+        template_read["thumbnail"] = thumbnail
+        template_read["thumbnail_id"] = thumbnail_id
+        templates.append(template_read)
 
-    return templates
+    return list_response(templates, response)
 
 
 @router.get("/{image_template_id}", response_model=ImageTemplateRead)
 async def get_image_template(*,
-                             session: Session = Depends(get_session),
+                             session: AsyncSession = Depends(get_async_session),
                              user: UserDB = Depends(current_active_user),
+                             store: BlobStore = Depends(get_blob_store),
+                             cache: LRUCache = Depends(get_thumbnail_cache),
                              image_template_id: int,
                              include_thumbnail: bool
                              ):
-    image_template = session.query(ImageTemplate).where(ImageTemplate.user_id == user.id,
-                                                        ImageTemplate.image_template_id == image_template_id).first()
+    image_template = (await session.exec(
+        select(ImageTemplate).where(ImageTemplate.user_id == user.id,
+                                    ImageTemplate.image_template_id == image_template_id)
+    )).first()
     if not image_template:
         raise HTTPException(status_code=404, detail="Image template not found")
     if include_thumbnail:
-        image = session.query(Image).where(Image.user_id == user.id,
-                                           Image.template_id == image_template_id,
-                                           Image.preview == True).first()
+        image = await select_image(session, Image.user_id == user.id,
+                                   Image.template_id == image_template_id,
+                                   Image.preview == True)
         if not image:
             raise HTTPException(status_code=404, detail="Image template preview not found")
-        b64_thumbnail = base64.b64encode(image.thumbnail).decode('ascii')
+        b64_thumbnail = (await encoded_thumbnails(session, store, cache, [image.image_id],
+                                                  {image.image_id: image.thumbnail_hash}))[image.image_id]
         if image_template.base_image_format.lower() == "jpg":
             data_format = "jpeg"
         else:
@@ -151,10 +182,12 @@ async def get_image_template(*,
         thumbnail = f"data:image/{data_format};base64,{b64_thumbnail}"
         image_template = ImageTemplateRead(**image_template.dict(), thumbnail=thumbnail, thumbnail_id=image.image_id)
 
-    images_generated = session.query(Image).where(
-        Image.template_id == image_template.image_template_id,
-        Image.preview == False
-    ).count()
+    images_generated = (await session.exec(
+        select(func.count(Image.image_id)).where(
+            Image.template_id == image_template.image_template_id,
+            Image.preview == False
+        )
+    )).one()
 
     image_template = image_template.dict()
     image_template["images_generated"] = images_generated
@@ -164,7 +197,7 @@ async def get_image_template(*,
 
 # @router.patch("/{campaign_format_id}", response_model=CampaignFormatRead)
 # async def update_campaign_format(*,
-#     session: Session = Depends(get_session),
+#     session: AsyncSession = Depends(get_async_session),
 #     campaign_format_id: int,
 #     campaign_format: CampaignFormatUpdate
 # ):
@@ -187,20 +220,28 @@ async def get_image_template(*,
 
 @router.delete("/{image_template_id}")
 async def delete_image_template(*,
-                                session: Session = Depends(get_session),
+                                session: AsyncSession = Depends(get_async_session),
                                 user: UserDB = Depends(current_active_user),
+                                cache: LRUCache = Depends(get_thumbnail_cache),
                                 image_template_id: int
                                 ):
-    image_template = session.query(ImageTemplate).where(ImageTemplate.user_id == user.id,
-                                                        ImageTemplate.image_template_id == image_template_id).first()
+    image_template = (await session.exec(
+        select(ImageTemplate).where(ImageTemplate.user_id == user.id,
+                                    ImageTemplate.image_template_id == image_template_id)
+    )).first()
     if not image_template:
         raise HTTPException(status_code=404, detail="Image Template not found")
-    session.delete(image_template)
+    image_ids = (await session.exec(
+        select(Image.image_id).where(Image.template_id == image_template_id)
+    )).all()
+    await session.delete(image_template)
     try:
-        session.commit()
+        await session.commit()
     except IntegrityError as error:
         raise HTTPException(
             status_code=422,
             detail=str(error.__cause__).replace("\n", " ").strip()
         ) from error
+    for image_id in image_ids:
+        cache.pop(image_id)
     return {"ok": True}
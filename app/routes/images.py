@@ -1,17 +1,40 @@
-import json
+import hashlib
+import re
+from enum import Enum
+from typing import Optional
 from fastapi import (
     APIRouter,
     Depends,
     HTTPException,
+    Request,
+    Response,
 )
-from sqlmodel import Session
-from app.dependencies import get_session
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.blobs import BlobStore
+from app.cache import LRUCache
+from app.dependencies import (
+    get_async_session,
+    get_publisher,
+    get_blob_store,
+    get_thumbnail_cache,
+    IMAGE_JOB_INLINE_BASE_IMAGE,
+)
+from app.image_jobs import image_job_message, publish_query_images
+from app.broker import Publisher
 from app.users.users import current_active_user
 from app.users.models import UserDB
+from app.jobs import JobRunner, get_job_runner
 from app.models import (
     Image,
     ImageRead,
     ImageTemplate,
+    Job,
+    JobRead,
+    Query,
+    QueryImageGenerate,
     SingleImageGenerate,
 )
 import base64
@@ -28,89 +51,268 @@ SUCCESS_MESSAGE = f"Image has been submitted for generation. " \
                   "It will appear in your image list when done."
 
 
-def get_image_template(session, user_id, template_id):
-    return session.query(ImageTemplate).where(ImageTemplate.user_id == user_id,
-                                              ImageTemplate.image_template_id == template_id).first()
+# Generated images never change, clients can keep them
+CACHE_CONTROL = "private, max-age=86400"
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class ImageFile(str, Enum):
+    image = "image"
+    thumbnail = "thumbnail"
+
+
+# Everything but the legacy bytea columns, with whether the consumer left bytes in them
+IMAGE_COLUMNS = [column for column in Image.__table__.columns if column.name not in ("image", "thumbnail")] + [
+    Image.image.isnot(None).label("image_in_row"),
+    Image.thumbnail.isnot(None).label("thumbnail_in_row"),
+]
+
+
+async def select_image(session, *where):
+    """Image metadata with the blob store keys"""
+    return (await session.exec(select(*IMAGE_COLUMNS).where(*where))).first()
+
+
+def has_file(image, file: ImageFile) -> bool:
+    return bool(getattr(image, f"{file.value}_hash") or getattr(image, f"{file.value}_in_row"))
+
+
+async def select_row_bytes(session, file: ImageFile, image_ids) -> dict:
+    """Bytes of a file still held in the images' rows, not moved out to the blob store yet, by image id"""
+    column = getattr(Image, file.value)
+    rows = (await session.exec(select(Image.image_id, column).where(Image.image_id.in_(image_ids),
+                                                                   column.isnot(None)))).all()
+    return {image_id: bytes(data) for image_id, data in rows}
+
+
+async def select_thumbnail_hashes(session, image_ids) -> dict:
+    """Thumbnail blob keys by image id, in one query"""
+    rows = (await session.exec(select(Image.image_id, Image.thumbnail_hash).where(Image.image_id.in_(image_ids)))).all()
+    return {row.image_id: row.thumbnail_hash for row in rows}
+
+
+async def read_blob(store: BlobStore, digest: str) -> bytes:
+    return await run_in_threadpool(store.get, digest)
+
+
+async def read_blobs(store: BlobStore, digests: dict) -> dict:
+    """Read several blobs in a single trip to the threadpool, same keys as digests"""
+    return await run_in_threadpool(lambda: {key: store.get(digest) for key, digest in digests.items()})
+
+
+async def read_image_file(session, store: BlobStore, image, file: ImageFile) -> bytes:
+    """An image's file from the blob store, or from its row if the consumer's bytes haven't been moved out"""
+    digest = getattr(image, f"{file.value}_hash")
+    if digest:
+        return await read_blob(store, digest)
+    return (await select_row_bytes(session, file, [image.image_id]))[image.image_id]
+
+
+async def encoded_thumbnails(session, store: BlobStore, cache: LRUCache, image_ids,
+                             thumbnail_hashes: Optional[dict] = None) -> dict:
+    """Base64 thumbnails by image id, from the cache, misses are read from the blob store in one go.
+
+    thumbnail_hashes saves looking up the blob keys when the caller already has them.
+    Thumbnails not moved out of their row yet are read from it.
+    """
+    thumbnails = {}
+    missing = []
+    for image_id in image_ids:
+        encoded = cache.get(image_id)
+        if encoded is None:
+            missing.append(image_id)
+        else:
+            thumbnails[image_id] = encoded
+    if missing:
+        if thumbnail_hashes is None:
+            thumbnail_hashes = await select_thumbnail_hashes(session, missing)
+        blobs = await read_blobs(store, {image_id: thumbnail_hashes[image_id] for image_id in missing
+                                         if thumbnail_hashes.get(image_id)})
+        in_row = [image_id for image_id in missing if not thumbnail_hashes.get(image_id)]
+        if in_row:
+            blobs.update(await select_row_bytes(session, ImageFile.thumbnail, in_row))
+        for image_id, data in blobs.items():
+            encoded = base64.b64encode(data).decode('ascii')
+            cache.put(image_id, encoded)
+            thumbnails[image_id] = encoded
+    return thumbnails
+
+
+async def get_image_template(session, user_id, template_id):
+    """The template, its base image is in the blob store from its upload on"""
+    return (await session.exec(
+        select(ImageTemplate).where(ImageTemplate.user_id == user_id,
+                                    ImageTemplate.image_template_id == template_id)
+    )).first()
+
+
+def image_media_type(image_format):
+    if image_format.lower() == "jpg":
+        return "image/jpeg"
+    return f"image/{image_format.lower()}"
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """If-None-Match/If-Range check, weak comparison as allowed for If-None-Match"""
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or any(tag[2:] == etag if tag.startswith("W/") else tag == etag for tag in tags)
+
+
+def parse_range(header: str, size: int):
+    """(start, end) inclusive of a single byte range, None to ignore the header, raises 416 if unsatisfiable.
+
+    Multiple ranges are not supported, the full image is sent instead as the RFC allows.
+    """
+    match = RANGE_PATTERN.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    start, end = match.groups()
+    if start:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    else:
+        # Suffix range, the last n bytes
+        start = max(size - int(end), 0)
+        end = size - 1
+    if start > end or start >= size:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    return start, end
 
 
 @router.get("/{image_id}", response_model=ImageRead)
 async def get_image(*,
-                    session: Session = Depends(get_session),
+                    request: Request,
+                    session: AsyncSession = Depends(get_async_session),
                     user: UserDB = Depends(current_active_user),
-                    image_id: int
+                    store: BlobStore = Depends(get_blob_store),
+                    cache: LRUCache = Depends(get_thumbnail_cache),
+                    image_id: int,
+                    embed: bool = True
                     ):
     global SUCCESS_MESSAGE
 
-    image = session.query(Image).where(Image.user_id == user.id,
-                                       Image.image_id == image_id).first()
-    b64_image = base64.b64encode(image.image).decode('ascii')
-    b64_thumbnail = base64.b64encode(image.thumbnail).decode('ascii')
+    image = await select_image(session, Image.user_id == user.id, Image.image_id == image_id)
+    if not image or not has_file(image, ImageFile.image):
+        raise HTTPException(status_code=404, detail="Image not found")
 
-    if image.image_format.lower() == "jpg":
-        data_format = "jpeg"
-    else:
-        data_format = image.image_format.lower()
+    if not embed:
+        # Links to the binary endpoints, the image data isn't read at all
+        image = image._asdict()
+        image["image"] = request.url_for("get_image_file", image_id=image_id, file=ImageFile.image.value)
+        image["thumbnail"] = request.url_for("get_image_file", image_id=image_id, file=ImageFile.thumbnail.value)
+        return image
 
-    image.image = f"data:image/{data_format};base64,{b64_image}"
-    image.thumbnail = f"data:image/{data_format};base64,{b64_thumbnail}"
+    b64_image = base64.b64encode(await read_image_file(session, store, image, ImageFile.image)).decode('ascii')
+    b64_thumbnail = (await encoded_thumbnails(session, store, cache, [image_id],
+                                              {image_id: image.thumbnail_hash}))[image_id]
 
-    if not image:
-        raise HTTPException(status_code=404, detail="Image Template not found")
+    data_format = image_media_type(image.image_format)
+    image = image._asdict()
+    image["image"] = f"data:{data_format};base64,{b64_image}"
+    image["thumbnail"] = f"data:{data_format};base64,{b64_thumbnail}"
 
     return image
 
 
+@router.get("/{image_id}/{file}", response_class=Response,
+            responses={200: {"content": {"image/*": {}}}, 206: {"content": {"image/*": {}}}, 304: {}, 416: {}})
+async def get_image_file(*,
+                         request: Request,
+                         session: AsyncSession = Depends(get_async_session),
+                         user: UserDB = Depends(current_active_user),
+                         store: BlobStore = Depends(get_blob_store),
+                         image_id: int,
+                         file: ImageFile
+                         ):
+    """The raw image or thumbnail, with a strong ETag and single range support"""
+    image = await select_image(session, Image.user_id == user.id, Image.image_id == image_id)
+    if not image or not has_file(image, file):
+        raise HTTPException(status_code=404, detail="Image not found")
+    digest = getattr(image, f"{file.value}_hash")
+    data = None
+    if digest:
+        size = getattr(image, f"{file.value}_size")
+    else:
+        # Not moved out of the row yet, hashed as the blob store will key it
+        data = (await select_row_bytes(session, file, [image_id]))[image_id]
+        digest, size = hashlib.sha256(data).hexdigest(), len(data)
+
+    # The blob store key is the SHA-256 of the content, a strong validator as is
+    etag = f'"{digest}"'
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Accept-Ranges": "bytes"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    start, end = 0, size - 1
+    status_code = 200
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range == etag):
+        byte_range = parse_range(range_header, size)
+        if byte_range:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    media_type = image_media_type(image.image_format)
+    if data is not None:
+        return Response(data[start:end + 1], status_code=status_code, headers=headers, media_type=media_type)
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(store.iter_range(digest, start, end), status_code=status_code,
+                             headers=headers, media_type=media_type)
+
+
 @router.post("/generate_single_image")
 async def single_image_generate(*,
-                                session: Session = Depends(get_session),
+                                session: AsyncSession = Depends(get_async_session),
                                 user: UserDB = Depends(current_active_user),
+                                publisher: Publisher = Depends(get_publisher),
+                                store: BlobStore = Depends(get_blob_store),
                                 parameters: SingleImageGenerate
                                 ):
     global SUCCESS_MESSAGE
 
-    image_template = get_image_template(session, user.id, parameters.image_template_id)
+    image_template = await get_image_template(session, user.id, parameters.image_template_id)
     if not image_template:
         raise HTTPException(status_code=404, detail="Image Template not found")
 
-    # Build dict with all the info required for the Image generation consumer
-    image_template = image_template.dict()
-    image_template["base_image"] = base64.b64encode(image_template["base_image"]).decode('ascii')
-    message_body = {
-        "template": image_template,
-        "parameters": parameters.dict()
-    }
-    message_body = json.dumps(message_body, default=str)
+    # The consumer fetches the base image from the blob store by its hash
+    base_image = None
+    if IMAGE_JOB_INLINE_BASE_IMAGE:
+        base_image = await read_blob(store, image_template.base_image_hash)
+    message_body = image_job_message(image_template, parameters.dict(), base_image)
 
-    rmq, rmqc = rmq_init()
-    rmqc.basic_publish(exchange='B2B', routing_key='image_generation', body=message_body)
-    rmq.close()
+    await publisher.publish("image_generation", message_body)
 
     return {"ok": True, "message": SUCCESS_MESSAGE}
 
-# @router.post("/generate_query_images")
-# async def query_images_generate(*,
-#                                 session: Session = Depends(get_session),
-#                                 user: UserDB = Depends(current_active_user),
-#                                 parameters: QueryImageGenerate
-#                                 ):
-#     global SUCCESS_MESSAGE
-#
-#     image_template = get_image_template(session, user.id, parameters.image_template_id)
-#     if not image_template:
-#         raise HTTPException(status_code=404, detail="Image Template not found")
-#     query = session.query(ImageTemplate).where(ImageTemplate.user_id == user_id,
-#                                               ImageTemplate.image_template_id == template_id).first()
-#
-#     # Build dict with all the info required for the Image generation consumer
-#     image_template = image_template.dict()
-#     image_template["base_image"] = base64.b64encode(image_template["base_image"]).decode('ascii')
-#     message_body = {
-#         "template": image_template,
-#         "parameters": parameters.dict()
-#     }
-#     message_body = json.dumps(message_body, default=str)
-#
-#     rmq, rmqc = rmq_init()
-#     rmqc.basic_publish(exchange='B2B', routing_key='image_generation', body=message_body)
-#
-#     return {"ok": True, "message": SUCCESS_MESSAGE}
+
+@router.post("/generate_query_images", response_model=JobRead, status_code=202)
+async def query_images_generate(*,
+                                session: AsyncSession = Depends(get_async_session),
+                                user: UserDB = Depends(current_active_user),
+                                runner: JobRunner = Depends(get_job_runner),
+                                parameters: QueryImageGenerate
+                                ):
+    """Generate one image per employee of the query, poll /jobs/{job_id} for progress"""
+    image_template = await get_image_template(session, user.id, parameters.image_template_id)
+    if not image_template:
+        raise HTTPException(status_code=404, detail="Image Template not found")
+    query = (await session.exec(
+        select(Query.query_id).where(Query.user_id == user.id,
+                                     Query.query_id == parameters.query_id,
+                                     Query.is_active == True)
+    )).first()
+    if not query:
+        raise HTTPException(status_code=404, detail="Query not found")
+
+    job = Job(kind="image_generation", query_id=parameters.query_id, user_id=user.id,
+              submitted=0, rendered=0, failed=0)
+    session.add(job)
+    await session.commit()
+
+    runner.submit(job.job_id, publish_query_images, job.job_id, parameters.image_template_id, parameters.query_id)
+    return job
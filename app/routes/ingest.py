@@ -0,0 +1,81 @@
+from datetime import datetime
+from asyncpg.exceptions import DataError as CopyDataError
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Request,
+)
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.exc import DataError, IntegrityError
+from app.dependencies import get_async_session
+from app.ingest import IngestError, IngestFormat, ingest, parse_records
+from app.users.users import current_active_user
+from app.users.models import UserDB
+from app.models import (
+    Query,
+    QueryIngested,
+)
+
+router = APIRouter(
+    prefix="/ingest",
+    tags=["Ingest"],
+    # dependencies=[Depends(current_active_user)],
+    responses={404: {"description": "Not found"}},
+)
+
+
+@router.post("/{query_id}", response_model=QueryIngested,
+             openapi_extra={"requestBody": {"required": True, "content": {
+                 ingest_format.value: {"schema": {"type": "string"}} for ingest_format in IngestFormat
+             }}})
+async def ingest_query(*,
+                       request: Request,
+                       session: AsyncSession = Depends(get_async_session),
+                       user: UserDB = Depends(current_active_user),
+                       query_id: int,
+                       finish: bool = True
+                       ):
+    """Bulk load companies with their employees and maps data into the query, as NDJSON or CSV.
+
+    The formats are described in app/ingest.py. With finish the query is marked
+    finished, leave it off to load a query in several requests.
+    """
+    query = (await session.exec(
+        select(Query).where(Query.user_id == user.id,
+                            Query.query_id == query_id,
+                            Query.is_active == True)
+    )).first()
+    if not query:
+        raise HTTPException(status_code=404, detail="Query not found")
+
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    try:
+        ingest_format = IngestFormat(content_type)
+    except ValueError:
+        raise HTTPException(
+            status_code=415,
+            detail=f"Content type must be one of {', '.join(f.value for f in IngestFormat)}"
+        )
+
+    try:
+        inserted = await ingest(session, query_id, parse_records(request.stream(), ingest_format))
+    except IngestError as error:
+        raise HTTPException(status_code=422, detail=str(error)) from error
+    # The COPY goes through asyncpg directly, its errors aren't wrapped by SQLAlchemy,
+    # numbers out of the column's range don't even reach the server
+    except (IntegrityError, DataError, CopyDataError, OverflowError) as error:
+        raise HTTPException(
+            status_code=422,
+            detail=str(getattr(error, "__cause__", None) or error).replace("\n", " ").strip()
+        ) from error
+
+    finished_at = query.finished_at
+    if finish:
+        finished_at = query.finished_at = datetime.utcnow()
+        session.add(query)
+    await session.commit()
+
+    return {"companies": inserted["companies"], "employees": inserted["employees"],
+            "maps_data": inserted["companies_maps_data"], "finished_at": finished_at}
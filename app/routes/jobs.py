@@ -0,0 +1,36 @@
+import uuid
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+)
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.dependencies import get_async_session
+from app.users.users import current_active_user
+from app.users.models import UserDB
+from app.models import (
+    Job,
+    JobRead,
+)
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["Jobs"],
+    # dependencies=[Depends(current_active_user)],
+    responses={404: {"description": "Not found"}},
+)
+
+
+@router.get("/{job_id}", response_model=JobRead)
+async def get_job(*,
+                  session: AsyncSession = Depends(get_async_session),
+                  user: UserDB = Depends(current_active_user),
+                  job_id: uuid.UUID
+                  ):
+    job = (await session.exec(
+        select(Job).where(Job.job_id == job_id, Job.user_id == user.id)
+    )).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
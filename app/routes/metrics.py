@@ -0,0 +1,29 @@
+import secrets
+from typing import Optional
+
+from fastapi import (
+    APIRouter,
+    Header,
+    HTTPException,
+)
+from fastapi.responses import PlainTextResponse
+
+from app import metrics
+from app.dependencies import METRICS_TOKEN
+
+router = APIRouter(
+    tags=["Metrics"],
+)
+
+# Starlette appends the charset
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics(authorization: Optional[str] = Header(None)):
+    """Prometheus scrape endpoint, not served unless METRICS_TOKEN is set"""
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
@@ -1,14 +1,18 @@
-from typing import List
+from typing import List, Optional
 import datetime
 from fastapi import (
     APIRouter,
     Depends,
     HTTPException,
-    Query
+    Query,
+    Response
 )
-from sqlmodel import Session
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.exc import IntegrityError
-from app.dependencies import get_session
+from app.dependencies import get_async_session
+from app.pagination import paginate, page_results
+from app.responses import model_columns, list_response
 from app.users.users import current_active_user
 from app.users.models import UserDB
 from app.models import (
@@ -23,17 +27,19 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+PROJECT_COLUMNS = model_columns(ProjectRead, Project)
+
 
 @router.post("/new")
 async def create_project(*,
-                         session: Session = Depends(get_session),
+                         session: AsyncSession = Depends(get_async_session),
                          user: UserDB = Depends(current_active_user),
                          project_name: str
                          ):
     session.add(Project(name=project_name, user_id=user.id))
 
     try:
-        session.commit()
+        await session.commit()
     except IntegrityError as error:
         raise HTTPException(
             status_code=422,
@@ -43,25 +49,32 @@ async def create_project(*,
 
 @router.get("/", response_model=List[ProjectRead])
 async def get_all_projects(*,
-                           session: Session = Depends(get_session),
+                           session: AsyncSession = Depends(get_async_session),
                            user: UserDB = Depends(current_active_user),
+                           response: Response,
                            offset: int = 0,
-                           limit: int = Query(default=100, lte=100)
+                           limit: int = Query(default=100, lte=100),
+                           cursor: Optional[str] = None
                            ):
-    query = session.query(Project).where(Project.user_id == user.id, Project.is_active == True)
-    results = query.offset(offset).limit(limit).all()
-    return results
+    query = select(*PROJECT_COLUMNS).where(Project.user_id == user.id, Project.is_active == True)
+    results = (await session.exec(
+        paginate(query, Project.project_id, cursor, offset, limit)
+    )).all()
+    results = page_results(response, results, limit, key=lambda project: project.project_id)
+    return list_response([project._asdict() for project in results], response)
 
 
 @router.get("/{project_id}", response_model=ProjectRead)
 async def get_project(*,
-                      session: Session = Depends(get_session),
+                      session: AsyncSession = Depends(get_async_session),
                       user: UserDB = Depends(current_active_user),
                       project_id: int
                       ):
-    project = session.query(Project).where(Project.user_id == user.id,
-                                           Project.project_id == project_id,
-                                           Project.is_active == True).first()
+    project = (await session.exec(
+        select(Project).where(Project.user_id == user.id,
+                              Project.project_id == project_id,
+                              Project.is_active == True)
+    )).first()
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     return project
@@ -69,18 +82,20 @@ async def get_project(*,
 
 @router.delete("/{project_id}")
 async def delete_project(*,
-                         session: Session = Depends(get_session),
+                         session: AsyncSession = Depends(get_async_session),
                          user: UserDB = Depends(current_active_user),
                          project_id: int
                          ):
-    project = session.query(Project).where(Project.user_id == user.id,
-                                           Project.project_id == project_id).first()
+    project = (await session.exec(
+        select(Project).where(Project.user_id == user.id,
+                              Project.project_id == project_id)
+    )).first()
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     project.is_active = False
     project.updated_at = datetime.datetime.utcnow()
     try:
-        session.commit()
+        await session.commit()
     except IntegrityError as error:
         raise HTTPException(
             status_code=422,
@@ -3,12 +3,16 @@ from fastapi import (
     APIRouter,
     Depends,
     HTTPException,
-    Query as QueryFastapi
+    Query as QueryFastapi,
+    Response
 )
 from typing import Optional
-from sqlmodel import Session
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.exc import IntegrityError
-from app.dependencies import get_session
+from app.dependencies import get_async_session
+from app.pagination import paginate, page_results
+from app.responses import model_columns, list_response
 from app.users.users import current_active_user
 from app.users.models import UserDB
 
@@ -24,39 +28,47 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+QUERY_COLUMNS = model_columns(QueryRead, Query)
+
 
 @router.get("/", response_model=List[QueryRead])
 async def get_all_queries(*,
-                          session: Session = Depends(get_session),
+                          session: AsyncSession = Depends(get_async_session),
                           user: UserDB = Depends(current_active_user),
+                          response: Response,
                           project_id: Optional[int] = None,
                           offset: int = 0,
-                          limit: int = QueryFastapi(default=100, lte=100)
+                          limit: int = QueryFastapi(default=100, lte=100),
+                          cursor: Optional[str] = None
                           ):
     if project_id:
-        query = session.query(Query).where(Query.user_id == user.id,
-                                           Query.project_id == project_id,
-                                           Query.is_active == True)
-        results = query.offset(offset).limit(limit).all()
+        query = select(*QUERY_COLUMNS).where(Query.user_id == user.id,
+                                             Query.project_id == project_id,
+                                             Query.is_active == True)
     else:
-        query = session.query(Query).where(Query.user_id == user.id,
-                                           Query.is_active == True)
-        results = query.offset(offset).limit(limit).all()
+        query = select(*QUERY_COLUMNS).where(Query.user_id == user.id,
+                                             Query.is_active == True)
+    results = (await session.exec(
+        paginate(query, Query.query_id, cursor, offset, limit)
+    )).all()
 
     if not results:
         return []
-    return results
+    results = page_results(response, results, limit, key=lambda query: query.query_id)
+    return list_response([query._asdict() for query in results], response)
 
 
 @router.get("/{query_id}", response_model=QueryRead)
 async def get_query(*,
-                    session: Session = Depends(get_session),
+                    session: AsyncSession = Depends(get_async_session),
                     user: UserDB = Depends(current_active_user),
                     query_id: int
                     ):
-    query = session.query(Query).where(Query.user_id == user.id,
-                                       Query.query_id == query_id,
-                                       Query.is_active == True).first()
+    query = (await session.exec(
+        select(Query).where(Query.user_id == user.id,
+                            Query.query_id == query_id,
+                            Query.is_active == True)
+    )).first()
     if not query:
         raise HTTPException(status_code=404, detail="Query not found")
     return query
@@ -64,17 +76,19 @@ async def get_query(*,
 
 @router.delete("/{query_id}")
 async def delete_query(*,
-                       session: Session = Depends(get_session),
+                       session: AsyncSession = Depends(get_async_session),
                        user: UserDB = Depends(current_active_user),
                        query_id: int
                        ):
-    query = session.query(Query).where(Query.user_id == user.id,
-                                       Query.query_id == query_id).first()
+    query = (await session.exec(
+        select(Query).where(Query.user_id == user.id,
+                            Query.query_id == query_id)
+    )).first()
     if not query:
         raise HTTPException(status_code=404, detail="Query not found")
     query.is_active = False
     try:
-        session.commit()
+        await session.commit()
     except IntegrityError as error:
         raise HTTPException(
             status_code=422,
@@ -1,6 +1,5 @@
-import csv
-import io
-import gspread
+from collections import Counter
+from datetime import datetime
 
 from fastapi import (
     APIRouter,
@@ -8,18 +7,81 @@ from fastapi import (
     HTTPException,
 )
 from fastapi.responses import StreamingResponse
-from sqlmodel import Session
-from app.dependencies import get_session
+from sqlmodel import Session, select, true
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.dependencies import engine, get_async_session
+from app.jobs import JobRunner, get_job_runner
+from app.sheets import get_sheets_client
 from app.users.users import current_active_user
 from app.users.models import UserDB
-from app.routes.companies import populate_emails
+from app.routes.companies import best_contact
+from app.exports import (
+    stream_batches,
+    csv_chunks,
+    gzip_chunks,
+    columnar_response,
+    ExportFormat,
+)
 
 from app.models import (
     Query,
     Company,
     CompaniesMapsData,
+    Employee,
+    Job,
+    JobRead,
 )
 
+CSV_HEADER = ["Company", "Website", "Employee name",
+              "Employee position", "Employee email",
+              "Contact Email", "Facebook", "Twitter",
+              "Youtube", "LinkedIn", "Instagram",
+              "Phone"]
+
+
+def select_csv_rows(query_id):
+    """One plain row per company in the CSV column order, no ORM objects"""
+    contact = best_contact()
+    return select(Company.name, Company.website,
+                  contact.c.full_name, contact.c.position, contact.c.email,
+                  Company.contact_email, Company.facebook, Company.twitter,
+                  Company.youtube, Company.linkedin, Company.instagram,
+                  Company.phone)\
+        .outerjoin(contact, true())\
+        .where(Company.query_id == query_id)\
+        .order_by(Company.company_id)
+
+
+def select_company_records(query_id):
+    """Companies of the query with their maps data and best contact, one flat row each"""
+    contact = best_contact()
+    maps = select(CompaniesMapsData)\
+        .where(CompaniesMapsData.company_id == Company.company_id)\
+        .order_by(CompaniesMapsData.maps_data_id)\
+        .limit(1)\
+        .lateral("maps")
+    return select(*Company.__table__.columns,
+                  maps.c.search_position, maps.c.lat, maps.c.long,
+                  maps.c.rating, maps.c.reviews,
+                  maps.c.type.label("maps_type"), maps.c.thumbnail.label("maps_thumbnail"),
+                  contact.c.full_name.label("best_contact_full_name"),
+                  contact.c.position.label("best_contact_position"),
+                  contact.c.email.label("best_contact_email"))\
+        .select_from(Company)\
+        .outerjoin(maps, true())\
+        .outerjoin(contact, true())\
+        .where(Company.query_id == query_id)\
+        .order_by(Company.company_id)
+
+
+def select_employee_records(query_id):
+    """All employees of the query's companies, with the company name, company by company"""
+    return select(*Employee.__table__.columns, Company.name.label("company_name"))\
+        .join(Company, Company.company_id == Employee.company_id)\
+        .where(Company.query_id == query_id)\
+        .order_by(Company.company_id, Employee.employee_id)
+
+
 router = APIRouter(
     prefix="/export",
     tags=["Query Export"],
@@ -29,82 +91,103 @@ router = APIRouter(
 
 @router.get("/{query_id}/csv")
 async def export_csv(*,
-                     session: Session = Depends(get_session),
+                     session: AsyncSession = Depends(get_async_session),
                      user: UserDB = Depends(current_active_user),
-                     query_id: int
+                     query_id: int,
+                     gzip: bool = False
                      ):
-    query = session.query(Query).where(Query.user_id == user.id,
-                                       Query.query_id == query_id).first()
+    query = (await session.exec(
+        select(Query).where(Query.user_id == user.id,
+                            Query.query_id == query_id)
+    )).first()
+    if not query:
+        raise HTTPException(status_code=404, detail="Query not found")
+
+    # Rows are read and written out in batches as the client downloads,
+    # so memory use doesn't grow with the size of the query
+    chunks = csv_chunks(CSV_HEADER, stream_batches(select_csv_rows(query_id)))
+    filename = f"B2B_export_{query.query_id}.csv"
+    media_type = "text/csv"
+    if gzip:
+        chunks = gzip_chunks(chunks)
+        filename += ".gz"
+        media_type = "application/gzip"
+
+    headers = {
+        'Content-Disposition': f'attachment; filename="{filename}"'
+    }
+    return StreamingResponse(chunks,
+                             media_type=media_type,
+                             headers=headers)
+
+
+@router.get("/{query_id}/companies/{export_format}")
+async def export_companies(*,
+                           session: AsyncSession = Depends(get_async_session),
+                           user: UserDB = Depends(current_active_user),
+                           query_id: int,
+                           export_format: ExportFormat
+                           ):
+    query = (await session.exec(
+        select(Query).where(Query.user_id == user.id,
+                            Query.query_id == query_id)
+    )).first()
     if not query:
         raise HTTPException(status_code=404, detail="Query not found")
 
-    companies = session.query(Company).where(Company.query_id == query_id).all()
-    companies = populate_emails(companies)
-
-    with io.StringIO() as buffer:
-        writer = csv.writer(buffer)
-        # Headers
-        writer.writerow(["Company", "Website", "Employee name",
-                         "Employee position", "Employee email",
-                         "Contact Email", "Facebook", "Twitter",
-                         "Youtube", "LinkedIn", "Instagram",
-                         "Phone"])
-        # Rows
-        for c in companies:
-            writer.writerow([c["name"], c["website"],
-                             c["email"]["full_name"] if c.get("email") else "",
-                             c["email"]["position"] if c.get("email") else "",
-                             c["email"]["email"] if c.get("email") else "",
-                             c["contact_email"], c["facebook"], c["twitter"],
-                             c["youtube"], c["linkedin"], c["instagram"],
-                             c["phone"]])
-
-        headers = {
-            'Content-Disposition': f'attachment; filename="B2B_export_{query.query_id}.csv"'
-        }
-        return StreamingResponse(iter([buffer.getvalue()]),
-                                 media_type="text/csv",
-                                 headers=headers)
-
-
-@router.get("/{query_id}/sheet")
+    return columnar_response(select_company_records(query_id), export_format,
+                             f"B2B_companies_{query.query_id}")
+
+
+@router.get("/{query_id}/employees/{export_format}")
+async def export_employees(*,
+                           session: AsyncSession = Depends(get_async_session),
+                           user: UserDB = Depends(current_active_user),
+                           query_id: int,
+                           export_format: ExportFormat
+                           ):
+    query = (await session.exec(
+        select(Query).where(Query.user_id == user.id,
+                            Query.query_id == query_id)
+    )).first()
+    if not query:
+        raise HTTPException(status_code=404, detail="Query not found")
+
+    return columnar_response(select_employee_records(query_id), export_format,
+                             f"B2B_employees_{query.query_id}")
+
+
+@router.post("/{query_id}/sheet", response_model=JobRead, status_code=202)
 async def export_sheet(*,
-                       session: Session = Depends(get_session),
+                       session: AsyncSession = Depends(get_async_session),
                        user: UserDB = Depends(current_active_user),
+                       runner: JobRunner = Depends(get_job_runner),
                        query_id: int,
                        share_email: str = None
                        ):
-    query = session.query(Query).where(Query.user_id == user.id,
-                                       Query.query_id == query_id).first()
+    query = (await session.exec(
+        select(Query).where(Query.user_id == user.id,
+                            Query.query_id == query_id)
+    )).first()
     if not query:
         raise HTTPException(status_code=404, detail="Query not found")
 
-    companies = session.query(Company).where(Company.query_id == query_id).all()
-
-    # Connect to gsheets using a service account connection key file in home dir
-    gc = gspread.service_account(filename="/run/secrets/service_account")
+    # Building the sheet takes a while on large queries, it is polled for on /jobs/{job_id}
+    job = Job(kind="sheet_export", user_id=user.id, query_id=query_id)
+    session.add(job)
+    await session.commit()
+    runner.submit(job.job_id, write_sheet, query_id, share_email)
+    return job
 
-    # Open a sheet from a spreadsheet in one go
-    if query.type == "standard":
-        sh = gc.create(f"[B2B] {query.sector} in {query.location}")
-    elif query.type == "from_csv":
-        sh = gc.create(f"[B2B] CSV import #{query.id}")
-    else:
-        sh = gc.create(f"[B2B] Unknown query type (TODO) #{query.id}")
 
-    # Share with the email if provided
-    if share_email:
-        sh.share(share_email, perm_type='user', role='writer')
-    else:
-        # Open the spreadsheet to anyone with URL otherwise
-        sh.share('', perm_type='anyone', role='reader')
+def write_sheet(query_id, share_email):
+    # All the data up front, in three queries
+    with Session(engine) as session:
+        query = session.get(Query, query_id)
+        companies = session.execute(select_company_records(query_id)).all()
+        all_employees = session.execute(select_employee_records(query_id)).all()
 
-    # Setup the required worksheets, delete the default sheet,
-    sum_sheet = sh.add_worksheet(title="Summary", rows="100", cols="20")
-    com_sheet = sh.add_worksheet(title="Companies", rows="100", cols="20")
-    emp_sheet = sh.add_worksheet(title="Employees", rows="100", cols="20")
-    stat_sheet = sh.add_worksheet(title="Stats", rows="100", cols="20")
-    sh.del_worksheet(sh.sheet1)
+    employees_found = Counter(emp.company_id for emp in all_employees)
 
     # Populate the Companies sheet with headers and data
     com_rows = [["Company Name", "Website", "Employee Email",
@@ -112,65 +195,49 @@ async def export_sheet(*,
                  "Linkedin", "Twitter", "Facebook", "Instagram",
                  "Youtube", "Maps Rating", "Maps Reviews", "Maps Lat Long"]]
 
-    all_employees = []
     for comp in companies:
-        employees = comp.employees
-        all_employees.extend(comp.employees)
-        maps_data = session.query(CompaniesMapsData).where(CompaniesMapsData.company_id == comp.company_id).first()
-        comp = populate_emails([comp])[0]
-
-        if not comp.get("email"):
-            comp["email"] = {"email": None, "full_name": None, "position": None}
-        single_row = [comp["name"], comp["website"], comp["email"]["email"], comp["email"]["full_name"],
-                      len(employees), comp["phone"], comp["full_address"],
-                      comp["linkedin"], comp["twitter"], comp["facebook"],
-                      comp["instagram"], comp["youtube"]]
-        if maps_data:
-            single_row.extend([maps_data.rating, maps_data.reviews,
-                               f"{maps_data.lat},{maps_data.long}"])
+        single_row = [comp.name, comp.website, comp.best_contact_email, comp.best_contact_full_name,
+                      employees_found[comp.company_id], comp.phone, comp.full_address,
+                      comp.linkedin, comp.twitter, comp.facebook,
+                      comp.instagram, comp.youtube]
+        # No maps data row joined, lat is never NULL in one that is
+        if comp.lat is not None:
+            single_row.extend([comp.rating, comp.reviews, f"{comp.lat},{comp.long}"])
 
         com_rows.append(single_row)
 
-    com_sheet.update(f"A1:O{len(com_rows)}", com_rows)
-
     # Populate the employees table with headers and all employees of the companies in the query
     emp_rows = [["Company Name", "Full Name", "Position",
                  "Email", "Rank Score", "Linkedin URL"]]
 
     for emp in all_employees:
-        emp_rows.append([emp.company.name, emp.full_name, emp.position, emp.email, emp.rank_score, emp.linkedin_url])
-
-    emp_sheet.update(f"A1:F{len(emp_rows)}", emp_rows)
+        emp_rows.append([emp.company_name, emp.full_name, emp.position, emp.email, emp.rank_score, emp.linkedin_url])
 
     # Populate the summary sheet with short format table of all emails found and their most vital info
     # Collect and calculate stats for the stat sheet
-    emails_found = 0
-    employees_with_emails = []
-    for employee in all_employees:
-        if employee.email and len(employee.email) > 2:
-            emails_found += 1
-            employees_with_emails.append(employee)
+    employees_with_emails = [emp for emp in all_employees if emp.email and len(emp.email) > 2]
+    emails_found = len(employees_with_emails)
 
     if emails_found == 0:
         email_rate = 0
     else:
         email_rate = (emails_found / len(companies)) * 100
 
-    time_taken = query.finished_at - query.started_at
+    finished_at = query.finished_at or datetime.utcnow()
+    time_taken = finished_at - query.started_at
     minutes_taken = time_taken.seconds // 60
-    stat_sheet.update("A1:K8",
-                      [[None, "Query Stats:", None],
-                       [f"Launched", "Finished", "Time Taken"],
-                       [f"{query.started_at.strftime('%d/%m/%Y, %H:%M:%S')}",
-                        f"{query.finished_at.strftime('%d/%m/%Y, %H:%M:%S')}", f"{minutes_taken} minutes"],
+    stat_rows = [[None, "Query Stats:", None],
+                 [f"Launched", "Finished", "Time Taken"],
+                 [f"{query.started_at.strftime('%d/%m/%Y, %H:%M:%S')}",
+                  f"{finished_at.strftime('%d/%m/%Y, %H:%M:%S')}" if query.finished_at else "In progress",
+                  f"{minutes_taken} minutes"],
 
-                       ["Emails", "Email Rate", "Employees"],
-                       [f"{emails_found}", f"{email_rate:.1f}%", f"{len(all_employees)}"],
+                 ["Emails", "Email Rate", "Employees"],
+                 [f"{emails_found}", f"{email_rate:.1f}%", f"{len(all_employees)}"],
 
-                       [None, f"Companies", None],
-                       [None, f"{len(companies)}", None]
-                       ]
-                      )
+                 [None, f"Companies", None],
+                 [None, f"{len(companies)}", None]
+                 ]
 
     # Short format table of results with emails
     sum_rows = [["Email", "First Name", "Last Name", "Position", "Company"]]
@@ -178,10 +245,44 @@ async def export_sheet(*,
     for employee in employees_with_emails:
         sum_rows.append([employee.email, employee.first_name,
                          employee.last_name, employee.position,
-                         employee.company.name])
-    sum_sheet.update(f"A1:E{len(sum_rows)}", sum_rows)
+                         employee.company_name])
+
+    sheets = [("Summary", sum_rows), ("Companies", com_rows),
+              ("Employees", emp_rows), ("Stats", stat_rows)]
+
+    gc = get_sheets_client()
+
+    # Open a sheet from a spreadsheet in one go
+    if query.type == "standard":
+        sh = gc.create(f"[B2B] {query.sector} in {query.location}")
+    elif query.type == "from_csv":
+        sh = gc.create(f"[B2B] CSV import #{query.query_id}")
+    else:
+        sh = gc.create(f"[B2B] Unknown query type (TODO) #{query.query_id}")
+
+    # Share with the email if provided
+    if share_email:
+        sh.share(share_email, perm_type='user', role='writer')
+    else:
+        # Open the spreadsheet to anyone with URL otherwise
+        sh.share('', perm_type='anyone', role='reader')
 
-    # Create a stats sheet, with some info on the rates and numbers
+    # Setup all the worksheets in a single request, the default sheet (sheetId 0) becomes the Summary
+    requests = []
+    for sheet_id, (title, rows) in enumerate(sheets):
+        properties = {"sheetId": sheet_id, "title": title,
+                      "gridProperties": {"rowCount": max(len(rows), 100), "columnCount": 20}}
+        if sheet_id == 0:
+            requests.append({"updateSheetProperties": {"properties": properties, "fields": "title,gridProperties"}})
+        else:
+            requests.append({"addSheet": {"properties": properties}})
+    sh.batch_update({"requests": requests})
+
+    # And all their values in another one
+    sh.values_batch_update({
+        "valueInputOption": "RAW",
+        "data": [{"range": f"'{title}'!A1", "values": rows} for title, rows in sheets]
+    })
 
     return {"sheet_url": f"https://docs.google.com/spreadsheets/d/{sh.id}",
             "sheet_title": sh.title}
@@ -1,21 +1,26 @@
 import json
 
-import pika
-from typing import List, Optional
+from datetime import datetime
+from typing import Optional
 from fastapi import (
     APIRouter,
     Depends,
     HTTPException,
+    Request,
 )
-from sqlmodel import Session
-from app.dependencies import get_session
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.dependencies import get_async_session, CSV_QUERY_BATCH_SIZE
+from app.ingest import IngestError, IngestFormat, csv_companies
 from app.users.users import current_active_user
 from app.users.models import UserDB
-from app.dependencies import rmq_init
+from app.dependencies import get_publisher
+from app.broker import Publisher
 
 from app.models import (
+    CsvQueryRead,
+    Project,
     Query,
-    QueryRead,
 )
 
 router = APIRouter(
@@ -29,7 +34,7 @@ router = APIRouter(
 @router.post("/new/location")
 async def launch_location_query(*,
                                 user: UserDB = Depends(current_active_user),
-                                rmq: pika.connection.Connection = Depends(rmq_init),
+                                publisher: Publisher = Depends(get_publisher),
                                 sector: str,
                                 location: str,
                                 project_id: int,
@@ -42,12 +47,6 @@ async def launch_location_query(*,
     # That way if user has exceeded or matched theyr query limit
     # the query does not get through to the RMQ queue
 
-    # Setup pika connection and declare all needed exchanges/queues
-    rmqc = rmq.channel()
-    rmqc.exchange_declare(exchange='B2B', durable=True)
-    rmqc.queue_declare(queue="new_queries")
-    rmqc.queue_bind(exchange='B2B', queue='new_queries')
-
     params = {"sector": sector, "location": location}
     message_body = json.dumps(
         {"query_type": "location",
@@ -56,7 +55,87 @@ async def launch_location_query(*,
          "params": params,
          }
     )
-    rmqc.basic_publish(exchange='B2B', routing_key='new_queries', body=message_body)
-    rmq.close()
+    await publisher.publish("new_queries", message_body)
 
     return {"ok": True}
+
+
+@router.post("/new/csv", response_model=CsvQueryRead, status_code=201,
+             openapi_extra={"requestBody": {"required": True, "content": {
+                 IngestFormat.csv.value: {"schema": {"type": "string"}}
+             }}})
+async def launch_csv_query(*,
+                           request: Request,
+                           session: AsyncSession = Depends(get_async_session),
+                           user: UserDB = Depends(current_active_user),
+                           publisher: Publisher = Depends(get_publisher),
+                           project_id: int
+                           ):
+    """Launch a query enriching the companies of a CSV, its header naming CompanyBase fields.
+
+    The upload is parsed as it is received and published to new_queries every
+    CSV_QUERY_BATCH_SIZE companies, only one batch is held at a time. The
+    query's rows_submitted counts the companies published so far, rows_total
+    is set once the upload is over, however it ends. A malformed row ends it
+    there, the companies before it are launched all the same and the row's
+    error is returned with the query.
+    """
+    project = (await session.exec(
+        select(Project).where(Project.user_id == user.id,
+                              Project.project_id == project_id,
+                              Project.is_active == True)
+    )).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type != IngestFormat.csv.value:
+        raise HTTPException(status_code=415, detail=f"Content type must be {IngestFormat.csv.value}")
+
+    companies = csv_companies(request.stream())
+    batch = []
+    try:
+        # Header errors are found before the query is created
+        batch.append(await companies.__anext__())
+    except StopAsyncIteration:
+        raise HTTPException(status_code=422, detail="No companies in the file")
+    except IngestError as error:
+        raise HTTPException(status_code=422, detail=str(error)) from error
+
+    query = Query(type="from_csv", user_id=user.id, project_id=project_id,
+                  started_at=datetime.utcnow(), rows_submitted=0)
+    session.add(query)
+    await session.commit()
+
+    async def submit(batch):
+        message_body = json.dumps(
+            {"query_type": "from_csv",
+             "user_id": str(user.id),
+             "project_id": project_id,
+             "query_id": query.query_id,
+             "params": {"companies": batch},
+             }
+        )
+        await publisher.publish("new_queries", message_body)
+        query.rows_submitted += len(batch)
+        session.add(query)
+
+    error = None
+    try:
+        try:
+            async for company in companies:
+                batch.append(company)
+                if len(batch) == CSV_QUERY_BATCH_SIZE:
+                    await submit(batch)
+                    await session.commit()
+                    batch = []
+        except IngestError as row_error:
+            error = f"{row_error}, the companies before it were launched"
+        if batch:
+            await submit(batch)
+    finally:
+        # Done with the upload, even cut short, pollers shouldn't wait on more rows
+        query.rows_total = query.rows_submitted
+        session.add(query)
+        await session.commit()
+    return CsvQueryRead(**query.dict(), error=error)
@@ -0,0 +1,92 @@
+import itertools
+import threading
+import time
+from collections import Counter
+
+from app.dependencies import SHEETS_CLIENT
+
+# Service account connection key, mounted as a docker secret
+SERVICE_ACCOUNT_FILE = "/run/secrets/service_account"
+
+
+class FakeSpreadsheet:
+    """In memory stand in for gspread.Spreadsheet, covering the calls the sheet export makes"""
+
+    def __init__(self, client: "FakeSheetsClient", spreadsheet_id: str, title: str):
+        self.client = client
+        self.id = spreadsheet_id
+        self.title = title
+        self.permissions = []
+        # New spreadsheets come with a single "Sheet1", sheetId 0
+        self.sheets = {0: {"title": "Sheet1", "rowCount": 1000, "columnCount": 26}}
+        self.values = {}
+
+    def share(self, value, perm_type, role, **kwargs):
+        self.client.call("share")
+        self.permissions.append({"value": value, "perm_type": perm_type, "role": role})
+
+    def batch_update(self, body):
+        self.client.call("batch_update")
+        for request in body["requests"]:
+            if "addSheet" in request:
+                properties = request["addSheet"]["properties"]
+                self.sheets[properties["sheetId"]] = {"title": properties["title"],
+                                                      **properties.get("gridProperties", {})}
+            elif "updateSheetProperties" in request:
+                properties = request["updateSheetProperties"]["properties"]
+                self.sheets[properties["sheetId"]].update(title=properties["title"],
+                                                          **properties.get("gridProperties", {}))
+            elif "deleteSheet" in request:
+                del self.sheets[request["deleteSheet"]["sheetId"]]
+            else:
+                raise ValueError(f"Unsupported request {list(request)}")
+        return {"spreadsheetId": self.id, "replies": [{} for _ in body["requests"]]}
+
+    def values_batch_update(self, body):
+        self.client.call("values_batch_update")
+        titles = {sheet["title"] for sheet in self.sheets.values()}
+        for data in body["data"]:
+            title = data["range"].split("!")[0].strip("'")
+            if title not in titles:
+                raise ValueError(f"Unable to parse range: {data['range']}")
+            self.values[data["range"]] = data["values"]
+        return {"spreadsheetId": self.id, "totalUpdatedRows": sum(len(d["values"]) for d in body["data"])}
+
+
+class FakeSheetsClient:
+    """In memory stand in for gspread.Client, keeping every spreadsheet created and counting API calls.
+
+    latency adds a sleep per call, to see how the export behaves with Google's round trips.
+    """
+
+    def __init__(self, latency: float = 0):
+        self.latency = latency
+        self.calls = Counter()
+        self.spreadsheets = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def call(self, name: str):
+        with self._lock:
+            self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def create(self, title: str):
+        self.call("create")
+        with self._lock:
+            spreadsheet = FakeSpreadsheet(self, f"fake-{next(self._ids)}", title)
+            self.spreadsheets[spreadsheet.id] = spreadsheet
+        return spreadsheet
+
+
+fake_sheets_client = FakeSheetsClient()
+
+
+def get_sheets_client():
+    if SHEETS_CLIENT == "fake":
+        return fake_sheets_client
+    # Only the sheet export needs it, and it takes longer to import than the rest of the app
+    import gspread
+
+    return gspread.service_account(filename=SERVICE_ACCOUNT_FILE)
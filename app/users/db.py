@@ -1,6 +1,3 @@
-import databases
-import sqlalchemy
-import os
 from datetime import datetime
 
 from fastapi_users.db import SQLAlchemyBaseUserTable, SQLAlchemyUserDatabase
@@ -8,9 +5,8 @@ from sqlalchemy.ext.declarative import DeclarativeMeta, declarative_base
 from sqlalchemy import Column, String, DateTime
 
 from app.users.models import UserDB
-from app.dependencies import DB_URL
+from app.dependencies import async_engine
 
-database = databases.Database(DB_URL)
 Base: DeclarativeMeta = declarative_base()
 
 
@@ -21,11 +17,39 @@ class UserTable(Base, SQLAlchemyBaseUserTable):
     created = Column(DateTime, default=datetime.utcnow)
 
 
-engine = sqlalchemy.create_engine(DB_URL)
-Base.metadata.create_all(engine)
-
 users = UserTable.__table__
 
 
+class EngineDatabase:
+    """The part of encode/databases' Database that SQLAlchemyUserDatabase uses, on the app's async engine.
+
+    Users are read and written through the same pool as everything else
+    instead of a pool of their own.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    async def fetch_one(self, query):
+        async with self.engine.connect() as connection:
+            row = (await connection.execute(query)).first()
+        return row._mapping if row is not None else None
+
+    async def fetch_all(self, query):
+        async with self.engine.connect() as connection:
+            return [row._mapping for row in (await connection.execute(query)).all()]
+
+    async def execute(self, query, values=None):
+        async with self.engine.begin() as connection:
+            await connection.execute(query, values)
+
+    async def execute_many(self, query, values):
+        async with self.engine.begin() as connection:
+            await connection.execute(query, values)
+
+
+database = EngineDatabase(async_engine)
+
+
 def get_user_db():
     yield SQLAlchemyUserDatabase(UserDB, database, users)
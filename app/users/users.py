@@ -1,10 +1,13 @@
-from typing import Optional
+from typing import Any, Dict, Optional
 
+import jwt
 from fastapi import Depends, Request
 from fastapi_users import BaseUserManager, FastAPIUsers
 from fastapi_users.authentication import JWTAuthentication, CookieAuthentication
 from fastapi_users.db import SQLAlchemyUserDatabase
+from fastapi_users.jwt import decode_jwt
 
+from app.dependencies import user_cache
 from app.users.db import get_user_db
 from app.users.models import User, UserCreate, UserDB, UserUpdate
 
@@ -26,12 +29,58 @@ class UserManager(BaseUserManager[UserCreate, UserDB]):
     async def on_after_request_verify(self, user: UserDB, token: str, request: Optional[Request] = None):
         print(f"Verification requested for user {user.id}. Verification token: {token}")
 
+    async def on_after_update(self, user: UserDB, update_dict: Dict[str, Any], request: Optional[Request] = None):
+        forget_user(user)
+
+    async def on_after_verify(self, user: UserDB, request: Optional[Request] = None):
+        forget_user(user)
+
+    async def on_after_reset_password(self, user: UserDB, request: Optional[Request] = None):
+        forget_user(user)
+
+    async def delete(self, user: UserDB) -> None:
+        await super().delete(user)
+        forget_user(user)
+
+
+def forget_user(user: UserDB):
+    """Drop the cached user of every token of this user"""
+    user_id = str(user.id)
+    user_cache.discard(lambda key: key[0] == user_id)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWT authentication keeping the user behind each token in user_cache.
+
+    The token is still decoded and checked every time, only the users table
+    lookup is skipped. Entries are keyed by (user id, token) so that all of a
+    user's are dropped together when it changes.
+    """
+
+    async def __call__(self, credentials: Optional[str], user_manager: BaseUserManager) -> Optional[UserDB]:
+        if credentials is None:
+            return None
+        try:
+            user_id = decode_jwt(credentials, self.secret, self.token_audience).get("user_id")
+        except jwt.PyJWTError:
+            return None
+
+        key = (user_id, credentials)
+        user = user_cache.get(key)
+        if user is None:
+            user = await super().__call__(credentials, user_manager)
+            if user is None:
+                return None
+            user_cache.put(key, user)
+        # The users router updates the user it is given in place
+        return user.copy()
+
 
 def get_user_manager(user_db: SQLAlchemyUserDatabase = Depends(get_user_db)):
     yield UserManager(user_db)
 
 
-jwt_authentication = JWTAuthentication(
+jwt_authentication = CachedJWTAuthentication(
     secret=SECRET, lifetime_seconds=360000, tokenUrl="auth/jwt/login"
 )
 cookie_authentication = CookieAuthentication(secret=SECRET, lifetime_seconds=3600)
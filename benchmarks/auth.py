@@ -0,0 +1,76 @@
+"""Authentication overhead per request, with and without the user cache.
+
+Runs the app in process against the API's database (DB_* settings and the
+password and API secrets), as a throwaway user with a freshly issued JWT:
+
+    python -m benchmarks.auth --requests 2000
+
+    dependency   the JWT authentication alone, as current_active_user runs it
+    request      GET /users/me, the cheapest authenticated route
+
+Each is measured with the cache disabled, then enabled and warm. Times are
+the mean per call.
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+import httpx
+
+USER_ID = uuid.UUID("00000000-0000-4000-8000-0000000a0717")
+
+
+async def time_dependency(token, calls):
+    from app.users.db import get_user_db
+    from app.users.users import UserManager, jwt_authentication
+
+    user_manager = UserManager(next(get_user_db()))
+    start = time.perf_counter()
+    for _ in range(calls):
+        assert await jwt_authentication(token, user_manager) is not None
+    return (time.perf_counter() - start) / calls
+
+
+async def time_requests(client, token, requests):
+    headers = {"Authorization": f"Bearer {token}"}
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = await client.get("/users/me", headers=headers)
+        response.raise_for_status()
+    return (time.perf_counter() - start) / requests
+
+
+async def run(requests):
+    from fastapi_users.jwt import generate_jwt
+    from app.dependencies import user_cache, USER_CACHE_TTL
+    from app.main import app
+    from app.users.users import SECRET, jwt_authentication
+
+    token = generate_jwt({"user_id": str(USER_ID), "aud": jwt_authentication.token_audience},
+                         SECRET, jwt_authentication.lifetime_seconds)
+    async with httpx.AsyncClient(app=app, base_url="http://benchmark") as client:
+        print(f"{'cache':>8} {'dependency':>12} {'request':>10}")
+        for ttl in (0, USER_CACHE_TTL or 30):
+            user_cache.clear()
+            user_cache.ttl = ttl
+            dependency = await time_dependency(token, requests)
+            request = await time_requests(client, token, requests)
+            print(f"{'on' if ttl else 'off':>8} {dependency * 1e6:>10.0f}us {request * 1e6:>8.0f}us")
+    print(user_cache.stats())
+
+
+def main(args):
+    from benchmarks.tenant import delete_tenants, seed_user
+
+    seed_user(USER_ID, "auth-benchmark@example.com")
+    try:
+        asyncio.run(run(args.requests))
+    finally:
+        delete_tenants([USER_ID])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    main(parser.parse_args())
@@ -0,0 +1,72 @@
+"""Latency of cheap endpoints while heavy ones run on the same worker.
+
+Point it at a running API (one uvicorn worker makes event loop stalls obvious)
+with a JWT for a user owning the given query:
+
+    python -m benchmarks.concurrency --base-url http://localhost:4433 \\
+        --token $TOKEN --query-id 42 --heavy-concurrency 4 --seconds 20
+
+Reports p50/p99 of GET /projects/ alone, then again while export_csv and
+get_query_stats for the query are requested in a loop.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[max(int(len(samples) * pct) - 1, 0)]
+
+
+async def sample_cheap(client, deadline, latencies):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.get("/projects/")
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+
+
+async def hammer_heavy(client, deadline, query_id, counter):
+    paths = [f"/export/{query_id}/csv", f"/stats/query?query_id={query_id}"]
+    while time.perf_counter() < deadline:
+        for path in paths:
+            response = await client.get(path)
+            response.raise_for_status()
+            counter.append(path)
+
+
+async def phase(args, heavy):
+    headers = {"Authorization": f"Bearer {args.token}"}
+    latencies, heavy_done = [], []
+    async with httpx.AsyncClient(base_url=args.base_url, headers=headers, timeout=None) as client:
+        deadline = time.perf_counter() + args.seconds
+        tasks = [sample_cheap(client, deadline, latencies) for _ in range(args.cheap_concurrency)]
+        if heavy:
+            tasks += [hammer_heavy(client, deadline, args.query_id, heavy_done)
+                      for _ in range(args.heavy_concurrency)]
+        await asyncio.gather(*tasks)
+    label = f"with {args.heavy_concurrency} heavy" if heavy else "idle"
+    print(f"GET /projects/ {label:<14} n={len(latencies):6d}  "
+          f"p50 {statistics.median(latencies) * 1000:8.1f} ms  "
+          f"p99 {percentile(latencies, 0.99) * 1000:8.1f} ms  "
+          f"heavy requests completed {len(heavy_done)}")
+
+
+async def main(args):
+    await phase(args, heavy=False)
+    await phase(args, heavy=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://localhost:4433")
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--query-id", type=int, required=True)
+    parser.add_argument("--cheap-concurrency", type=int, default=4)
+    parser.add_argument("--heavy-concurrency", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,119 @@
+"""CSV export peak RSS and time to first byte, buffered vs streamed.
+
+Runs against the API's database (DB_* settings and the password secret).
+Seeds a throwaway tenant (benchmarks/tenant.py) with a query per size, then
+runs every scenario in a fresh subprocess so peak RSS is measured per scenario:
+
+    python -m benchmarks.export_csv --companies 10000 100000
+
+    buffered         ORM rows loaded with .all(), whole file built in a StringIO
+    streamed         server side cursor batches encoded chunk by chunk
+    streamed-gzip    the same, gzipped on the fly
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import resource
+import subprocess
+import sys
+import time
+import uuid
+
+USER_ID = uuid.UUID("00000000-0000-4000-8000-0000000e4c50")
+SCENARIOS = ["buffered", "streamed", "streamed-gzip"]
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def buffered(query_id):
+    # The export as it was: every company materialized, then one string
+    from sqlmodel.ext.asyncio.session import AsyncSession
+    from app.dependencies import async_engine
+    from app.models import Company
+    from app.routes.companies import populate_emails, select_companies_with_contact
+    from app.routes.queries_export import CSV_HEADER
+
+    start = time.perf_counter()
+    async with AsyncSession(async_engine) as session:
+        companies = (await session.exec(
+            select_companies_with_contact().where(Company.query_id == query_id)
+        )).all()
+    companies = populate_emails(companies)
+    with io.StringIO() as buffer:
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_HEADER)
+        for c in companies:
+            email = c.get("email") or {}
+            writer.writerow([c["name"], c["website"], email.get("full_name", ""),
+                             email.get("position", ""), email.get("email", ""),
+                             c["contact_email"], c["facebook"], c["twitter"],
+                             c["youtube"], c["linkedin"], c["instagram"], c["phone"]])
+        body = buffer.getvalue().encode()
+    first_byte = time.perf_counter() - start
+    return first_byte, time.perf_counter() - start, len(body)
+
+
+async def streamed(query_id, gzip):
+    from app.exports import stream_batches, csv_chunks, gzip_chunks
+    from app.routes.queries_export import CSV_HEADER, select_csv_rows
+
+    start = time.perf_counter()
+    first_byte = None
+    size = 0
+    chunks = csv_chunks(CSV_HEADER, stream_batches(select_csv_rows(query_id)))
+    if gzip:
+        chunks = gzip_chunks(chunks)
+    async for chunk in chunks:
+        if first_byte is None:
+            first_byte = time.perf_counter() - start
+        size += len(chunk)
+    return first_byte, time.perf_counter() - start, size
+
+
+def run_scenario(scenario, query_id):
+    # Import everything up front so the baseline includes the app itself
+    import app.routes.queries_export  # noqa: F401
+
+    baseline = peak_rss_mb()
+    if scenario == "buffered":
+        first_byte, total, size = asyncio.run(buffered(query_id))
+    else:
+        first_byte, total, size = asyncio.run(streamed(query_id, gzip=scenario == "streamed-gzip"))
+    print(json.dumps({"ttfb_s": first_byte, "total_s": total, "bytes": size,
+                      "baseline_rss_mb": baseline, "peak_rss_mb": peak_rss_mb()}))
+
+
+def main(args):
+    from benchmarks.tenant import delete_tenants, seed_tenants
+
+    print(f"{'companies':>10} {'scenario':<15} {'TTFB':>10} {'total':>10} {'size':>12} {'peak RSS':>10} {'growth':>10}")
+    for companies in args.companies:
+        query_id = seed_tenants([USER_ID], companies=companies)["query_id"]
+        try:
+            for scenario in SCENARIOS:
+                output = subprocess.run([sys.executable, "-m", "benchmarks.export_csv",
+                                         "--run", scenario, "--query-id", str(query_id)],
+                                        check=True, capture_output=True, text=True).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print(f"{companies:>10} {scenario:<15} {result['ttfb_s'] * 1000:>8.0f}ms "
+                      f"{result['total_s'] * 1000:>8.0f}ms {result['bytes'] / 1e6:>10.1f}MB "
+                      f"{result['peak_rss_mb']:>8.0f}MB "
+                      f"{result['peak_rss_mb'] - result['baseline_rss_mb']:>8.0f}MB")
+        finally:
+            delete_tenants([USER_ID])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--companies", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--run", choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument("--query-id", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        run_scenario(args.run, args.query_id)
+    else:
+        main(args)
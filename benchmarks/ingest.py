@@ -0,0 +1,142 @@
+"""Rows per second loaded into a query, by POST /ingest/{query_id} vs one ORM insert at a time.
+
+Runs the app in process against the API's database (DB_* settings and the
+password secret), as a throwaway tenant (benchmarks/tenant.py) owning a
+fresh query per scenario:
+
+    python -m benchmarks.ingest --companies 10000 100000 --orm-companies 2000
+
+Every company comes with three employees and its maps data. The bodies are
+generated up front and sent in 64KB chunks, so the time is the API's alone.
+
+    orm       a session add and commit per company, as the scraper workers do
+    ndjson    one company per line, employees and maps data nested
+    csv       one row per employee
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import time
+import uuid
+
+import httpx
+
+from benchmarks.tenant import authenticate, delete_tenants, seed_tenants
+
+USER_ID = uuid.UUID("00000000-0000-4000-8000-0000000b0c5e")
+EMPLOYEES_PER_COMPANY = 3
+CHUNK_SIZE = 64 * 1024
+
+
+def company(n):
+    return {"name": f"Company {n}", "website": f"https://company{n}.example.com", "phone": f"+44 20 7946 {n:04}",
+            "full_address": f"{n} High Street, London", "city": "London",
+            "contact_email": f"info@company{n}.example.com", "linkedin": f"https://linkedin.com/company/{n}"}
+
+
+def employee(n, e):
+    return {"full_name": f"Jane Doe {e}", "first_name": "Jane", "last_name": f"Doe {e}", "position": "Director",
+            "extracted_company": f"Company {n}", "email": f"jane{e}@company{n}.example.com" if e % 2 else "",
+            "rank_score": e, "search_title": "Jane Doe - Director", "linkedin_url": f"https://linkedin.com/in/{n}-{e}"}
+
+
+def maps_data(n):
+    return {"search_position": n, "lat": 51.5, "long": -0.1, "rating": 4, "reviews": 10, "type": "office"}
+
+
+def ndjson_body(companies):
+    lines = []
+    for n in range(companies):
+        lines.append(json.dumps({**company(n), "employees": [employee(n, e) for e in range(EMPLOYEES_PER_COMPANY)],
+                                 "maps_data": maps_data(n)}))
+    return ("\n".join(lines) + "\n").encode()
+
+
+def csv_body(companies):
+    company_columns = list(company(0))
+    employee_columns = list(employee(0, 0))
+    maps_columns = list(maps_data(0))
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["ref"] + company_columns + [f"employee_{c}" for c in employee_columns] +
+                    [f"maps_{c}" for c in maps_columns])
+    for n in range(companies):
+        for e in range(EMPLOYEES_PER_COMPANY):
+            writer.writerow([n] + list(company(n).values()) + list(employee(n, e).values()) +
+                            list(maps_data(n).values()))
+    return buffer.getvalue().encode()
+
+
+def create_query():
+    return seed_tenants([USER_ID], companies=0)["query_id"]
+
+
+def load_orm(companies):
+    from sqlmodel import Session
+    from app.dependencies import engine
+    from app.models import Company, CompaniesMapsData, Employee
+
+    query_id = create_query()
+    start = time.perf_counter()
+    with Session(engine) as session:
+        for n in range(companies):
+            row = Company(**company(n), query_id=query_id)
+            session.add(row)
+            session.commit()
+            session.refresh(row)
+            for e in range(EMPLOYEES_PER_COMPANY):
+                session.add(Employee(**employee(n, e), company_id=row.company_id))
+            session.add(CompaniesMapsData(**maps_data(n), company_id=row.company_id))
+            session.commit()
+    return time.perf_counter() - start
+
+
+async def load_api(client, body, content_type):
+    query_id = create_query()
+
+    async def chunks():
+        for position in range(0, len(body), CHUNK_SIZE):
+            yield body[position:position + CHUNK_SIZE]
+
+    start = time.perf_counter()
+    response = await client.post(f"/ingest/{query_id}", content=chunks(), headers={"content-type": content_type})
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def run(args):
+    from app.main import app
+
+    authenticate(app, USER_ID)
+    rows_per_company = EMPLOYEES_PER_COMPANY + 2
+    print(f"{'companies':>10} {'scenario':<8} {'rows':>10} {'seconds':>9} {'rows/s':>10}")
+
+    def report(companies, scenario, seconds):
+        rows = companies * rows_per_company
+        print(f"{companies:>10} {scenario:<8} {rows:>10} {seconds:>9.2f} {rows / seconds:>10.0f}")
+
+    if args.orm_companies:
+        report(args.orm_companies, "orm", load_orm(args.orm_companies))
+        delete_tenants([USER_ID])
+    async with httpx.AsyncClient(app=app, base_url="http://benchmark", timeout=None) as client:
+        for companies in args.companies:
+            for scenario, body, content_type in (("ndjson", ndjson_body(companies), "application/x-ndjson"),
+                                                 ("csv", csv_body(companies), "text/csv")):
+                report(companies, scenario, await load_api(client, body, content_type))
+                delete_tenants([USER_ID])
+
+
+def main(args):
+    try:
+        asyncio.run(run(args))
+    finally:
+        delete_tenants([USER_ID])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--companies", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--orm-companies", type=int, default=2000, help="0 to skip the ORM baseline")
+    main(parser.parse_args())
@@ -0,0 +1,80 @@
+"""CPU time per page of the list endpoints, through the response model vs FAST_JSON_RESPONSES.
+
+Runs the app in process against the API's database (DB_* settings and the
+password secret), as a throwaway tenant (benchmarks/tenant.py) owning --projects
+projects of a query each, one of them of --companies companies (three employees
+each):
+
+    python -m benchmarks.json_responses --pages 200
+
+Each endpoint is requested for full 100 row pages, --pages times per mode. The
+mean process CPU time and wall time per page are reported, the database's own
+time excluded from the former as it runs in another process.
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+import httpx
+
+from benchmarks.tenant import authenticate, delete_tenants, seed_tenants
+
+USER_ID = uuid.UUID("00000000-0000-4000-8000-0000000f0a57")
+
+ENDPOINTS = [
+    ("companies", "/companies/all/{query_id}"),
+    ("employees", "/employees/query/{query_id}"),
+    ("queries", "/queries/"),
+    ("projects", "/projects/"),
+]
+
+
+def seed(companies, projects):
+    # The query of the tenant's first project holds the companies, its other projects have an empty query each
+    query_id = seed_tenants([USER_ID], companies=companies)["query_id"]
+    seed_tenants([USER_ID], projects=projects - 1, companies=0)
+    return query_id
+
+
+async def time_pages(client, path, pages):
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for _ in range(pages):
+        response = await client.get(path)
+        response.raise_for_status()
+        assert len(response.json()) == 100
+    return (time.process_time() - cpu_start) / pages, (time.perf_counter() - wall_start) / pages
+
+
+async def run(query_id, pages):
+    from app import responses
+    from app.main import app
+
+    authenticate(app, USER_ID)
+    print(f"{'endpoint':<12} {'mode':<14} {'CPU/page':>10} {'wall/page':>10}")
+    async with httpx.AsyncClient(app=app, base_url="http://benchmark") as client:
+        for name, path in ENDPOINTS:
+            path = path.format(query_id=query_id)
+            # Warm up the connection pool and the statement caches
+            await time_pages(client, path, 5)
+            for fast in (False, True):
+                responses.FAST_JSON_RESPONSES = fast
+                cpu, wall = await time_pages(client, path, pages)
+                print(f"{name:<12} {'orjson' if fast else 'response model':<14} "
+                      f"{cpu * 1000:>8.2f}ms {wall * 1000:>8.2f}ms")
+
+
+def main(args):
+    query_id = seed(args.companies, args.projects)
+    try:
+        asyncio.run(run(query_id, args.pages))
+    finally:
+        delete_tenants([USER_ID])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--companies", type=int, default=1000)
+    parser.add_argument("--projects", type=int, default=100)
+    parser.add_argument("--pages", type=int, default=200)
+    main(parser.parse_args())
@@ -0,0 +1,90 @@
+"""Per page latency of GET /employees/query/{query_id}, offset vs cursor pagination.
+
+Runs the app in process against the API's database (DB_* settings and the
+password secret), as a throwaway tenant (benchmarks/tenant.py) owning a query
+of --employees employees (three per company):
+
+    python -m benchmarks.pagination --employees 1000000 --pages 1 100 1000 5000 9999
+
+Each page is requested --repeat times per mode and the median is reported.
+The cursor for a page is the one the previous page would have returned.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+from sqlalchemy import text
+
+USER_ID = uuid.UUID("00000000-0000-4000-8000-00000000beef")
+PAGE_SIZE = 100
+
+
+def seed(employees):
+    from app.dependencies import engine
+    from benchmarks.tenant import seed_tenants
+
+    query_id = seed_tenants([USER_ID], companies=-(-employees // 3))["query_id"]
+    with engine.begin() as connection:
+        connection.execute(text("ANALYZE companies; ANALYZE employees"))
+    return query_id
+
+
+def last_key_before(query_id, offset):
+    from app.dependencies import engine
+
+    with engine.connect() as connection:
+        return tuple(connection.execute(text(
+            "SELECT c.company_id, e.employee_id FROM employees e JOIN companies c ON c.company_id = e.company_id "
+            "WHERE c.query_id = :query_id ORDER BY c.company_id, e.employee_id OFFSET :offset LIMIT 1"
+        ), {"query_id": query_id, "offset": offset - 1}).one())
+
+
+async def time_page(client, path, params, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = await client.get(path, params=params)
+        response.raise_for_status()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+async def run(query_id, pages, repeat):
+    from app.main import app
+    from app.pagination import encode_cursor
+    from benchmarks.tenant import authenticate
+
+    authenticate(app, USER_ID)
+    path = f"/employees/query/{query_id}"
+    print(f"{'page':>8} {'offset':>10} {'cursor':>10}")
+    async with httpx.AsyncClient(app=app, base_url="http://benchmark") as client:
+        for page in pages:
+            offset = (page - 1) * PAGE_SIZE
+            offset_params = {"limit": PAGE_SIZE, "offset": offset}
+            cursor_params = {"limit": PAGE_SIZE}
+            if offset:
+                cursor_params["cursor"] = encode_cursor(last_key_before(query_id, offset))
+            offset_latency = await time_page(client, path, offset_params, repeat)
+            cursor_latency = await time_page(client, path, cursor_params, repeat)
+            print(f"{page:>8} {offset_latency * 1000:>8.1f}ms {cursor_latency * 1000:>8.1f}ms")
+
+
+def main(args):
+    from benchmarks.tenant import delete_tenants
+
+    query_id = seed(args.employees)
+    try:
+        asyncio.run(run(query_id, args.pages, args.repeat))
+    finally:
+        delete_tenants([USER_ID])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--employees", type=int, default=1_000_000)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 100, 1000, 5000, 9999])
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args())
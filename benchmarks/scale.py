@@ -0,0 +1,243 @@
+"""Throughput and latency per endpoint as a tenant grows, over a COPY seeded synthetic dataset.
+
+Runs the app in process against the API's database (DB_* settings and the
+password secret) and blob store (BLOB_STORE_PATH). For every --employees step
+a throwaway tenant is bulk loaded with COPY, one project and query holding
+that many employees, a third as many companies each with maps data, and
+--templates templates with one generated image per employee. Every endpoint
+is then requested --requests times (--export-requests for the exports) by
+--concurrency concurrent clients:
+
+    python -m benchmarks.scale --employees 1000 10000 100000 1000000 --concurrency 8 \\
+        --output scale.json
+
+Concurrency past DB_POOL_SIZE + DB_MAX_OVERFLOW queues on the pool, as it
+would in production. The table is printed as each step finishes, --output
+writes every step as JSON, along with the commit and settings, so runs can be
+compared over time.
+"""
+import argparse
+import asyncio
+import csv
+import io
+import itertools
+import json
+import os
+import subprocess
+import time
+import uuid
+from datetime import datetime
+
+import httpx
+from sqlalchemy import text
+
+from benchmarks.concurrency import percentile
+from benchmarks.tenant import authenticate, delete_tenants
+
+USER_ID = uuid.UUID("00000000-0000-4000-8000-00000005ca1e")
+
+EMPLOYEES_PER_COMPANY = 3
+COPY_BATCH = 100_000
+
+# (group, name, path). Paths are formatted with the tenant's ids.
+ENDPOINTS = [
+    ("list", "projects", "/projects/"),
+    ("list", "queries", "/queries/?project_id={project_id}"),
+    ("list", "companies", "/companies/all/{query_id}"),
+    ("list", "employees", "/employees/query/{query_id}"),
+    ("list", "templates", "/image-templates/?include_thumbnail=false"),
+    ("stats", "query stats", "/stats/query?query_id={query_id}"),
+    ("stats", "project stats", "/stats/project?project_id={project_id}"),
+    ("export", "csv", "/export/{query_id}/csv"),
+    ("export", "companies ndjson", "/export/{query_id}/companies/ndjson"),
+    ("export", "employees ndjson", "/export/{query_id}/employees/ndjson"),
+    ("images", "templates with thumbnails", "/image-templates/?include_thumbnail=true"),
+    ("images", "image", "/images/{image_id}"),
+    ("images", "thumbnail file", "/images/{image_id}/thumbnail"),
+]
+
+
+def reserve_ids(cursor, table, column, count):
+    """First of count consecutive ids taken from the table's sequence, so rows can be COPYed with their keys.
+
+    Assumes nothing else inserts into the table meanwhile, as on a benchmark database.
+    """
+    cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), "
+                   f"nextval(pg_get_serial_sequence('{table}', '{column}')) + %s - 1)", (count,))
+    return cursor.fetchone()[0] - count + 1
+
+
+def copy_rows(cursor, table, columns, rows):
+    """COPY rows into the table, COPY_BATCH rows per statement"""
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    buffer = io.StringIO()
+    # Strings quoted, an unquoted empty field is NULL to COPY
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending == COPY_BATCH:
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if pending:
+        buffer.seek(0)
+        cursor.copy_expert(sql, buffer)
+
+
+def seed(employees, templates):
+    """Bulk load a tenant of that many employees, returning the ids the endpoints are requested with"""
+    from app.dependencies import engine, blob_store
+
+    companies = max(employees // EMPLOYEES_PER_COMPANY, 1)
+    now = datetime.utcnow().isoformat()
+    image = os.urandom(16 * 1024)
+    thumbnail = os.urandom(2 * 1024)
+    image_hash, thumbnail_hash = blob_store.put(image), blob_store.put(thumbnail)
+
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("INSERT INTO projects (name, is_active, user_id, created_at, updated_at) "
+                       "VALUES ('Scale', true, %s, now(), now()) RETURNING project_id", (str(USER_ID),))
+        project_id = cursor.fetchone()[0]
+        cursor.execute("INSERT INTO queries (type, sector, location, is_active, user_id, project_id, "
+                       "started_at, finished_at) VALUES ('standard', 'scale', 'benchmark', true, %s, %s, "
+                       "now() - interval '1 hour', now()) RETURNING query_id", (str(USER_ID), project_id))
+        query_id = cursor.fetchone()[0]
+
+        first_company = reserve_ids(cursor, "companies", "company_id", companies)
+        company_ids = range(first_company, first_company + companies)
+        copy_rows(cursor, "companies",
+                  ("company_id", "name", "website", "phone", "full_address", "city", "contact_email",
+                   "linkedin", "twitter", "facebook", "query_id"),
+                  ((c, f"Company {c}", f"https://company{c}.example.com", f"+44 20 7946 {c % 10000:04}",
+                    f"{c % 300} High Street, London", "London", f"info@company{c}.example.com",
+                    f"https://linkedin.com/company/{c}", f"https://twitter.com/company{c}",
+                    f"https://facebook.com/company{c}", query_id) for c in company_ids))
+        copy_rows(cursor, "companies_maps_data",
+                  ("search_position", "lat", "long", "rating", "reviews", "type", "company_id"),
+                  ((position, 51.5 + position % 100 / 1000, -0.1, position % 5, position % 500, "office", c)
+                   for position, c in enumerate(company_ids, 1)))
+        copy_rows(cursor, "employees",
+                  ("full_name", "first_name", "last_name", "position", "extracted_company", "email",
+                   "rank_score", "search_title", "linkedin_url", "company_id"),
+                  ((f"Jane Doe {e}", "Jane", f"Doe {e}", "Director", f"Company {c}",
+                    f"jane{e}@company{c}.example.com" if e % 2 else "", e % 10, "Jane Doe - Director",
+                    f"https://linkedin.com/in/jane{e}", c)
+                   for e in range(employees) for c in (first_company + e % companies,)))
+
+        cursor.execute("INSERT INTO image_templates (top, \"left\", font_weight, font_style, font_size, "
+                       "font_family, font_underline, box_width, content, user_id, base_image_hash, "
+                       "base_image_size, base_image_format, created_at, updated_at) "
+                       "SELECT 0, 0, 400, 'normal', 12, 'Arial', false, 200, 'Hello {FNAME} ' || g, %s, %s, %s, "
+                       "'png', now(), now() FROM generate_series(1, %s) g RETURNING image_template_id",
+                       (str(USER_ID), image_hash, len(image), templates))
+        template_ids = [row[0] for row in cursor.fetchall()]
+        # A preview per template, then one image per employee as bulk generation leaves them.
+        # Content addressed, so every row points at the same two blobs.
+        copy_rows(cursor, "images",
+                  ("image_format", "preview", "template_id", "user_id", "image_hash", "image_size",
+                   "thumbnail_hash", "thumbnail_size", "created_at"),
+                  itertools.chain(
+                      (("png", True, t, USER_ID, image_hash, len(image), thumbnail_hash, len(thumbnail), now)
+                       for t in template_ids),
+                      (("png", False, template_ids[e % templates], USER_ID, image_hash, len(image),
+                        thumbnail_hash, len(thumbnail), now) for e in range(employees))))
+        cursor.execute("SELECT max(image_id) FROM images WHERE user_id = %s", (str(USER_ID),))
+        image_id = cursor.fetchone()[0]
+        connection.commit()
+    finally:
+        connection.close()
+
+    with engine.begin() as connection:
+        connection.execute(text("ANALYZE companies, employees, companies_maps_data, images"))
+    return {"project_id": project_id, "query_id": query_id, "image_id": image_id}
+
+
+async def load(client, path, requests, concurrency):
+    """Request path requests times from concurrency clients, returning the latencies, errors and wall time"""
+    latencies = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            # Streamed bodies are read in full, latency is to the last byte
+            response = await client.get(path)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+async def run_step(client, employees, args):
+    start = time.perf_counter()
+    ids = seed(employees, args.templates)
+    seed_seconds = time.perf_counter() - start
+    print(f"\n{employees} employees, seeded in {seed_seconds:.1f}s "
+          f"({employees / seed_seconds:.0f} employees/s)")
+    print(f"{'group':<8} {'endpoint':<27} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'errors':>7}")
+
+    results = []
+    try:
+        for group, name, path in ENDPOINTS:
+            requests = args.export_requests if group == "export" else args.requests
+            latencies, errors, seconds = await load(client, path.format(**ids), requests, args.concurrency)
+            result = {"group": group, "endpoint": name, "path": path, "requests": requests, "errors": errors,
+                      "throughput": requests / seconds,
+                      "p50": percentile(latencies, 0.50), "p95": percentile(latencies, 0.95),
+                      "p99": percentile(latencies, 0.99)}
+            results.append(result)
+            print(f"{group:<8} {name:<27} {result['throughput']:>8.1f} {result['p50'] * 1000:>7.1f}ms "
+                  f"{result['p95'] * 1000:>7.1f}ms {result['p99'] * 1000:>7.1f}ms {errors:>7}")
+    finally:
+        delete_tenants([USER_ID])
+    return {"employees": employees, "companies": max(employees // EMPLOYEES_PER_COMPANY, 1),
+            "seed_seconds": seed_seconds, "endpoints": results}
+
+
+async def run(args):
+    from app.main import app
+
+    authenticate(app, USER_ID)
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(app=app, base_url="http://benchmark", limits=limits, timeout=None) as client:
+        return [await run_step(client, employees, args) for employees in args.employees]
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], check=True, capture_output=True,
+                              text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(args):
+    started_at = datetime.utcnow().isoformat()
+    steps = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"started_at": started_at, "commit": git_commit(), "concurrency": args.concurrency,
+                       "requests": args.requests, "export_requests": args.export_requests,
+                       "templates": args.templates, "steps": steps}, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--employees", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--export-requests", type=int, default=10)
+    parser.add_argument("--templates", type=int, default=20)
+    parser.add_argument("--output", help="Write the results to this file as JSON")
+    main(parser.parse_args())
@@ -0,0 +1,76 @@
+"""Sheet export job throughput, offline against the in memory Sheets client.
+
+Runs against the API's database (DB_* settings and the password secret).
+Seeds a throwaway tenant's query (benchmarks/tenant.py), then submits the
+export jobs to a JobRunner the way POST /export/{query_id}/sheet does, with a
+simulated round trip per Sheets call:
+
+    python -m benchmarks.sheet_export --companies 2000 --jobs 20 --workers 1 4 --latency-ms 300
+"""
+import argparse
+import os
+import time
+import uuid
+
+USER_ID = uuid.UUID("00000000-0000-4000-8000-00000005bee7")
+
+# Must be set before app.dependencies is imported
+os.environ["SHEETS_CLIENT"] = "fake"
+
+
+def run(query_id, jobs, workers, latency):
+    from sqlmodel import Session, select
+    from app.dependencies import engine
+    from app.jobs import JobRunner, FINISHED
+    from app.models import Job
+    from app.routes.queries_export import write_sheet
+    from app.sheets import fake_sheets_client
+
+    fake_sheets_client.latency = latency
+    fake_sheets_client.calls.clear()
+    with Session(engine) as session:
+        job_ids = []
+        for _ in range(jobs):
+            job = Job(kind="sheet_export", user_id=USER_ID, query_id=query_id)
+            session.add(job)
+            job_ids.append(job.job_id)
+        session.commit()
+
+    runner = JobRunner(max_workers=workers)
+    runner.start()
+    start = time.perf_counter()
+    for job_id in job_ids:
+        runner.submit(job_id, write_sheet, query_id, None)
+    runner.stop()
+    elapsed = time.perf_counter() - start
+
+    with Session(engine) as session:
+        jobs_done = session.exec(select(Job).where(Job.job_id.in_(job_ids))).all()
+        finished = sum(job.status == FINISHED for job in jobs_done)
+        for job in jobs_done:
+            session.delete(job)
+        session.commit()
+    return elapsed, finished, sum(fake_sheets_client.calls.values()) / jobs
+
+
+def main(args):
+    from benchmarks.tenant import delete_tenants, seed_tenants
+
+    query_id = seed_tenants([USER_ID], companies=args.companies)["query_id"]
+    try:
+        print(f"{'workers':>8} {'jobs':>6} {'finished':>9} {'total':>10} {'jobs/s':>8} {'calls/job':>10}")
+        for workers in args.workers:
+            elapsed, finished, calls = run(query_id, args.jobs, workers, args.latency_ms / 1000)
+            print(f"{workers:>8} {args.jobs:>6} {finished:>9} {elapsed * 1000:>8.0f}ms "
+                  f"{args.jobs / elapsed:>8.1f} {calls:>10.0f}")
+    finally:
+        delete_tenants([USER_ID])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--companies", type=int, default=2000)
+    parser.add_argument("--jobs", type=int, default=20)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--latency-ms", type=float, default=300)
+    main(parser.parse_args())
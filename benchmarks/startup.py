@@ -0,0 +1,83 @@
+"""API startup time: import, startup handlers and first request.
+
+Each run is a fresh interpreter, so nothing is cached in sys.modules. Needs
+the API's settings (DB_*, the secrets and RMQ_URL), as a worker would:
+
+    python -m benchmarks.startup --runs 5
+
+    import         python -c "import app.main" worth of module loading
+    startup        the startup event handlers (schema check, broker, jobs)
+    first request  GET /projects/ as an authenticated user, through the whole stack
+
+The median of --runs is reported, with the slowest imports of the last run.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+RUN = """
+import time
+start = time.perf_counter()
+import asyncio, json, uuid
+import app.main
+imported = time.perf_counter()
+
+async def run():
+    import httpx
+    from app.main import app
+    from benchmarks.tenant import authenticate
+
+    authenticate(app, uuid.uuid4())
+    await app.router.startup()
+    started = time.perf_counter()
+    async with httpx.AsyncClient(app=app, base_url="http://benchmark") as client:
+        (await client.get("/projects/")).raise_for_status()
+    first_request = time.perf_counter()
+    await app.router.shutdown()
+    return started, first_request
+
+started, first_request = asyncio.run(run())
+print(json.dumps({"import": imported - start, "startup": started - imported,
+                  "first_request": first_request - started, "total": first_request - start}))
+"""
+
+
+def run_once():
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", RUN],
+                            check=True, capture_output=True, text=True)
+    return json.loads(output.stdout.strip().splitlines()[-1]), output.stderr
+
+
+def slowest_imports(importtime, count, depth=2):
+    # "import time: self [us] | cumulative | imported package", indented by two spaces per nesting level
+    modules = []
+    for line in importtime.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        if cumulative.strip().isdigit() and 0 < level <= depth:
+            modules.append((int(cumulative), "  " * (level - 1) + name.strip()))
+    return sorted(modules, reverse=True)[:count]
+
+
+def main(args):
+    runs = []
+    for _ in range(args.runs):
+        result, importtime = run_once()
+        runs.append(result)
+    print(f"{'phase':<15} {'median':>10}")
+    for phase in ("import", "startup", "first_request", "total"):
+        print(f"{phase:<15} {statistics.median(run[phase] for run in runs) * 1000:>8.0f}ms")
+    print("\nslowest imports")
+    for cumulative, name in slowest_imports(importtime, args.top):
+        print(f"{name:<40} {cumulative / 1000:>8.0f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    main(parser.parse_args())
@@ -0,0 +1,149 @@
+"""Throwaway tenants to run the app against, shared by the benchmarks and the tests.
+
+Everything seeded is owned by the tenants' users, or hangs off queries they
+own, so it is all deleted again by user. Requests are made as one of them
+with authenticate(), in place of the JWT authentication.
+"""
+from sqlalchemy import text
+
+# The tenants' users, as a condition on a user_id column
+TENANTS = "ANY(CAST(:user_ids AS uuid[]))"
+
+# Random bytes of :size per row, distinct rows hold distinct content so each is its own blob
+RANDOM_BYTES = "decode(repeat(md5(random()::text), CEIL(CAST(:{size} AS numeric) / 16)::integer), 'hex')"
+
+
+def seed_tenants(user_ids, projects=1, queries=1, companies=10, employees=3, templates=0, images=0,
+                 image_size=1024, thumbnail_size=256) -> dict:
+    """Projects of queries of companies, each with employees and maps data, and image templates with images.
+
+    Sizes are per parent: projects per user, queries per project and so on.
+    Employee n of a company has a rank score of n, and an email when n is odd.
+    Each template has a preview image besides its images, the image bytes are
+    moved out to the blob store. Returns the ids of the first user's first
+    project, query, company, employee, template and generated image.
+    """
+    from app.blobs import move_out
+    from app.dependencies import engine, blob_store
+
+    params = {"user_ids": [str(user_id) for user_id in user_ids], "user_id": user_ids[0],
+              "projects": projects, "queries": queries, "companies": companies, "employees": employees,
+              "templates": templates, "images": images,
+              "image_size": image_size, "thumbnail_size": thumbnail_size}
+    with engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO projects (name, is_active, user_id, created_at, updated_at) "
+            "SELECT 'Project ' || g, true, u, now(), now() "
+            "FROM unnest(CAST(:user_ids AS uuid[])) u, generate_series(1, :projects) g"
+        ), params)
+        connection.execute(text(
+            "INSERT INTO queries (type, sector, location, is_active, user_id, project_id, started_at, finished_at) "
+            "SELECT 'standard', 'tenant', 'query ' || g, true, p.user_id, p.project_id, "
+            "now() - interval '1 hour', now() "
+            f"FROM projects p, generate_series(1, :queries) g WHERE p.user_id = {TENANTS}"
+        ), params)
+        # The rollup triggers join what was just inserted, plan them for its actual size
+        connection.execute(text("ANALYZE projects, queries"))
+        connection.execute(text(
+            "INSERT INTO companies (name, website, phone, full_address, contact_email, linkedin, twitter, "
+            "facebook, instagram, youtube, query_id) "
+            "SELECT 'Company ' || g, 'https://company' || g || '.example.com', '+44 20 7946 0' || g, "
+            "g || ' High Street', 'info@company' || g || '.example.com', "
+            "'https://linkedin.com/company/' || g, 'https://twitter.com/company' || g, "
+            "'https://facebook.com/company' || g, 'https://instagram.com/company' || g, "
+            "'https://youtube.com/company' || g, q.query_id "
+            f"FROM queries q, generate_series(1, :companies) g WHERE q.user_id = {TENANTS}"
+        ), params)
+        connection.execute(text("ANALYZE companies, company_counters"))
+        connection.execute(text(
+            "INSERT INTO employees (full_name, first_name, last_name, position, extracted_company, email, "
+            "rank_score, search_title, linkedin_url, company_id) "
+            "SELECT 'Jane Doe ' || n, 'Jane', 'Doe', 'Director', c.name, "
+            "CASE WHEN n % 2 = 1 THEN 'jane' || n || '.' || c.company_id || '@example.com' ELSE '' END, n, "
+            "'Jane Doe - Director', 'https://linkedin.com/in/jane' || n, c.company_id "
+            "FROM companies c JOIN queries q USING (query_id), generate_series(1, :employees) n "
+            f"WHERE q.user_id = {TENANTS}"
+        ), params)
+        connection.execute(text(
+            "INSERT INTO companies_maps_data (search_position, lat, long, rating, reviews, type, company_id) "
+            "SELECT row_number() OVER (PARTITION BY c.query_id ORDER BY c.company_id), 51.5, -0.1, 4, 10, "
+            "'office', c.company_id "
+            f"FROM companies c JOIN queries q USING (query_id) WHERE q.user_id = {TENANTS}"
+        ), params)
+        template_ids = connection.execute(text(
+            "INSERT INTO image_templates (top, \"left\", font_weight, font_style, font_size, font_family, "
+            "font_underline, box_width, content, user_id, base_image, base_image_format, created_at, updated_at) "
+            "SELECT 0, 0, 400, 'normal', 12, 'Arial', false, 200, 'Hello {FNAME} ' || g, u, "
+            f"{RANDOM_BYTES.format(size='image_size')}, 'png', now(), now() "
+            "FROM unnest(CAST(:user_ids AS uuid[])) u, generate_series(1, :templates) g "
+            "RETURNING image_template_id"
+        ), params).scalars().all()
+        image_ids = connection.execute(text(
+            "INSERT INTO images (image, thumbnail, image_format, preview, template_id, user_id, created_at) "
+            f"SELECT {RANDOM_BYTES.format(size='image_size')}, {RANDOM_BYTES.format(size='thumbnail_size')}, "
+            "'png', g = 0, t.image_template_id, t.user_id, now() "
+            f"FROM image_templates t, generate_series(0, :images) g WHERE t.user_id = {TENANTS} "
+            "RETURNING image_id"
+        ), params).scalars().all()
+        move_out(connection, blob_store, "image_templates", ids=template_ids)
+        move_out(connection, blob_store, "images", ids=image_ids)
+
+        return dict(connection.execute(text(
+            "SELECT (SELECT min(project_id) FROM projects WHERE user_id = :user_id) AS project_id, "
+            "(SELECT min(query_id) FROM queries WHERE user_id = :user_id) AS query_id, "
+            "(SELECT min(company_id) FROM companies c JOIN queries q USING (query_id) "
+            " WHERE q.user_id = :user_id) AS company_id, "
+            "(SELECT min(employee_id) FROM employees WHERE company_id = "
+            " (SELECT min(company_id) FROM companies c JOIN queries q USING (query_id) "
+            "  WHERE q.user_id = :user_id)) AS employee_id, "
+            "(SELECT min(image_template_id) FROM image_templates WHERE user_id = :user_id) AS image_template_id, "
+            "(SELECT min(image_id) FROM images WHERE template_id = "
+            " (SELECT min(image_template_id) FROM image_templates WHERE user_id = :user_id) "
+            " AND NOT preview) AS image_id"
+        ), params).mappings().one())
+
+
+def seed_user(user_id, email):
+    """A user account, for what needs a real one rather than authenticate()"""
+    from app.dependencies import engine
+
+    with engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO \"user\" (id, email, hashed_password, is_active, is_superuser, is_verified, first_name) "
+            "VALUES (:id, :email, 'x', true, false, true, 'Tenant') "
+            "ON CONFLICT (id) DO NOTHING"
+        ), {"id": user_id, "email": email})
+
+
+def delete_tenants(user_ids):
+    from app.dependencies import engine
+
+    params = {"user_ids": [str(user_id) for user_id in user_ids]}
+    with engine.begin() as connection:
+        connection.execute(text(f"DELETE FROM images WHERE user_id = {TENANTS}"), params)
+        connection.execute(text(f"DELETE FROM image_templates WHERE user_id = {TENANTS}"), params)
+        connection.execute(text(f"DELETE FROM jobs WHERE user_id = {TENANTS}"), params)
+        connection.execute(text("DELETE FROM companies_maps_data m USING companies c, queries q "
+                                "WHERE m.company_id = c.company_id AND c.query_id = q.query_id "
+                                f"AND q.user_id = {TENANTS}"), params)
+        connection.execute(text("DELETE FROM employees e USING companies c, queries q "
+                                "WHERE e.company_id = c.company_id AND c.query_id = q.query_id "
+                                f"AND q.user_id = {TENANTS}"), params)
+        connection.execute(text("DELETE FROM companies c USING queries q "
+                                f"WHERE c.query_id = q.query_id AND q.user_id = {TENANTS}"), params)
+        connection.execute(text("DELETE FROM query_size_counters s USING queries q "
+                                f"WHERE s.query_id = q.query_id AND q.user_id = {TENANTS}"), params)
+        connection.execute(text(f"DELETE FROM query_counters WHERE user_id = {TENANTS}"), params)
+        connection.execute(text(f"DELETE FROM queries WHERE user_id = {TENANTS}"), params)
+        connection.execute(text(f"DELETE FROM project_counters WHERE user_id = {TENANTS}"), params)
+        connection.execute(text(f"DELETE FROM projects WHERE user_id = {TENANTS}"), params)
+        connection.execute(text(f"DELETE FROM \"user\" WHERE id = {TENANTS}"), params)
+
+
+def authenticate(app, user_id):
+    """Handle the app's requests as that user, in place of the JWT authentication"""
+    from app.users.models import UserDB
+    from app.users.users import current_active_user
+
+    user = UserDB(id=user_id, email=f"{user_id}@example.com", hashed_password="x", first_name="Tenant")
+    app.dependency_overrides[current_active_user] = lambda: user
@@ -0,0 +1,66 @@
+"""GET /image-templates/?include_thumbnail=true latency with a cold vs warm thumbnail cache.
+
+Runs the app in process against the API's database (DB_* settings and the
+password secret) and blob store (BLOB_STORE_PATH), as a throwaway tenant
+(benchmarks/tenant.py) owning --templates templates, each with a preview image
+of a --thumbnail-kb random thumbnail:
+
+    python -m benchmarks.thumbnail_cache --templates 100 --thumbnail-kb 50
+
+The cache is cleared before every cold request. The median of --repeat
+requests is reported for each, with the cache counters at the end.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+
+USER_ID = uuid.UUID("00000000-0000-4000-8000-0000000cac4e")
+
+
+async def time_listing(client, cache, repeat, cold):
+    samples = []
+    for _ in range(repeat):
+        if cold:
+            cache.clear()
+        start = time.perf_counter()
+        response = await client.get("/image-templates/", params={"include_thumbnail": True})
+        response.raise_for_status()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+async def run(repeat):
+    from app.dependencies import thumbnail_cache
+    from app.main import app
+    from benchmarks.tenant import authenticate
+
+    authenticate(app, USER_ID)
+    async with httpx.AsyncClient(app=app, base_url="http://benchmark") as client:
+        cold = await time_listing(client, thumbnail_cache, repeat, cold=True)
+        warm = await time_listing(client, thumbnail_cache, repeat, cold=False)
+    print(f"{'cold':>8} {cold * 1000:>8.1f}ms")
+    print(f"{'warm':>8} {warm * 1000:>8.1f}ms")
+    print(thumbnail_cache.stats())
+
+
+def main(args):
+    from benchmarks.tenant import delete_tenants, seed_tenants
+
+    seed_tenants([USER_ID], projects=0, templates=args.templates, images=0,
+                 thumbnail_size=args.thumbnail_kb * 1024)
+    try:
+        asyncio.run(run(args.repeat))
+    finally:
+        delete_tenants([USER_ID])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--templates", type=int, default=100)
+    parser.add_argument("--thumbnail-kb", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    main(parser.parse_args())
@@ -0,0 +1,81 @@
+"""hot path indexes
+
+Composite and partial indexes matching the statements in app/routes, each
+page of a list is an index range scan in primary key order:
+
+    companies            query_id, company_id
+    employees            company_id, employee_id
+                         company_id, rank_score DESC, employee_id WHERE email <> '' AND rank_score > 0
+    companies_maps_data  company_id, maps_data_id
+    queries              user_id, query_id WHERE is_active
+                         project_id, query_id WHERE is_active
+                         user_id WHERE is_active AND finished_at IS NULL
+    projects             user_id, project_id WHERE is_active
+    image_templates      user_id, image_template_id
+    images               template_id WHERE NOT preview
+                         template_id, user_id WHERE preview
+
+The single column indexes on companies.query_id, employees.company_id and
+companies_maps_data.company_id are prefixes of the new ones and are dropped,
+they only slowed down the scrapers' inserts.
+
+Indexes are built CONCURRENTLY, the API and scrapers keep writing meanwhile.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 05:02:41.518306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# name, table, columns, partial index predicate
+INDEXES = [
+    ("ix_companies_query_id_company_id", "companies", ["query_id", "company_id"], None),
+    ("ix_employees_company_id_employee_id", "employees", ["company_id", "employee_id"], None),
+    ("ix_employees_best_contact", "employees", ["company_id", sa.text("rank_score DESC"), "employee_id"],
+     "email <> '' AND rank_score > 0"),
+    ("ix_companies_maps_data_company_id_maps_data_id", "companies_maps_data", ["company_id", "maps_data_id"], None),
+    ("ix_queries_user_id_active", "queries", ["user_id", "query_id"], "is_active"),
+    ("ix_queries_project_id_active", "queries", ["project_id", "query_id"], "is_active"),
+    ("ix_queries_in_progress", "queries", ["user_id"], "is_active AND finished_at IS NULL"),
+    ("ix_projects_user_id_active", "projects", ["user_id", "project_id"], "is_active"),
+    ("ix_image_templates_user_id_image_template_id", "image_templates", ["user_id", "image_template_id"], None),
+    ("ix_images_template_id_generated", "images", ["template_id"], "NOT preview"),
+    ("ix_images_template_id_preview", "images", ["template_id", "user_id"], "preview"),
+]
+
+REDUNDANT = [
+    ("ix_companies_query_id", "companies", ["query_id"]),
+    ("ix_employees_company_id", "employees", ["company_id"]),
+    ("ix_companies_maps_data_company_id", "companies_maps_data", ["company_id"]),
+]
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(name, table, columns, unique=False, if_not_exists=True,
+                            postgresql_concurrently=True,
+                            postgresql_where=sa.text(where) if where else None)
+        for name, table, columns in REDUNDANT:
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in REDUNDANT:
+            op.create_index(name, table, columns, unique=False, if_not_exists=True,
+                            postgresql_concurrently=True)
+        for name, table, columns, where in INDEXES:
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
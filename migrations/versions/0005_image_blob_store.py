@@ -0,0 +1,123 @@
+"""image blob store
+
+Moves image, thumbnail and template base image bytes out of Postgres into
+the blob store (app/blobs.py, BLOB_STORE_PATH), the rows keep the SHA-256
+key and size. Identical content is stored once.
+
+The bytea columns stay, emptied, as the image generation consumer still
+inserts images with their bytes. Run a VACUUM FULL on images and
+image_templates afterwards to give the space back.
+
+The store's layout is copied here as of this revision, so replaying it
+doesn't depend on what app/blobs.py has become since.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 05:48:12.730164
+
+"""
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import text
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BLOB_STORE_PATH = os.getenv("BLOB_STORE_PATH", "/data/blobs")
+
+# table: (primary key, blob columns)
+BLOB_COLUMNS = {
+    "images": ("image_id", ("image", "thumbnail")),
+    "image_templates": ("image_template_id", ("base_image",)),
+}
+
+BATCH_SIZE = 500
+
+
+def blob_path(digest: str) -> Path:
+    # Sharded by the first two bytes of the key: ab/cd/abcd...
+    return Path(BLOB_STORE_PATH) / digest[:2] / digest[2:4] / digest
+
+
+def put(data: bytes) -> str:
+    digest = hashlib.sha256(data).hexdigest()
+    path = blob_path(digest)
+    if path.exists():
+        return digest
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Written aside and renamed into place, readers never see a partial blob
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return digest
+
+
+def move_out(connection, table: str) -> int:
+    key, columns = BLOB_COLUMNS[table]
+    pending = " OR ".join(f"{column} IS NOT NULL" for column in columns)
+    moved, after = 0, None
+    while True:
+        rows = connection.execute(text(
+            f"SELECT {key}, {', '.join(columns)} FROM {table} "
+            f"WHERE ({pending}) AND (CAST(:after AS integer) IS NULL OR {key} > :after) "
+            f"ORDER BY {key} LIMIT :batch_size"
+        ), {"after": after, "batch_size": BATCH_SIZE}).all()
+        for row in rows:
+            values = {}
+            for column in columns:
+                data = row._mapping[column]
+                if data is None:
+                    continue
+                values[f"{column}_hash"] = put(bytes(data))
+                values[f"{column}_size"] = len(data)
+            assignments = ", ".join([f"{name} = :{name}" for name in values] +
+                                    [f"{column} = NULL" for column in columns])
+            connection.execute(text(f"UPDATE {table} SET {assignments} WHERE {key} = :key"),
+                               {**values, "key": row[0]})
+        moved += len(rows)
+        if len(rows) < BATCH_SIZE:
+            return moved
+        after = rows[-1][0]
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+    for table, (_, columns) in BLOB_COLUMNS.items():
+        for column in columns:
+            op.add_column(table, sa.Column(f"{column}_hash", sa.String(64), nullable=True))
+            op.add_column(table, sa.Column(f"{column}_size", sa.Integer(), nullable=True))
+
+        moved = move_out(connection, table)
+        print(f"{table}: moved the blobs of {moved} rows to {BLOB_STORE_PATH}")
+
+
+def downgrade() -> None:
+    connection = op.get_bind()
+    for table, (key, columns) in BLOB_COLUMNS.items():
+        for column in columns:
+            rows = connection.execute(text(
+                f"SELECT {key}, {column}_hash FROM {table} WHERE {column}_hash IS NOT NULL AND {column} IS NULL"
+            )).all()
+            for row_id, digest in rows:
+                connection.execute(text(f"UPDATE {table} SET {column} = :data WHERE {key} = :row_id"),
+                                   {"data": blob_path(digest).read_bytes(), "row_id": row_id})
+            op.drop_column(table, f"{column}_size")
+            op.drop_column(table, f"{column}_hash")
@@ -0,0 +1,33 @@
+"""job progress counters
+
+Counters for jobs made of many items, the bulk image generation publishes
+one message per employee and the consumer reports back on each.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 09:12:40.118203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COUNTERS = ("total", "submitted", "rendered", "failed")
+
+
+def upgrade() -> None:
+    for counter in COUNTERS:
+        op.add_column("jobs", sa.Column(counter, sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    for counter in COUNTERS:
+        op.drop_column("jobs", counter)
@@ -0,0 +1,258 @@
+"""rollup triggers
+
+The rollup functions and triggers of app/rollups.py, which the API used to
+(re)install on every startup. They are copied here as of this revision, a
+change to them in app/rollups.py needs a new revision replacing them.
+
+The counters are backfilled from the existing companies and employees, so
+/stats is right from the upgrade on.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 10:02:51.447391
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+from sqlalchemy import text
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Applies per company (employees, emails) deltas, moving each company
+# between histogram buckets and bumping the query and project totals
+APPLY_COMPANY_DELTAS = """
+CREATE OR REPLACE FUNCTION rollup_apply_company_deltas(
+    company_ids integer[], d_employees bigint[], d_emails bigint[]
+) RETURNS void AS $$
+BEGIN
+    -- Take the companies out of the bucket they were in
+    WITH old AS (
+        SELECT cc.query_id, cc.employees, cc.emails
+        FROM unnest(company_ids) AS d(company_id)
+        JOIN company_counters cc ON cc.company_id = d.company_id
+    )
+    UPDATE query_size_counters q
+    SET companies = q.companies - o.companies,
+        companies_with_emails = q.companies_with_emails - o.companies_with_emails
+    FROM (SELECT query_id, employees,
+                 COUNT(*) AS companies,
+                 COUNT(*) FILTER (WHERE emails > 0) AS companies_with_emails
+          FROM old GROUP BY query_id, employees) o
+    WHERE q.query_id = o.query_id AND q.employees = o.employees;
+
+    -- Apply the deltas and put the companies in their new bucket
+    WITH new AS (
+        INSERT INTO company_counters (company_id, query_id, employees, emails)
+        SELECT d.company_id, c.query_id, d.employees, d.emails
+        FROM unnest(company_ids, d_employees, d_emails) AS d(company_id, employees, emails)
+        JOIN companies c ON c.company_id = d.company_id
+        ON CONFLICT (company_id) DO UPDATE
+        SET employees = company_counters.employees + EXCLUDED.employees,
+            emails = company_counters.emails + EXCLUDED.emails
+        RETURNING query_id, employees, emails
+    )
+    INSERT INTO query_size_counters (query_id, employees, companies, companies_with_emails)
+    SELECT query_id, employees, COUNT(*), COUNT(*) FILTER (WHERE emails > 0)
+    FROM new GROUP BY query_id, employees
+    ON CONFLICT (query_id, employees) DO UPDATE
+    SET companies = query_size_counters.companies + EXCLUDED.companies,
+        companies_with_emails = query_size_counters.companies_with_emails + EXCLUDED.companies_with_emails;
+
+    PERFORM rollup_apply_query_deltas(array_agg(query_id), array_agg(companies),
+                                      array_agg(employees), array_agg(emails))
+    FROM (SELECT c.query_id, 0::bigint AS companies,
+                 SUM(d.employees)::bigint AS employees, SUM(d.emails)::bigint AS emails
+          FROM unnest(company_ids, d_employees, d_emails) AS d(company_id, employees, emails)
+          JOIN companies c ON c.company_id = d.company_id
+          GROUP BY c.query_id) AS per_query;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+APPLY_QUERY_DELTAS = """
+CREATE OR REPLACE FUNCTION rollup_apply_query_deltas(
+    query_ids integer[], d_companies bigint[], d_employees bigint[], d_emails bigint[]
+) RETURNS void AS $$
+BEGIN
+    IF query_ids IS NULL THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO query_counters (query_id, user_id, project_id, total_companies, total_employees, total_emails)
+    SELECT q.query_id, q.user_id, q.project_id, d.companies, d.employees, d.emails
+    FROM unnest(query_ids, d_companies, d_employees, d_emails) AS d(query_id, companies, employees, emails)
+    JOIN queries q ON q.query_id = d.query_id
+    ON CONFLICT (query_id) DO UPDATE
+    SET total_companies = query_counters.total_companies + EXCLUDED.total_companies,
+        total_employees = query_counters.total_employees + EXCLUDED.total_employees,
+        total_emails = query_counters.total_emails + EXCLUDED.total_emails;
+
+    INSERT INTO project_counters (project_id, user_id, total_companies, total_employees, total_emails)
+    SELECT p.project_id, p.user_id, SUM(d.companies), SUM(d.employees), SUM(d.emails)
+    FROM unnest(query_ids, d_companies, d_employees, d_emails) AS d(query_id, companies, employees, emails)
+    JOIN queries q ON q.query_id = d.query_id
+    JOIN projects p ON p.project_id = q.project_id
+    GROUP BY p.project_id, p.user_id
+    ON CONFLICT (project_id) DO UPDATE
+    SET total_companies = project_counters.total_companies + EXCLUDED.total_companies,
+        total_employees = project_counters.total_employees + EXCLUDED.total_employees,
+        total_emails = project_counters.total_emails + EXCLUDED.total_emails;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+COMPANIES_INSERTED = """
+CREATE OR REPLACE FUNCTION rollup_companies_inserted() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO company_counters (company_id, query_id, employees, emails)
+    SELECT company_id, query_id, 0, 0 FROM new_rows
+    ON CONFLICT (company_id) DO NOTHING;
+
+    INSERT INTO query_size_counters (query_id, employees, companies, companies_with_emails)
+    SELECT query_id, 0, COUNT(*), 0 FROM new_rows GROUP BY query_id
+    ON CONFLICT (query_id, employees) DO UPDATE
+    SET companies = query_size_counters.companies + EXCLUDED.companies;
+
+    PERFORM rollup_apply_query_deltas(array_agg(query_id), array_agg(companies),
+                                      array_agg(0::bigint), array_agg(0::bigint))
+    FROM (SELECT query_id, COUNT(*) AS companies FROM new_rows GROUP BY query_id) AS per_query;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+# Employees have to be deleted before their company (foreign key),
+# so by now a deleted company only counts itself
+COMPANIES_DELETED = """
+CREATE OR REPLACE FUNCTION rollup_companies_deleted() RETURNS trigger AS $$
+BEGIN
+    WITH gone AS (
+        DELETE FROM company_counters cc USING old_rows o
+        WHERE cc.company_id = o.company_id
+        RETURNING cc.query_id, cc.employees, cc.emails
+    )
+    UPDATE query_size_counters q
+    SET companies = q.companies - g.companies,
+        companies_with_emails = q.companies_with_emails - g.companies_with_emails
+    FROM (SELECT query_id, employees,
+                 COUNT(*) AS companies,
+                 COUNT(*) FILTER (WHERE emails > 0) AS companies_with_emails
+          FROM gone GROUP BY query_id, employees) g
+    WHERE q.query_id = g.query_id AND q.employees = g.employees;
+
+    PERFORM rollup_apply_query_deltas(array_agg(query_id), array_agg(-companies),
+                                      array_agg(0::bigint), array_agg(0::bigint))
+    FROM (SELECT query_id, COUNT(*) AS companies FROM old_rows GROUP BY query_id) AS per_query;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+EMPLOYEES_INSERTED = """
+CREATE OR REPLACE FUNCTION rollup_employees_inserted() RETURNS trigger AS $$
+BEGIN
+    PERFORM rollup_apply_company_deltas(array_agg(company_id), array_agg(employees), array_agg(emails))
+    FROM (SELECT company_id, COUNT(*) AS employees, COUNT(*) FILTER (WHERE email <> '') AS emails
+          FROM new_rows GROUP BY company_id) AS per_company;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+EMPLOYEES_DELETED = """
+CREATE OR REPLACE FUNCTION rollup_employees_deleted() RETURNS trigger AS $$
+BEGIN
+    PERFORM rollup_apply_company_deltas(array_agg(company_id), array_agg(-employees), array_agg(-emails))
+    FROM (SELECT company_id, COUNT(*) AS employees, COUNT(*) FILTER (WHERE email <> '') AS emails
+          FROM old_rows GROUP BY company_id) AS per_company;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+EMPLOYEES_UPDATED = """
+CREATE OR REPLACE FUNCTION rollup_employees_updated() RETURNS trigger AS $$
+BEGIN
+    PERFORM rollup_apply_company_deltas(array_agg(company_id), array_agg(employees), array_agg(emails))
+    FROM (SELECT company_id, SUM(employees)::bigint AS employees, SUM(emails)::bigint AS emails
+          FROM (SELECT company_id, -1 AS employees, -(COALESCE(email, '') <> '')::int AS emails FROM old_rows
+                UNION ALL
+                SELECT company_id, 1, (COALESCE(email, '') <> '')::int FROM new_rows) AS moves
+          GROUP BY company_id
+          HAVING SUM(employees) <> 0 OR SUM(emails) <> 0) AS per_company;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+TRIGGERS = [
+    ("rollup_companies_insert", "companies", "INSERT", "NEW TABLE AS new_rows", "rollup_companies_inserted"),
+    ("rollup_companies_delete", "companies", "DELETE", "OLD TABLE AS old_rows", "rollup_companies_deleted"),
+    ("rollup_employees_insert", "employees", "INSERT", "NEW TABLE AS new_rows", "rollup_employees_inserted"),
+    ("rollup_employees_delete", "employees", "DELETE", "OLD TABLE AS old_rows", "rollup_employees_deleted"),
+    ("rollup_employees_update", "employees", "UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows",
+     "rollup_employees_updated"),
+]
+
+FUNCTIONS = [APPLY_QUERY_DELTAS, APPLY_COMPANY_DELTAS, COMPANIES_INSERTED, COMPANIES_DELETED,
+             EMPLOYEES_INSERTED, EMPLOYEES_DELETED, EMPLOYEES_UPDATED]
+
+# The counters of the companies and employees already there, as `python -m app.rollups reconcile` builds them.
+# The lock keeps writes out until the triggers are committed with the counters.
+BACKFILL = [
+    "LOCK TABLE companies, employees IN SHARE MODE",
+    "DELETE FROM company_counters",
+    "DELETE FROM query_size_counters",
+    "DELETE FROM query_counters",
+    "DELETE FROM project_counters",
+    "INSERT INTO company_counters (company_id, query_id, employees, emails) "
+    "SELECT c.company_id, c.query_id, "
+    "COUNT(e.employee_id), COUNT(e.employee_id) FILTER (WHERE e.email <> '') "
+    "FROM companies c LEFT JOIN employees e ON e.company_id = c.company_id "
+    "GROUP BY c.company_id",
+    "INSERT INTO query_size_counters (query_id, employees, companies, companies_with_emails) "
+    "SELECT query_id, employees, COUNT(*), COUNT(*) FILTER (WHERE emails > 0) "
+    "FROM company_counters "
+    "GROUP BY query_id, employees",
+    "INSERT INTO query_counters (query_id, user_id, project_id, total_companies, total_employees, total_emails) "
+    "SELECT q.query_id, q.user_id, q.project_id, "
+    "COUNT(cc.company_id), COALESCE(SUM(cc.employees), 0), COALESCE(SUM(cc.emails), 0) "
+    "FROM queries q LEFT JOIN company_counters cc ON cc.query_id = q.query_id "
+    "GROUP BY q.query_id",
+    "INSERT INTO project_counters (project_id, user_id, total_companies, total_employees, total_emails) "
+    "SELECT p.project_id, p.user_id, COALESCE(SUM(qc.total_companies), 0), "
+    "COALESCE(SUM(qc.total_employees), 0), COALESCE(SUM(qc.total_emails), 0) "
+    "FROM projects p LEFT JOIN query_counters qc ON qc.project_id = p.project_id "
+    "GROUP BY p.project_id",
+]
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+    for function in FUNCTIONS:
+        connection.execute(text(function))
+    for name, table, event, referencing, function in TRIGGERS:
+        connection.execute(text(f"DROP TRIGGER IF EXISTS {name} ON {table}"))
+        connection.execute(text(
+            f"CREATE TRIGGER {name} AFTER {event} ON {table} "
+            f"REFERENCING {referencing} "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION {function}()"
+        ))
+    for statement in BACKFILL:
+        connection.execute(text(statement))
+
+
+def downgrade() -> None:
+    connection = op.get_bind()
+    for name, table, _, _, _ in TRIGGERS:
+        connection.execute(text(f"DROP TRIGGER IF EXISTS {name} ON {table}"))
+    for function in FUNCTIONS:
+        name = function.split("FUNCTION ", 1)[1].split("(", 1)[0]
+        connection.execute(text(f"DROP FUNCTION IF EXISTS {name}"))
@@ -0,0 +1,33 @@
+"""query csv progress counters
+
+Counters for queries launched from a CSV upload, the companies published
+for enrichment so far and in total.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 14:21:07.530912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COUNTERS = ("rows_submitted", "rows_total")
+
+
+def upgrade() -> None:
+    for counter in COUNTERS:
+        op.add_column("queries", sa.Column(counter, sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    for counter in COUNTERS:
+        op.drop_column("queries", counter)
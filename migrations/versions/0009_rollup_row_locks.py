@@ -0,0 +1,138 @@
+"""rollup row locks
+
+rollup_apply_company_deltas locks the companies' company_counters rows
+before reading their counts. Two statements adding employees to the same
+company at once, a scraper and /ingest say, each read the old count and
+took the company out of the same histogram bucket, leaving
+query_size_counters wrong for good.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 17:03:26.410857
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+from sqlalchemy import text
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+APPLY_COMPANY_DELTAS = """
+CREATE OR REPLACE FUNCTION rollup_apply_company_deltas(
+    company_ids integer[], d_employees bigint[], d_emails bigint[]
+) RETURNS void AS $$
+BEGIN
+    -- Lock the companies' counters first, a concurrent statement on the same
+    -- companies waits here and then reads the counts this one leaves
+    PERFORM 1 FROM company_counters
+    WHERE company_id = ANY(company_ids)
+    ORDER BY company_id
+    FOR UPDATE;
+
+    -- Take the companies out of the bucket they were in
+    WITH old AS (
+        SELECT cc.query_id, cc.employees, cc.emails
+        FROM unnest(company_ids) AS d(company_id)
+        JOIN company_counters cc ON cc.company_id = d.company_id
+    )
+    UPDATE query_size_counters q
+    SET companies = q.companies - o.companies,
+        companies_with_emails = q.companies_with_emails - o.companies_with_emails
+    FROM (SELECT query_id, employees,
+                 COUNT(*) AS companies,
+                 COUNT(*) FILTER (WHERE emails > 0) AS companies_with_emails
+          FROM old GROUP BY query_id, employees) o
+    WHERE q.query_id = o.query_id AND q.employees = o.employees;
+
+    -- Apply the deltas and put the companies in their new bucket
+    WITH new AS (
+        INSERT INTO company_counters (company_id, query_id, employees, emails)
+        SELECT d.company_id, c.query_id, d.employees, d.emails
+        FROM unnest(company_ids, d_employees, d_emails) AS d(company_id, employees, emails)
+        JOIN companies c ON c.company_id = d.company_id
+        ON CONFLICT (company_id) DO UPDATE
+        SET employees = company_counters.employees + EXCLUDED.employees,
+            emails = company_counters.emails + EXCLUDED.emails
+        RETURNING query_id, employees, emails
+    )
+    INSERT INTO query_size_counters (query_id, employees, companies, companies_with_emails)
+    SELECT query_id, employees, COUNT(*), COUNT(*) FILTER (WHERE emails > 0)
+    FROM new GROUP BY query_id, employees
+    ON CONFLICT (query_id, employees) DO UPDATE
+    SET companies = query_size_counters.companies + EXCLUDED.companies,
+        companies_with_emails = query_size_counters.companies_with_emails + EXCLUDED.companies_with_emails;
+
+    PERFORM rollup_apply_query_deltas(array_agg(query_id), array_agg(companies),
+                                      array_agg(employees), array_agg(emails))
+    FROM (SELECT c.query_id, 0::bigint AS companies,
+                 SUM(d.employees)::bigint AS employees, SUM(d.emails)::bigint AS emails
+          FROM unnest(company_ids, d_employees, d_emails) AS d(company_id, employees, emails)
+          JOIN companies c ON c.company_id = d.company_id
+          GROUP BY c.query_id) AS per_query;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+# As installed by 0007
+PREVIOUS_APPLY_COMPANY_DELTAS = """
+CREATE OR REPLACE FUNCTION rollup_apply_company_deltas(
+    company_ids integer[], d_employees bigint[], d_emails bigint[]
+) RETURNS void AS $$
+BEGIN
+    -- Take the companies out of the bucket they were in
+    WITH old AS (
+        SELECT cc.query_id, cc.employees, cc.emails
+        FROM unnest(company_ids) AS d(company_id)
+        JOIN company_counters cc ON cc.company_id = d.company_id
+    )
+    UPDATE query_size_counters q
+    SET companies = q.companies - o.companies,
+        companies_with_emails = q.companies_with_emails - o.companies_with_emails
+    FROM (SELECT query_id, employees,
+                 COUNT(*) AS companies,
+                 COUNT(*) FILTER (WHERE emails > 0) AS companies_with_emails
+          FROM old GROUP BY query_id, employees) o
+    WHERE q.query_id = o.query_id AND q.employees = o.employees;
+
+    -- Apply the deltas and put the companies in their new bucket
+    WITH new AS (
+        INSERT INTO company_counters (company_id, query_id, employees, emails)
+        SELECT d.company_id, c.query_id, d.employees, d.emails
+        FROM unnest(company_ids, d_employees, d_emails) AS d(company_id, employees, emails)
+        JOIN companies c ON c.company_id = d.company_id
+        ON CONFLICT (company_id) DO UPDATE
+        SET employees = company_counters.employees + EXCLUDED.employees,
+            emails = company_counters.emails + EXCLUDED.emails
+        RETURNING query_id, employees, emails
+    )
+    INSERT INTO query_size_counters (query_id, employees, companies, companies_with_emails)
+    SELECT query_id, employees, COUNT(*), COUNT(*) FILTER (WHERE emails > 0)
+    FROM new GROUP BY query_id, employees
+    ON CONFLICT (query_id, employees) DO UPDATE
+    SET companies = query_size_counters.companies + EXCLUDED.companies,
+        companies_with_emails = query_size_counters.companies_with_emails + EXCLUDED.companies_with_emails;
+
+    PERFORM rollup_apply_query_deltas(array_agg(query_id), array_agg(companies),
+                                      array_agg(employees), array_agg(emails))
+    FROM (SELECT c.query_id, 0::bigint AS companies,
+                 SUM(d.employees)::bigint AS employees, SUM(d.emails)::bigint AS emails
+          FROM unnest(company_ids, d_employees, d_emails) AS d(company_id, employees, emails)
+          JOIN companies c ON c.company_id = d.company_id
+          GROUP BY c.query_id) AS per_query;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+
+def upgrade() -> None:
+    op.get_bind().execute(text(APPLY_COMPANY_DELTAS))
+
+
+def downgrade() -> None:
+    op.get_bind().execute(text(PREVIOUS_APPLY_COMPANY_DELTAS))
@@ -0,0 +1,30 @@
+"""job leases
+
+The lease of the process running a job, see app/jobs.py. Unfinished jobs
+were all failed when any API process started, including those another
+process was still running; now only those whose lease ran out are.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 17:41:05.263918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0010'
+down_revision: Union[str, None] = '0009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("jobs", sa.Column("lease_expires_at", sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("jobs", "lease_expires_at")
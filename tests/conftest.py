@@ -0,0 +1,119 @@
+"""Fixtures running the app in process against a local Postgres.
+
+The database is the API's own, from the DB_* settings and the password
+secret, migrated to head with `alembic upgrade head`, with the blob store
+at BLOB_STORE_PATH:
+
+    python -m pytest tests
+
+Tests needing it are skipped when it can't be reached. They seed throwaway
+tenants (benchmarks/tenant.py), deleted again afterwards.
+"""
+import asyncio
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+import httpx
+import pytest
+from sqlalchemy import event, exc, text
+
+from benchmarks.tenant import authenticate, delete_tenants, seed_tenants
+
+USER_ID = uuid.UUID("00000000-0000-4000-8000-000000007e57")
+
+# Statements run in the context of the request being made: (statement, rows fetched)
+captured: ContextVar[Optional[List]] = ContextVar("captured", default=None)
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    statements = captured.get()
+    if statements is None:
+        return
+    # asyncpg's cursor keeps a rowcount of -1 for selects, its buffered rows are counted instead.
+    # Server side cursors stream, their rows aren't known at this point and count as 0.
+    rows = getattr(cursor, "_rows", None)
+    statements.append((statement, len(rows) if rows is not None else max(cursor.rowcount, 0)))
+
+
+@contextmanager
+def recorded_statements():
+    """The statements run in this context meanwhile, as (statement, rows fetched)"""
+    statements = []
+    token = captured.set(statements)
+    try:
+        yield statements
+    finally:
+        captured.reset(token)
+
+
+class Client:
+    """Requests to the app as a user, keeping the SQL statements of the last one"""
+
+    def __init__(self, app, user_id):
+        self.app = app
+        self.user_id = user_id
+        self.statements = []
+
+    def as_user(self, user_id) -> "Client":
+        return Client(self.app, user_id)
+
+    def request(self, method, url, **kwargs) -> httpx.Response:
+        return asyncio.run(self._request(method, url, **kwargs))
+
+    def get(self, url, **kwargs) -> httpx.Response:
+        return self.request("GET", url, **kwargs)
+
+    async def _request(self, method, url, **kwargs):
+        from app.dependencies import async_engine
+
+        authenticate(self.app, self.user_id)
+        try:
+            with recorded_statements() as statements:
+                async with httpx.AsyncClient(app=self.app, base_url="http://test") as client:
+                    response = await client.request(method, url, **kwargs)
+        finally:
+            # Its connections belong to this request's event loop
+            await async_engine.dispose()
+        self.statements = statements
+        return response
+
+
+@pytest.fixture(scope="session")
+def database():
+    """The sync engine, statements of both engines recorded while a request is made"""
+    try:
+        from app.dependencies import engine, async_engine
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+    except (OSError, ValueError, exc.OperationalError) as error:
+        pytest.skip(f"No local Postgres: {error}")
+
+    for sync_engine in (engine, async_engine.sync_engine):
+        event.listen(sync_engine, "after_cursor_execute", after_cursor_execute)
+    yield engine
+    for sync_engine in (engine, async_engine.sync_engine):
+        event.remove(sync_engine, "after_cursor_execute", after_cursor_execute)
+
+
+@pytest.fixture
+def tenant(database):
+    """Seeds the test user's tenant with seed_tenants(), replacing the previous one"""
+
+    def seed(**sizes):
+        delete_tenants([USER_ID])
+        return seed_tenants([USER_ID], **sizes)
+
+    delete_tenants([USER_ID])
+    yield seed
+    delete_tenants([USER_ID])
+
+
+@pytest.fixture
+def api(database):
+    from app.main import app
+    from app.users.users import current_active_user
+
+    yield Client(app, USER_ID)
+    app.dependency_overrides.pop(current_active_user, None)
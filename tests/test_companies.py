@@ -0,0 +1,32 @@
+"""A company's best contact is resolved in the same statement as the company, not by loading its employees"""
+import pytest
+
+# Employees per company, each run fetches the same 100 companies
+EMPLOYEE_COUNTS = (0, 1, 25)
+
+
+@pytest.mark.parametrize("path", [
+    "/companies/all/{query_id}",
+    "/companies/{company_id}",
+    "/export/{query_id}/csv",
+])
+def test_statements_independent_of_employees(api, tenant, path):
+    counts = {}
+    for employees in EMPLOYEE_COUNTS:
+        ids = tenant(companies=100, employees=employees)
+        response = api.get(path.format(**ids), params={"limit": 100})
+        assert response.status_code == 200
+        counts[employees] = len(api.statements)
+    # Checking the query, then the companies with their best contact
+    assert counts == {employees: 2 for employees in EMPLOYEE_COUNTS}
+
+
+def test_best_contact(api, tenant):
+    ids = tenant(companies=100, employees=4)
+    companies = api.get(f"/companies/all/{ids['query_id']}", params={"limit": 100}).json()
+    assert len(companies) == 100
+    # The highest ranked employee with an email, employee 3 of 4
+    assert all(company["email"]["full_name"] == "Jane Doe 3" for company in companies)
+
+    ids = tenant(companies=1, employees=0)
+    assert api.get(f"/companies/{ids['company_id']}").json()["email"] is None
@@ -0,0 +1,133 @@
+"""The hot statements of app/routes are planned on the indexes made for them, under the default planner settings.
+
+Many tenants are seeded and analyzed so the planner has statistics like the
+production ones: each user's rows are a small share of every table, and
+their lists run over more than a page.
+"""
+import json
+import uuid
+
+import pytest
+from sqlalchemy import func, text
+from sqlmodel import select
+
+from benchmarks.tenant import delete_tenants, seed_tenants
+from tests.conftest import USER_ID
+
+# The test user is one of them
+TENANTS = [USER_ID] + [uuid.UUID(int=USER_ID.int + n) for n in range(1, 100)]
+SIZES = {"projects": 2, "queries": 150, "companies": 2, "employees": 3, "templates": 4, "images": 20}
+# Users with projects and nothing else, so projects isn't so few pages that a scan of it beats the index
+PROJECT_OWNERS = [uuid.UUID(int=USER_ID.int + n) for n in range(100, 1100)]
+
+
+def statements(ids):
+    """(name, statement) of the hot statements, built the way the routes build them"""
+    from app.models import CompaniesMapsData, Company, Employee, Image, ImageTemplate, Project, Query
+    from app.pagination import encode_cursor, paginate
+    from app.routes.companies import select_companies_with_contact
+    from app.routes.queries_export import select_csv_rows, select_company_records, select_employee_records
+
+    query_id, company_id = ids["query_id"], ids["company_id"]
+    companies = select_companies_with_contact().where(Company.query_id == query_id)
+    query_employees = select(Employee).join(Company).where(Company.query_id == query_id)
+    return {
+        "companies page": paginate(companies, Company.company_id, None, 0, 100),
+        "companies cursor page": paginate(companies, Company.company_id, encode_cursor(company_id), 0, 100),
+        "company maps data": select(CompaniesMapsData).where(CompaniesMapsData.company_id == company_id),
+        "employees of company page": paginate(select(Employee).where(Employee.company_id == company_id),
+                                              Employee.employee_id, None, 0, 100),
+        "employees of query page": paginate(query_employees, (Company.company_id, Employee.employee_id),
+                                            None, 0, 100),
+        "employees of query cursor page": paginate(query_employees, (Company.company_id, Employee.employee_id),
+                                                   encode_cursor((company_id, 0)), 0, 100),
+        "csv export": select_csv_rows(query_id),
+        "companies export": select_company_records(query_id),
+        "employees export": select_employee_records(query_id),
+        "queries page": paginate(select(Query).where(Query.user_id == USER_ID, Query.is_active == True),
+                                 Query.query_id, None, 0, 100),
+        "queries of project page": paginate(select(Query).where(Query.user_id == USER_ID,
+                                                                Query.project_id == ids["project_id"],
+                                                                Query.is_active == True),
+                                            Query.query_id, None, 0, 100),
+        "queries in progress": text("SELECT COUNT(*) FROM queries q "
+                                    "WHERE is_active AND user_id = :user_id "
+                                    "AND finished_at IS NULL").bindparams(user_id=USER_ID),
+        "projects page": paginate(select(Project).where(Project.user_id == USER_ID, Project.is_active == True),
+                                  Project.project_id, None, 0, 100),
+        "image templates page": paginate(select(ImageTemplate).where(ImageTemplate.user_id == USER_ID),
+                                         ImageTemplate.image_template_id, None, 0, 100),
+        "template preview": select(Image).where(Image.user_id == USER_ID,
+                                                Image.template_id == ids["image_template_id"],
+                                                Image.preview == True),
+        "template images generated": select(func.count(Image.image_id)).where(
+            Image.template_id == ids["image_template_id"], Image.preview == False),
+    }
+
+
+# The indexes each statement must be planned on. A tuple is a choice: the baseline schema's
+# single column indexes are still there, the planner may rightly prefer them on few rows and sort
+EXPECTED_INDEXES = {
+    "companies page": {"ix_companies_query_id_company_id", "ix_employees_best_contact"},
+    "companies cursor page": {"ix_companies_query_id_company_id", "ix_employees_best_contact"},
+    "company maps data": {"ix_companies_maps_data_company_id_maps_data_id"},
+    "employees of company page": {"ix_employees_company_id_employee_id"},
+    "employees of query page": {"ix_companies_query_id_company_id", "ix_employees_company_id_employee_id"},
+    "employees of query cursor page": {"ix_companies_query_id_company_id", "ix_employees_company_id_employee_id"},
+    "csv export": {"ix_companies_query_id_company_id", "ix_employees_best_contact"},
+    "companies export": {"ix_companies_query_id_company_id", "ix_companies_maps_data_company_id_maps_data_id",
+                         "ix_employees_best_contact"},
+    "employees export": {"ix_employees_company_id_employee_id"},
+    "queries page": {"ix_queries_user_id_active"},
+    "queries of project page": {("ix_queries_project_id_active", "ix_queries_project_id")},
+    "queries in progress": {"ix_queries_in_progress"},
+    "projects page": {"ix_projects_user_id_active"},
+    "image templates page": {("ix_image_templates_user_id_image_template_id", "ix_image_templates_user_id")},
+    "template preview": {"ix_images_template_id_preview"},
+    "template images generated": {"ix_images_template_id_generated"},
+}
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def explain(connection, statement):
+    compiled = statement.compile(dialect=connection.dialect)
+    params = {key: str(value) if isinstance(value, uuid.UUID) else value
+              for key, value in compiled.construct_params().items()}
+    result = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", params).scalar()
+    if isinstance(result, str):
+        result = json.loads(result)
+    return result[0]["Plan"]
+
+
+@pytest.fixture(scope="module")
+def seeded(database):
+    delete_tenants(TENANTS + PROJECT_OWNERS)
+    ids = seed_tenants(TENANTS, **SIZES)
+    seed_tenants(PROJECT_OWNERS, projects=SIZES["projects"], queries=0)
+    with database.begin() as connection:
+        # A query in progress and a deleted project per user, as the partial indexes expect
+        connection.execute(text("UPDATE queries SET finished_at = NULL WHERE query_id IN "
+                                "(SELECT max(query_id) FROM queries GROUP BY user_id)"))
+        connection.execute(text("UPDATE projects SET is_active = false WHERE project_id IN "
+                                "(SELECT max(project_id) FROM projects GROUP BY user_id)"))
+    with database.begin() as connection:
+        connection.execute(text("ANALYZE projects; ANALYZE queries; ANALYZE companies; ANALYZE employees; "
+                                "ANALYZE companies_maps_data; ANALYZE image_templates; ANALYZE images"))
+    yield ids
+    delete_tenants(TENANTS + PROJECT_OWNERS)
+
+
+@pytest.mark.parametrize("name", sorted(EXPECTED_INDEXES))
+def test_planned_on_index(database, seeded, name):
+    with database.connect() as connection:
+        plan = explain(connection, statements(seeded)[name])
+    nodes = list(plan_nodes(plan))
+    used = {node["Index Name"] for node in nodes if "Index Name" in node}
+    for expected in EXPECTED_INDEXES[name]:
+        assert used & set(expected if isinstance(expected, tuple) else [expected]), json.dumps(plan, indent=1)
+    assert not [node for node in nodes if node["Node Type"] == "Seq Scan"], json.dumps(plan, indent=1)
@@ -0,0 +1,220 @@
+"""SQL statements and rows fetched per endpoint, checked against a budget that doesn't grow with the data.
+
+Every route of app/routes is called once as the user of each tenant in
+SCALES, seeded with the same sizes times its scale. An endpoint fails when it
+issues more statements or fetches more rows than its budget below, or when
+its statement count differs between the tenants, the mark of a query per row.
+The statements it repeated are listed with it. Routes without a budget fail
+too, so new ones get one.
+
+The broker and the job runner are replaced by recorders. Submitted jobs are
+run right after their request against the budget in JOBS, up to their first
+call out to the broker or Google, which are not reachable from here.
+"""
+import json
+import os
+import uuid
+from collections import Counter
+
+import pytest
+from sqlalchemy import text
+
+from benchmarks.tenant import delete_tenants, seed_tenants
+from tests.conftest import recorded_statements
+
+# The tenants' users, by the factor their data is scaled by
+SCALES = {
+    1: uuid.UUID("00000000-0000-4000-8000-00000b0d6e01"),
+    10: uuid.UUID("00000000-0000-4000-8000-00000b0d6e10"),
+}
+SIZES = {"projects": 2, "queries": 2, "companies": 50, "employees": 3, "templates": 5, "images": 3}
+SCALED = {"companies", "templates"}
+# /metrics isn't served without a token
+METRICS_TOKEN = "budget"
+
+# (method, path, params, statements, rows). None rows for exports, which fetch the whole query by design.
+# The cases run in this order on the same tenants, deletes come last as they deactivate what the others read.
+ENDPOINTS = [
+    ("GET", "/projects/", {}, 1, 101),
+    ("GET", "/projects/{project_id}", {}, 1, 1),
+    ("POST", "/projects/new", {"project_name": "Budget"}, 1, 1),
+    ("GET", "/queries/", {}, 1, 101),
+    ("GET", "/queries/", {"project_id": "{project_id}"}, 1, 101),
+    ("GET", "/queries/{query_id}", {}, 1, 1),
+    ("GET", "/stats/query", {"query_id": "{query_id}"}, 3, 20),
+    ("GET", "/stats/project", {}, 2, 2),
+    ("GET", "/stats/project", {"project_id": "{project_id}"}, 2, 2),
+    ("GET", "/companies/all/{query_id}", {}, 2, 102),
+    ("GET", "/companies/{company_id}", {}, 2, 2),
+    ("GET", "/employees/company/{company_id}", {}, 2, 102),
+    ("GET", "/employees/query/{query_id}", {}, 2, 102),
+    ("GET", "/employees/{employee_id}", {}, 1, 1),
+    ("GET", "/export/{query_id}/csv", {}, 2, None),
+    ("GET", "/export/{query_id}/companies/{export_format}", {}, 2, None),
+    ("GET", "/export/{query_id}/employees/{export_format}", {}, 2, None),
+    ("POST", "/export/{query_id}/sheet", {"share_email": "budget@example.com"}, 2, 1),
+    ("GET", "/image-templates/", {"include_thumbnail": False}, 2, 202),
+    ("GET", "/image-templates/", {"include_thumbnail": True}, 3, 303),
+    ("GET", "/image-templates/{image_template_id}", {"include_thumbnail": True}, 3, 3),
+    ("GET", "/images/{image_id}", {}, 1, 1),
+    ("GET", "/images/{image_id}/{file}", {}, 1, 1),
+    ("POST", "/images/generate_single_image", {}, 1, 1),
+    ("POST", "/images/generate_query_images", {}, 3, 2),
+    ("POST", "/image-templates/new", {}, 2, 2),
+    ("POST", "/queries/new/location", {"sector": "budget", "location": "budget"}, 0, 0),
+    ("POST", "/ingest/{query_id}", {"finish": False}, 8, 1),
+    ("POST", "/queries/new/csv", {"project_id": "{project_id}"}, 3, 2),
+    ("GET", "/jobs/{job_id}", {}, 1, 1),
+    ("GET", "/metrics", {}, 0, 0),
+    ("DELETE", "/image-templates/{image_template_id}", {}, 3, SIZES["images"] + 2),
+    ("DELETE", "/queries/{query_id}", {}, 2, 1),
+    ("DELETE", "/projects/{project_id}", {}, 2, 1),
+]
+
+# Submitted jobs, by function: (statements, rows)
+JOBS = {
+    "write_sheet": (3, None),
+    "publish_query_images": (3, None),
+}
+
+
+class RecordingPublisher:
+    def __init__(self):
+        self.messages = []
+
+    async def publish(self, routing_key: str, body: str):
+        self.messages.append((routing_key, body))
+
+
+class RecordingJobRunner:
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, job_id, fn, *args):
+        self.jobs.append((fn, args))
+
+
+def endpoint_name(method, path, params):
+    query_string = "&".join(f"{param}={value}" for param, value in params.items())
+    return f"{method} {path}" + (f"?{query_string}" if params else "")
+
+
+@pytest.fixture(scope="module")
+def tenants(database):
+    """Ids of each tenant's rows by scale, with the broker, job runner and metrics token stood in for"""
+    from app.dependencies import get_publisher
+    from app.jobs import get_job_runner
+    from app.main import app
+    from app.routes import metrics
+
+    runner = RecordingJobRunner()
+    delete_tenants(list(SCALES.values()))
+    ids = {}
+    for scale, user_id in SCALES.items():
+        ids[scale] = seed_tenants([user_id], **{size: count * scale if size in SCALED else count
+                                                for size, count in SIZES.items()})
+        ids[scale]["job_id"] = uuid.uuid4()
+        with database.begin() as connection:
+            connection.execute(text(
+                "INSERT INTO jobs (job_id, user_id, kind, status, query_id, created_at) "
+                "VALUES (:job_id, :user_id, 'sheet', 'done', :query_id, now())"
+            ), {"user_id": user_id, **ids[scale]})
+
+    token, metrics.METRICS_TOKEN = metrics.METRICS_TOKEN, METRICS_TOKEN
+    app.dependency_overrides[get_publisher] = RecordingPublisher
+    app.dependency_overrides[get_job_runner] = lambda: runner
+    yield ids, runner
+    app.dependency_overrides.pop(get_publisher, None)
+    app.dependency_overrides.pop(get_job_runner, None)
+    metrics.METRICS_TOKEN = token
+    delete_tenants(list(SCALES.values()))
+
+
+def request_arguments(path, params, ids):
+    """Path, query string and body of an endpoint for a seeded tenant"""
+    values = {**ids, "export_format": "ndjson", "file": "thumbnail"}
+    kwargs = {"params": {key: value.format(**values) if isinstance(value, str) else value
+                         for key, value in params.items()}}
+    if path == "/images/generate_single_image":
+        kwargs["json"] = {"image_template_id": ids["image_template_id"], "fname": "Jane"}
+    elif path == "/images/generate_query_images":
+        kwargs["json"] = {"image_template_id": ids["image_template_id"], "query_id": ids["query_id"]}
+    elif path == "/image-templates/new":
+        kwargs["data"] = {"image_template": (
+            '{"top": 0, "left": 0, "font_weight": 400, "font_style": "normal", "font_size": 12, '
+            '"font_family": "Arial", "font_underline": false, "box_width": 200, "content": "Budget"}')}
+        kwargs["files"] = {"base_image": ("budget.png", os.urandom(1024), "image/png")}
+    elif path == "/ingest/{query_id}":
+        company = {"name": "Ingested", "maps_data": {"search_position": 1, "lat": 51.5, "long": -0.1, "type": "office"},
+                   "employees": [{"full_name": "Jane Doe", "first_name": "Jane", "position": "Director",
+                                  "extracted_company": "Ingested", "rank_score": 1, "search_title": "Jane Doe",
+                                  "linkedin_url": "https://linkedin.com/in/jane"}] * SIZES["employees"]}
+        kwargs["content"] = "".join(json.dumps(company) + "\n" for _ in range(5)).encode()
+        kwargs["headers"] = {"content-type": "application/x-ndjson"}
+    elif path == "/queries/new/csv":
+        kwargs["content"] = b"name,website\n" + b"".join(b"Budget %d,https://budget.example.com\n" % number
+                                                         for number in range(5))
+        kwargs["headers"] = {"content-type": "text/csv"}
+    elif path == "/queries/new/location":
+        kwargs["params"]["project_id"] = ids["project_id"]
+    elif path == "/metrics":
+        kwargs["headers"] = {"authorization": f"Bearer {METRICS_TOKEN}"}
+    return path.format(**values), kwargs
+
+
+def run_job(fn, args):
+    with recorded_statements() as statements:
+        try:
+            fn(*args)
+        except Exception:
+            # Stopped at the broker or Google, see the module docstring
+            pass
+    return statements
+
+
+def repeated(statements, top=3):
+    counts = Counter(" ".join(statement.split()) for statement, _ in statements)
+    return [(count, statement) for statement, count in counts.most_common(top) if count > 1]
+
+
+def assert_within_budget(runs, statement_budget, row_budget):
+    """Checks the statements of each scale's run against the budget"""
+    counts = {f"x{scale}": len(statements) for scale, statements in runs.items()}
+    rows = {f"x{scale}": sum(fetched for _, fetched in statements) for scale, statements in runs.items()}
+    repeats = "".join(f"\n    {count}x {statement[:160]}" for count, statement in repeated(runs[max(runs)]))
+    assert len(set(counts.values())) == 1, f"grows with the data, statements {counts}{repeats}"
+    assert max(counts.values()) <= statement_budget, f"over {statement_budget} statements {counts}{repeats}"
+    if row_budget is not None:
+        assert max(rows.values()) <= row_budget, f"over {row_budget} rows {rows}"
+
+
+@pytest.mark.parametrize("method, path, params, statement_budget, row_budget", ENDPOINTS,
+                         ids=[endpoint_name(method, path, params) for method, path, params, *_ in ENDPOINTS])
+def test_statement_budget(api, tenants, method, path, params, statement_budget, row_budget):
+    ids, runner = tenants
+    runs, jobs = {}, {}
+    for scale, user_id in SCALES.items():
+        client = api.as_user(user_id)
+        url, kwargs = request_arguments(path, params, ids[scale])
+        response = client.request(method, url, **kwargs)
+        assert response.status_code < 400, f"x{scale} returned {response.status_code}: {response.text[:200]}"
+        runs[scale] = client.statements
+
+        submitted, runner.jobs = runner.jobs, []
+        for fn, args in submitted:
+            jobs.setdefault(fn.__name__, {})[scale] = run_job(fn, args)
+
+    assert_within_budget(runs, statement_budget, row_budget)
+    for name, job_runs in jobs.items():
+        assert name in JOBS, f"job {name} has no budget"
+        assert_within_budget(job_runs, *JOBS[name])
+
+
+def test_every_route_has_a_budget(api):
+    from fastapi.routing import APIRoute
+
+    budgeted = {(method, path) for method, path, *_ in ENDPOINTS}
+    unbudgeted = sorted((method, route.path) for route in api.app.routes
+                        if isinstance(route, APIRoute) and route.endpoint.__module__.startswith("app.routes.")
+                        for method in route.methods if (method, route.path) not in budgeted)
+    assert not unbudgeted